@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UseraccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'UserAccounts'
+
+    def ready(self):
+        # register signal handlers
+        import UserAccounts.signals  # noqa: F401
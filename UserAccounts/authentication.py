@@ -0,0 +1,127 @@
+"""
+JWT authentication that serves the caller's UserAccounts row from cache.
+
+simplejwt's JWTAuthentication loads the user with a query on every request.
+CachedJWTAuthentication keeps the user's column values, without the
+password hash, in the shared cache and in a per-process LRU, both tagged
+with the user's version stamp (see employee_version_key). Every save or
+delete of that user (profile and admin updates, status, role and password
+changes) moves the stamp in the shared cache, which every process reads on
+each request. Writes that bypass save(), such as queryset updates, are
+picked up within AUTH_USER_CACHE_TIMEOUT.
+
+The cache is only used when it is shared by every process (Redis,
+Memcached, ...; see CACHES). With a local-memory cache the stamp would
+only move in the process that made the change, so the user is loaded on
+every request, as by JWTAuthentication.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from core.utils.cache_versions import cache_is_shared, employee_version_key, get_version
+
+# users kept per process
+AUTH_USER_CACHE_SIZE = 1024
+# seconds a cached user is trusted even if the version stamp did not move,
+# e.g. after a queryset update that sent no signal
+AUTH_USER_CACHE_TIMEOUT = 300
+# columns that are never cached; they load from the database when read
+UNCACHED_FIELDS = ('password',)
+
+
+class UserCache:
+    """
+    Thread-safe LRU of user column values, keyed by user id. Every request
+    builds its own instance from them.
+    """
+
+    def __init__(self, maxsize=AUTH_USER_CACHE_SIZE, timeout=AUTH_USER_CACHE_TIMEOUT):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            entry_version, expires, data = entry
+            if entry_version != version or expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+        return data
+
+    def set(self, user_id, version, data):
+        with self._lock:
+            self._entries[user_id] = (version, time.monotonic() + self.timeout, data)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def shared_cache_key(user_id, version):
+    return f'useraccounts:auth-user:{user_id}:{version}'
+
+
+def cached_field_names(model):
+    return [field.attname for field in model._meta.concrete_fields if field.attname not in UNCACHED_FIELDS]
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication whose user lookup is served from UserCache and the shared cache."""
+
+    def get_user(self, validated_token):
+        if not cache_is_shared():
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = self.get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # reads the password hash from the database
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+    def get_cached_user(self, user_id):
+        version = get_version(employee_version_key(user_id))
+        data = user_cache.get(user_id, version)
+        if data is None:
+            key = shared_cache_key(user_id, version)
+            data = cache.get(key)
+            if data is None:
+                data = self.user_model.objects.filter(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                ).values(*cached_field_names(self.user_model)).first()
+                if data is None:
+                    return None
+                cache.set(key, data, AUTH_USER_CACHE_TIMEOUT)
+            user_cache.set(user_id, version, data)
+        return self.user_model.from_db(self.user_model.objects.db, list(data), list(data.values()))
@@ -0,0 +1,337 @@
+"""
+Buffered LoginHistory writes, kept out of the token-obtain request.
+
+record_login() puts the row on an in-process queue. A daemon thread writes
+the queue with bulk_create once LOGIN_HISTORY_BATCH_SIZE rows are waiting
+or LOGIN_HISTORY_FLUSH_INTERVAL seconds have passed. Whatever is still
+queued is written when the process exits.
+
+Batches that cannot be written because the database is unreachable go to a
+JSON lines file in settings.LOGIN_HISTORY_SPOOL_DIR. The writer of any
+process retries those files when it starts and after each successful
+write, holding each with flock() while it does, so that a claim whose
+process was killed is taken over. Retries may write a row twice, but never
+lose one.
+
+Each queued row is also appended to a journal file in the same directory,
+which the process holds with flock() until the rows have been written. A
+worker that is killed before it writes its queue (a gunicorn timeout,
+SIGKILL, the OOM killer) leaves its journal behind, and the next writer to
+replay the spool writes it. The journal is not fsynced on every login: it
+outlives the process, not a crash of the machine. Without fcntl (Windows),
+rows are not journalled and only a clean exit writes the queue.
+
+With settings.LOGIN_HISTORY_ASYNC off, rows are written inside the request
+as before. Either way the LoginDailyStats rollup is updated in the same
+transaction as the rows.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import date
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DataError, IntegrityError, InterfaceError, OperationalError, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from UserAccounts.login_stats import add_to_daily_stats
+from UserAccounts.models import LoginHistory
+
+logger = logging.getLogger(__name__)
+
+LOGIN_HISTORY_BATCH_SIZE = 200
+LOGIN_HISTORY_FLUSH_INTERVAL = 1.0
+# past this many queued rows, logins write their own row
+LOGIN_HISTORY_QUEUE_SIZE = 10000
+
+SPOOL_SUFFIX = '.jsonl'
+CLAIM_MARKER = '.claimed-'
+JOURNAL_MARKER = '.journal-'
+
+
+def _decode(event):
+    event = dict(event)
+    event['login_time'] = parse_datetime(event['login_time'])
+    event['login_date'] = date.fromisoformat(event['login_date'])
+    return event
+
+
+def _read_events(spool_file):
+    events = []
+    for line in spool_file:
+        if not line.strip():
+            continue
+        try:
+            events.append(_decode(json.loads(line)))
+        except ValueError:
+            # the last line of a journal whose process was killed mid-write
+            logger.warning("Skipping unreadable login history line in %s", spool_file.name)
+    return events
+
+
+class LoginHistoryWriter:
+
+    def __init__(self, batch_size=LOGIN_HISTORY_BATCH_SIZE, flush_interval=LOGIN_HISTORY_FLUSH_INTERVAL,
+                 max_queue=LOGIN_HISTORY_QUEUE_SIZE, spool_dir=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self._queue = queue.Queue(max_queue)
+        self._wakeup = threading.Event()
+        # held while rows are taken off the queue and written
+        self._flush_lock = threading.Lock()
+        # held while a row is journalled and queued, so that the queue and the
+        # journal are taken together
+        self._journal_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._journal = None
+        self._journal_path = None
+
+    def get_spool_dir(self):
+        return self.spool_dir or settings.LOGIN_HISTORY_SPOOL_DIR
+
+    def record(self, event):
+        """Journal and queue one LoginHistory row, given as a dict of field values."""
+        self.ensure_started()
+        with self._journal_lock:
+            # only flush() takes rows off the queue, and it holds the lock too
+            queued = not self._queue.full()
+            if queued:
+                self.journal(event)
+                self._queue.put_nowait(event)
+        if not queued:
+            self.write([event])
+            return
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def ensure_started(self):
+        # threads do not survive a fork, so every worker process starts its own
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                if self._pid != os.getpid():
+                    # the parent's journal and its lock stay with the parent
+                    self._journal = self._journal_path = None
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='login-history-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        try:
+            self.replay_spool()
+        except Exception:
+            logger.exception("Login history spool replay failed")
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Login history flush failed")
+            finally:
+                # the thread idles most of the time; do not hold a connection
+                connections.close_all()
+
+    def journal(self, event):
+        """Append a queued row to this process's journal; call it with _journal_lock held."""
+        if fcntl is None:
+            return
+        try:
+            if self._journal is None:
+                spool_dir = self.get_spool_dir()
+                os.makedirs(spool_dir, exist_ok=True)
+                pid = os.getpid()
+                path = os.path.join(spool_dir, f'{time.time_ns()}-{pid}{SPOOL_SUFFIX}{JOURNAL_MARKER}{pid}')
+                journal = open(path + '.tmp', 'a', encoding='utf-8')
+                # locked before other processes can see it under its journal name
+                fcntl.flock(journal, fcntl.LOCK_EX)
+                os.replace(path + '.tmp', path)
+                self._journal, self._journal_path = journal, path
+            self._journal.write(json.dumps(event, cls=DjangoJSONEncoder) + '\n')
+            # in the page cache from here on, which outlives the process
+            self._journal.flush()
+        except OSError:
+            logger.exception("Could not journal a login history row; it is only queued")
+
+    def flush(self):
+        """Write everything queued so far, then retry spooled batches."""
+        with self._flush_lock:
+            with self._journal_lock:
+                events = []
+                while True:
+                    try:
+                        events.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                journal, journal_path = self._journal, self._journal_path
+                self._journal = self._journal_path = None
+            written = True
+            try:
+                for start in range(0, len(events), self.batch_size):
+                    written = self.write(events[start:start + self.batch_size]) and written
+                if journal is not None:
+                    # every row in it is now written or spooled; removed while
+                    # still locked, so that no other process replays it
+                    os.remove(journal_path)
+            finally:
+                if journal is not None:
+                    journal.close()
+            if events and written:
+                self.replay_spool()
+            return len(events)
+
+    def write(self, events):
+        """bulk_create the rows; spool them if the database refuses. True if written."""
+        rows = []
+        for event in events:
+            row = LoginHistory(**event)
+            # bulk_create does not call save()
+            row.set_device_flags()
+            rows.append(row)
+        try:
+            with transaction.atomic():
+                LoginHistory.objects.bulk_create(rows)
+                add_to_daily_stats(rows)
+        except (OperationalError, InterfaceError):
+            logger.exception("Could not write %d login history rows; spooling them", len(rows))
+            self.spool(events)
+            return False
+        except (IntegrityError, DataError):
+            # rows the database rejects, e.g. for a user deleted since the
+            # login, must not hold back the rest
+            for row in rows:
+                try:
+                    with transaction.atomic():
+                        LoginHistory.objects.bulk_create([row])
+                        add_to_daily_stats([row])
+                except (IntegrityError, DataError):
+                    logger.exception("Dropping login history row for user %s", row.user_id)
+        return True
+
+    def spool(self, events):
+        spool_dir = self.get_spool_dir()
+        os.makedirs(spool_dir, exist_ok=True)
+        name = os.path.join(spool_dir, f'{time.time_ns()}-{os.getpid()}-{threading.get_ident()}')
+        with open(name + '.tmp', 'w', encoding='utf-8') as spool_file:
+            for event in events:
+                spool_file.write(json.dumps(event, cls=DjangoJSONEncoder) + '\n')
+            spool_file.flush()
+            os.fsync(spool_file.fileno())
+        # complete files only, for other processes' replay_spool()
+        os.replace(name + '.tmp', name + SPOOL_SUFFIX)
+
+    def replay_spool(self):
+        """
+        Write spooled batches, the journals of processes that are gone and the
+        claims they left. A file is claimed by locking it with flock() and
+        renaming it; the lock, not the PID in a name, tells whether a process
+        still holds it, since PIDs come back after a restart.
+        """
+        spool_dir = self.get_spool_dir()
+        try:
+            names = sorted(os.listdir(spool_dir))
+        except FileNotFoundError:
+            return
+        for name in names:
+            base = _spool_base(name)
+            # without flock() held journals and claims cannot be told apart
+            if base is None or (base != name and fcntl is None):
+                continue
+            path = os.path.join(spool_dir, name)
+            spool_file = _lock_spool_file(path)
+            if spool_file is None:
+                continue
+            with spool_file:
+                claimed = os.path.join(spool_dir, f'{base}{CLAIM_MARKER}{os.getpid()}')
+                try:
+                    os.rename(path, claimed)
+                except FileNotFoundError:
+                    # claimed by another process (no flock())
+                    continue
+                events = _read_events(spool_file)
+                failed = False
+                for start in range(0, len(events), self.batch_size):
+                    # a failed chunk is spooled again by write(); spool the rest with it
+                    if not self.write(events[start:start + self.batch_size]):
+                        if events[start + self.batch_size:]:
+                            self.spool(events[start + self.batch_size:])
+                        failed = True
+                        break
+                # removed while still locked, so that no other process replays it
+                os.remove(claimed)
+            if failed:
+                return
+
+
+def _spool_base(name):
+    """The spool file name of a spool, journal or claim file; None for other files."""
+    if name.endswith(SPOOL_SUFFIX):
+        return name
+    for marker in (JOURNAL_MARKER, CLAIM_MARKER):
+        base, found, pid = name.rpartition(marker)
+        if found and pid.isdigit():
+            return base
+    return None
+
+
+def _lock_spool_file(path):
+    """
+    Open a spool, journal or claim file and lock it with flock(); None when
+    another process holds it, or when it has been written and removed or
+    claimed and renamed since it was listed.
+    """
+    try:
+        spool_file = open(path, encoding='utf-8')
+    except FileNotFoundError:
+        return None
+    if fcntl is None:
+        return spool_file
+    try:
+        fcntl.flock(spool_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        # the lock may come only after its holder removed or renamed the file
+        current = os.path.samestat(os.fstat(spool_file.fileno()), os.stat(path))
+    except (BlockingIOError, FileNotFoundError):
+        current = False
+    if not current:
+        spool_file.close()
+        return None
+    return spool_file
+
+
+login_history_writer = LoginHistoryWriter()
+atexit.register(login_history_writer.flush)
+
+
+def record_login(**fields):
+    """
+    Save a LoginHistory row for a login that is happening now: queued for
+    the writer thread, or right away when LOGIN_HISTORY_ASYNC is off.
+    """
+    row = LoginHistory(**fields)
+    if not settings.LOGIN_HISTORY_ASYNC:
+        with transaction.atomic():
+            row.save()
+            add_to_daily_stats([row])
+        return
+    event = {
+        field.attname: getattr(row, field.attname)
+        for field in LoginHistory._meta.concrete_fields
+        if not field.primary_key
+    }
+    event['login_date'] = timezone.localdate(row.login_time)
+    login_history_writer.record(event)
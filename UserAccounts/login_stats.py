@@ -0,0 +1,233 @@
+"""
+Summary statistics for the login history endpoints. The counts and the
+last login times come from one aggregate() with conditional counts, and
+the browser and OS breakdowns from one GROUP BY.
+
+LoginDailyStats holds the same counts per local day, so that statistics
+over long date ranges read a few rollup rows instead of every login. It is
+updated in the transaction that writes the LoginHistory rows, and in the one
+that deletes them (a post_delete receiver, which also sees the rows deleted
+along with a user). It can be rebuilt from them with the
+rebuild_login_daily_stats command. It has no department: HOD and unit head
+statistics follow the users' current department and unit, so they are
+counted from the rows.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from UserAccounts.models import LoginDailyStats, LoginHistory
+
+STATUS_TOTALS = {'success': 'successful_logins', 'failed': 'failed_logins', 'blocked': 'blocked_logins'}
+DEVICES = ('desktop', 'mobile', 'tablet')
+# LoginHistory columns that LoginDailyStats counts by, besides the day
+GROUP_FIELDS = ('login_status', 'device_type', 'browser', 'os_type')
+
+
+def _rate(part, total):
+    return round((part / total * 100) if total > 0 else 0, 2)
+
+
+def _statistics(totals, browsers, systems):
+    total = totals['total_logins']
+    return {
+        'total_logins': total,
+        'successful_logins': totals['successful_logins'],
+        'failed_logins': totals['failed_logins'],
+        'blocked_logins': totals['blocked_logins'],
+        'success_rate': _rate(totals['successful_logins'], total),
+        'failure_rate': _rate(totals['failed_logins'], total),
+        'block_rate': _rate(totals['blocked_logins'], total),
+        'device_breakdown': {device: totals[device] for device in DEVICES},
+        'browser_breakdown': [{'browser': name, 'count': count} for name, count in browsers.items()],
+        'os_breakdown': [{'os_type': name, 'count': count} for name, count in systems.items()],
+    }
+
+
+def login_statistics(queryset, last_logins=False):
+    """
+    Statistics over a LoginHistory queryset, in the shape the login history
+    endpoints return. `last_logins` adds the last login and the last failed
+    login times.
+    """
+    queryset = queryset.order_by()
+    totals = queryset.aggregate(
+        total_logins=Count('pk'),
+        successful_logins=Count('pk', filter=Q(login_status='success')),
+        failed_logins=Count('pk', filter=Q(login_status='failed')),
+        blocked_logins=Count('pk', filter=Q(login_status='blocked')),
+        desktop=Count('pk', filter=Q(device_type='desktop')),
+        mobile=Count('pk', filter=Q(device_type='mobile')),
+        tablet=Count('pk', filter=Q(device_type='tablet')),
+        last_login=Max('login_time'),
+        last_failed_login=Max('login_time', filter=Q(login_status='failed')),
+    )
+
+    browsers = {}
+    systems = {}
+    for row in queryset.values('browser', 'os_type').annotate(
+        browser_count=Count('browser'), os_count=Count('os_type')
+    ):
+        browsers[row['browser']] = browsers.get(row['browser'], 0) + row['browser_count']
+        systems[row['os_type']] = systems.get(row['os_type'], 0) + row['os_count']
+
+    statistics = _statistics(totals, browsers, systems)
+    if last_logins:
+        statistics['last_login'] = totals['last_login']
+        statistics['last_failed_login'] = totals['last_failed_login']
+    return statistics
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def parse_bound(value):
+    """
+    A start_date / end_date parameter as an aware datetime, read the way the
+    login_time__range filter reads it; None if it is not a date or datetime.
+    """
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            moment = day and datetime.combine(day, time.min)
+    except ValueError:
+        return None
+    if moment is not None and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def rollup_login_statistics(queryset, rollup, start=None, end=None):
+    """
+    login_statistics() of a LoginHistory queryset already limited to
+    [start, end] (either may be None). Whole days before today are counted
+    from `rollup`, a LoginDailyStats queryset with the same filters; only the
+    partial days at either end, today included, are counted from `queryset`.
+    """
+    today = timezone.localdate()
+    first_day = None
+    if start is not None:
+        first_day = timezone.localdate(start)
+        if start > _local_midnight(first_day):
+            first_day += timedelta(days=1)
+    end_day = today if end is None else min(today, timezone.localdate(end))
+
+    groups = []
+    # whole days are first_day <= date < end_day
+    if first_day is None or first_day < end_day:
+        rollup = rollup.filter(date__lt=end_day)
+        partial = Q(login_time__gte=_local_midnight(end_day))
+        if first_day is not None:
+            rollup = rollup.filter(date__gte=first_day)
+            partial |= Q(login_time__lt=_local_midnight(first_day))
+        queryset = queryset.filter(partial)
+        groups.append(rollup.order_by().values(*GROUP_FIELDS).annotate(logins=Sum('count')))
+    groups.append(queryset.order_by().values(*GROUP_FIELDS).annotate(logins=Count('pk')))
+
+    totals = dict.fromkeys(['total_logins', *STATUS_TOTALS.values(), *DEVICES], 0)
+    browsers = {}
+    systems = {}
+    for rows in groups:
+        for row in rows:
+            logins = row['logins']
+            totals['total_logins'] += logins
+            if row['login_status'] in STATUS_TOTALS:
+                totals[STATUS_TOTALS[row['login_status']]] += logins
+            if row['device_type'] in DEVICES:
+                totals[row['device_type']] += logins
+            # a missing browser/OS is listed with a count of 0, as in login_statistics()
+            browser = row['browser'] or None
+            browsers[browser] = browsers.get(browser, 0) + (logins if browser else 0)
+            os_type = row['os_type'] or None
+            systems[os_type] = systems.get(os_type, 0) + (logins if os_type else 0)
+    return _statistics(totals, browsers, systems)
+
+
+def add_to_daily_stats(rows):
+    """
+    Count LoginHistory rows that have just been saved into LoginDailyStats.
+    Call it in the transaction that saves them.
+    """
+    counts = {}
+    for row in rows:
+        key = (
+            timezone.localdate(row.login_time), row.login_status,
+            row.device_type, row.browser or '', row.os_type or '',
+        )
+        counts[key] = counts.get(key, 0) + 1
+
+    for (day, login_status, device_type, browser, os_type), count in counts.items():
+        stats = LoginDailyStats.objects.filter(
+            date=day, login_status=login_status,
+            device_type=device_type, browser=browser, os_type=os_type,
+        )
+        if stats.update(count=F('count') + count):
+            continue
+        try:
+            with transaction.atomic():
+                LoginDailyStats.objects.create(
+                    date=day, login_status=login_status,
+                    device_type=device_type, browser=browser, os_type=os_type, count=count,
+                )
+        except IntegrityError:
+            # created by a concurrent writer since the update
+            stats.update(count=F('count') + count)
+
+
+def remove_from_daily_stats(rows):
+    """
+    Take LoginHistory rows that have just been deleted out of LoginDailyStats.
+    Call it in the transaction that deletes them.
+    """
+    for row in rows:
+        stats = LoginDailyStats.objects.filter(
+            date=timezone.localdate(row.login_time), login_status=row.login_status,
+            device_type=row.device_type, browser=row.browser or '', os_type=row.os_type or '',
+        )
+        # nothing to update if it was not counted, e.g. written before the
+        # rollup was rebuilt without it
+        if stats.filter(count__gt=0).update(count=F('count') - 1):
+            # an empty row would still list its browser and OS in the breakdowns
+            stats.filter(count__lte=0).delete()
+
+
+def rebuild_login_daily_stats(start=None, end=None):
+    """
+    Recount LoginDailyStats from LoginHistory for the days from `start` to
+    `end` inclusive (either may be None). Returns the number of rows written.
+    """
+    logins = LoginHistory.objects.order_by()
+    stale = LoginDailyStats.objects.all()
+    if start is not None:
+        logins = logins.filter(login_time__gte=_local_midnight(start))
+        stale = stale.filter(date__gte=start)
+    if end is not None:
+        logins = logins.filter(login_time__lt=_local_midnight(end + timedelta(days=1)))
+        stale = stale.filter(date__lte=end)
+    grouped = logins.values(
+        'login_status', 'device_type',
+        day=TruncDate('login_time'),
+        browser_=Coalesce('browser', Value('')),
+        os_type_=Coalesce('os_type', Value('')),
+    ).annotate(logins=Count('pk'))
+
+    with transaction.atomic():
+        stale.delete()
+        created = LoginDailyStats.objects.bulk_create(
+            (
+                LoginDailyStats(
+                    date=row['day'], login_status=row['login_status'],
+                    device_type=row['device_type'], browser=row['browser_'], os_type=row['os_type_'],
+                    count=row['logins'],
+                )
+                for row in grouped.iterator()
+            ),
+            batch_size=1000,
+        )
+    return len(created)
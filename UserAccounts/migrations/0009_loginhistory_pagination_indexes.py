@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserAccounts', '0008_alter_useraccounts_dept_alter_useraccounts_unit'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loginhistory',
+            index=models.Index(fields=['-login_time', '-id'], name='loginhistory_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loginhistory',
+            index=models.Index(fields=['user', '-login_time', '-id'], name='loginhistory_user_time_idx'),
+        ),
+    ]
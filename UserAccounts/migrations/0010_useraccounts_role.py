@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:20
+
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+# same precedence as UserAccounts.get_primary_role()
+ROLE_FLAGS = (
+    ('is_superuser', 'superuser'),
+    ('is_hr', 'hr'),
+    ('is_hod', 'hod'),
+    ('is_unit_head', 'unit_head'),
+    ('is_manager', 'manager'),
+)
+
+
+def populate_roles(apps, schema_editor):
+    UserAccounts = apps.get_model('UserAccounts', 'UserAccounts')
+    UserAccounts.objects.update(role=Case(
+        *(When(**{flag: True}, then=Value(role)) for flag, role in ROLE_FLAGS),
+        default=Value('employee'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserAccounts', '0009_loginhistory_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useraccounts',
+            name='role',
+            field=models.CharField(choices=[('superuser', 'Superuser'), ('hr', 'HR'), ('hod', 'HOD'), ('unit_head', 'Unit Head'), ('manager', 'Manager'), ('employee', 'Employee')], db_index=True, default='employee', editable=False, max_length=20),
+        ),
+        migrations.RunPython(populate_roles, migrations.RunPython.noop),
+    ]
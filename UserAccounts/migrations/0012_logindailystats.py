@@ -0,0 +1,61 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    # same grouping as UserAccounts.login_stats.rebuild_login_daily_stats()
+    LoginHistory = apps.get_model('UserAccounts', 'LoginHistory')
+    LoginDailyStats = apps.get_model('UserAccounts', 'LoginDailyStats')
+    grouped = LoginHistory.objects.order_by().values(
+        'login_status', 'device_type',
+        day=TruncDate('login_time'),
+        dept_id_=F('user__dept_id'),
+        browser_=Coalesce('browser', Value('')),
+        os_type_=Coalesce('os_type', Value('')),
+    ).annotate(logins=Count('pk'))
+    LoginDailyStats.objects.bulk_create(
+        (
+            LoginDailyStats(
+                date=row['day'], dept_id=row['dept_id_'], login_status=row['login_status'],
+                device_type=row['device_type'], browser=row['browser_'], os_type=row['os_type_'],
+                count=row['logins'],
+            )
+            for row in grouped.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserAccounts', '0011_loginhistory_login_time_default'),
+        ('core', '0010_holiday_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoginDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('login_status', models.CharField(max_length=20)),
+                ('device_type', models.CharField(max_length=20)),
+                ('browser', models.CharField(blank=True, default='', max_length=50)),
+                ('os_type', models.CharField(blank=True, default='', max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('dept', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='login_daily_stats', to='core.department')),
+            ],
+            options={
+                'verbose_name': 'Login Daily Stats',
+                'verbose_name_plural': 'Login Daily Stats',
+                'indexes': [models.Index(fields=['dept', 'date'], name='logindailystats_dept_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'dept', 'login_status', 'device_type', 'browser', 'os_type'), name='logindailystats_key')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserAccounts', '0012_logindailystats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useraccounts',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
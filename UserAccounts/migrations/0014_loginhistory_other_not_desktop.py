@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:05
+
+from django.db import migrations
+
+
+def clear_desktop_flag(apps, schema_editor):
+    # rows for bots and other clients were saved with is_desktop=True
+    LoginHistory = apps.get_model('UserAccounts', 'LoginHistory')
+    LoginHistory.objects.exclude(device_type='desktop').filter(is_desktop=True).update(is_desktop=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserAccounts', '0013_useraccounts_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_desktop_flag, migrations.RunPython.noop),
+    ]
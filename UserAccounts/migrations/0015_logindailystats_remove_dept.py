@@ -0,0 +1,44 @@
+# Generated by Django 5.1.4 on 2026-10-18 14:20
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_departments(apps, schema_editor):
+    # rows that differed only by department now share a key
+    LoginDailyStats = apps.get_model('UserAccounts', 'LoginDailyStats')
+    key = ('date', 'login_status', 'device_type', 'browser', 'os_type')
+    duplicates = LoginDailyStats.objects.order_by().values(*key).annotate(
+        rows=Count('pk'), keep=Min('pk'), total=Sum('count')
+    ).filter(rows__gt=1)
+    for row in duplicates:
+        stats = LoginDailyStats.objects.filter(**{field: row[field] for field in key})
+        stats.exclude(pk=row['keep']).delete()
+        stats.update(count=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserAccounts', '0014_loginhistory_other_not_desktop'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='logindailystats',
+            name='logindailystats_key',
+        ),
+        migrations.RemoveIndex(
+            model_name='logindailystats',
+            name='logindailystats_dept_idx',
+        ),
+        migrations.RemoveField(
+            model_name='logindailystats',
+            name='dept',
+        ),
+        migrations.RunPython(merge_departments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='logindailystats',
+            constraint=models.UniqueConstraint(fields=('date', 'login_status', 'device_type', 'browser', 'os_type'), name='logindailystats_key'),
+        ),
+    ]
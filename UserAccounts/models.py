@@ -81,6 +81,16 @@ class CustomUserManager(BaseUserManager):
         return user
     
     
+# role flags in order of precedence; the first one set is the user's role
+ROLE_FLAGS = (
+    ('is_superuser', 'superuser'),
+    ('is_hr', 'hr'),
+    ('is_hod', 'hod'),
+    ('is_unit_head', 'unit_head'),
+    ('is_manager', 'manager'),
+)
+
+
 # Create your models here.
 class UserAccounts(AbstractBaseUser, PermissionsMixin):
     
@@ -99,6 +109,8 @@ class UserAccounts(AbstractBaseUser, PermissionsMixin):
     avatar = models.ImageField(null=True,blank=True)
     email = models.EmailField(max_length=255,blank=True,null=True)
     date_joined = models.DateTimeField(auto_now_add=True)
+    # last change to the account, logins aside (see save())
+    updated = models.DateTimeField(auto_now=True)
     
     # New fields
     id_card_mumber = models.CharField(max_length=50, unique=True, blank=True, null=True, help_text="Unique employee identification number")
@@ -159,6 +171,17 @@ class UserAccounts(AbstractBaseUser, PermissionsMixin):
     is_hod = models.BooleanField(default=False)
     is_unit_head = models.BooleanField(default=False)
     is_manager = models.BooleanField(default=False)
+
+    ROLE_CHOICES = (
+        ('superuser', 'Superuser'),
+        ('hr', 'HR'),
+        ('hod', 'HOD'),
+        ('unit_head', 'Unit Head'),
+        ('manager', 'Manager'),
+        ('employee', 'Employee'),
+    )
+    # primary role, kept in sync with the flags above by save()
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='employee', editable=False, db_index=True)
     
 
     objects = CustomUserManager()
@@ -179,6 +202,27 @@ class UserAccounts(AbstractBaseUser, PermissionsMixin):
     def get_short_name(self):
         return self.first_name
 
+    def get_primary_role(self):
+        for flag, role in ROLE_FLAGS:
+            if getattr(self, flag):
+                return role
+        return 'employee'
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.role = self.get_primary_role()
+        else:
+            update_fields = set(update_fields)
+            if {flag for flag, _ in ROLE_FLAGS} & update_fields:
+                self.role = self.get_primary_role()
+                update_fields.add('role')
+            # recording a login is not a change to the account
+            if not update_fields <= {'last_login'}:
+                update_fields.add('updated')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
 
 class AccountStatusHistory(models.Model):
     """
@@ -294,8 +338,10 @@ class LoginHistory(models.Model):
     
     # Login Details
     user_agent = models.TextField(null=True, blank=True)
-    login_time = models.DateTimeField(auto_now_add=True)
-    login_date = models.DateField(auto_now_add=True)
+    # defaults rather than auto_now_add so that rows written later by the
+    # login history writer keep the time of the login
+    login_time = models.DateTimeField(default=timezone.now)
+    login_date = models.DateField(default=timezone.localdate)
     login_status = models.CharField(
         max_length=20,
         choices=[
@@ -323,24 +369,51 @@ class LoginHistory(models.Model):
             models.Index(fields=['user', 'login_time']),
             models.Index(fields=['login_status']),
             models.Index(fields=['device_type']),
+            # keyset pagination order of the login history endpoints
+            models.Index(fields=['-login_time', '-id'], name='loginhistory_time_idx'),
+            models.Index(fields=['user', '-login_time', '-id'], name='loginhistory_user_time_idx'),
         ]
 
     def __str__(self):
         return f"{self.user.username} - {self.login_time.strftime('%Y-%m-%d %H:%M')} - {self.login_status}"
 
+    def set_device_flags(self):
+        """Set is_mobile / is_tablet / is_desktop from device_type."""
+        self.is_mobile = self.device_type == 'mobile'
+        self.is_tablet = self.device_type == 'tablet'
+        # bots and other clients are none of the three
+        self.is_desktop = self.device_type == 'desktop'
+
     def save(self, *args, **kwargs):
         # Automatically set device type flags
-        if self.device_type == 'mobile':
-            self.is_mobile = True
-            self.is_tablet = False
-            self.is_desktop = False
-        elif self.device_type == 'tablet':
-            self.is_mobile = False
-            self.is_tablet = True
-            self.is_desktop = False
-        else:
-            self.is_mobile = False
-            self.is_tablet = False
-            self.is_desktop = True
-            
-        super().save(*args, **kwargs)
\ No newline at end of file
+        self.set_device_flags()
+        super().save(*args, **kwargs)
+
+
+class LoginDailyStats(models.Model):
+    """
+    Logins per local day, status, device, browser and OS, for the superuser
+    and HR login history statistics. Kept up to date as LoginHistory rows are written
+    and deleted (see UserAccounts.login_stats); rebuilt with
+    rebuild_login_daily_stats.
+    """
+    date = models.DateField()
+    login_status = models.CharField(max_length=20)
+    device_type = models.CharField(max_length=20)
+    # '' rather than NULL for a missing browser/OS, so they are part of the key
+    browser = models.CharField(max_length=50, blank=True, default='')
+    os_type = models.CharField(max_length=50, blank=True, default='')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Login Daily Stats'
+        verbose_name_plural = 'Login Daily Stats'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'login_status', 'device_type', 'browser', 'os_type'],
+                name='logindailystats_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.login_status} - {self.count}"
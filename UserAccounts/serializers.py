@@ -1,5 +1,7 @@
 from UserAccounts.models import *
-from core.api.serializers import DepartmentSerializers, UnitSerializers
+from UserAccounts.login_history import record_login
+from UserAccounts.user_agents import parse_user_agent
+from core.api.serializers import DepartmentSerializers, SparseFieldsetMixin, UnitSerializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework import serializers
 # import authenticate for Login serializer
@@ -7,13 +9,44 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 
 from django.contrib.auth import get_user_model
+from django.db.models import Prefetch, prefetch_related_objects
+from django.db.models.manager import BaseManager
 
 User = get_user_model()
 
 from core.models import *
 
+# logins shown in UserSerializer's login_history
+RECENT_LOGINS = 5
 
-class UserSerializer(serializers.ModelSerializer):
+
+def prefetch_recent_logins(users):
+    """
+    Attach each user's latest RECENT_LOGINS logins as `recent_logins`, for
+    all users in one query (ROW_NUMBER() OVER (PARTITION BY user_id)).
+    Users that already have them, and None, are skipped.
+    """
+    users = [user for user in users if user is not None and not hasattr(user, 'recent_logins')]
+    if users:
+        prefetch_related_objects(users, Prefetch(
+            'login_history',
+            queryset=LoginHistory.objects.only('user', *LoginHistorySerializer.Meta.fields)
+                                         .order_by('-login_time', '-id')[:RECENT_LOGINS],
+            to_attr='recent_logins',
+        ))
+
+
+class RecentLoginsListSerializer(serializers.ListSerializer):
+    """Prefetches login_history for the whole list before UserSerializer runs per row."""
+
+    def to_representation(self, data):
+        users = list(data.all() if isinstance(data, BaseManager) else data)
+        if self.child.wants('login_history'):
+            prefetch_recent_logins(users)
+        return super().to_representation(users)
+
+
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     # Nested serializers for related data
     dept = DepartmentSerializers(read_only=True)
     unit = UnitSerializers(read_only=True)
@@ -22,9 +55,14 @@ class UserSerializer(serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
     role = serializers.SerializerMethodField()
     
+    # added in to_representation
+    extra_fields = ('login_history',)
+
     class Meta:
         model = User
-        exclude = ['password', 'user_permissions', 'groups', 'last_login']
+        # updated only stamps the authentication cache
+        exclude = ['password', 'user_permissions', 'groups', 'last_login', 'updated']
+        list_serializer_class = RecentLoginsListSerializer
     
     def get_full_name(self, obj):
         """Return the user's full name"""
@@ -32,28 +70,16 @@ class UserSerializer(serializers.ModelSerializer):
     
     def get_role(self, obj):
         """Return the user's role based on their permissions"""
-        if obj.is_superuser:
-            return 'Superuser'
-        elif obj.is_hr:
-            return 'HR'
-        elif obj.is_hod:
-            return 'HOD'
-        elif obj.is_unit_head:
-            return 'Unit Head'
-        elif obj.is_manager:
-            return 'Manager'
-        else:
-            return 'Employee'
+        return obj.get_role_display()
     
     def to_representation(self, instance):
         """Customize the representation of the user data"""
         data = super().to_representation(instance)
         
-        # Add login history
-        data['login_history'] = LoginHistorySerializer(
-            instance.login_history.all()[:5],  # Get last 5 login attempts
-            many=True
-        ).data
+        # Add login history, unless left out with ?fields= / ?omit=
+        if self.wants('login_history'):
+            prefetch_recent_logins([instance])
+            data['login_history'] = LoginHistorySerializer(instance.recent_logins, many=True).data
         
         return data
     
@@ -159,54 +185,24 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         user_agent = request.META.get('HTTP_USER_AGENT', '')
         ip_address = request.META.get('REMOTE_ADDR')
         
-        # Create login history entry
-        LoginHistory.objects.create(
+        agent = parse_user_agent(user_agent)
+        
+        # Create login history entry, written in the background
+        record_login(
             user=self.user,
             user_agent=user_agent,
             user_ip=ip_address,
             login_status='success',
-            device_type='desktop',  # Default to desktop, can be updated based on user agent
-            browser=self._get_browser(user_agent),
-            browser_version=self._get_browser_version(user_agent),
-            os_type=self._get_os_type(user_agent),
-            os_version=self._get_os_version(user_agent),
+            device_type=agent.device_type,
+            browser=agent.browser,
+            browser_version=agent.browser_version,
+            os_type=agent.os_type,
+            os_version=agent.os_version,
+            is_bot=agent.is_bot,
             is_secure=request.is_secure(),
         )
         
         return data
-    
-    def _get_browser(self, user_agent):
-        # Simple browser detection
-        if 'Chrome' in user_agent:
-            return 'Chrome'
-        elif 'Firefox' in user_agent:
-            return 'Firefox'
-        elif 'Safari' in user_agent:
-            return 'Safari'
-        elif 'Edge' in user_agent:
-            return 'Edge'
-        return 'Unknown'
-    
-    def _get_browser_version(self, user_agent):
-        # This is a simplified version - you might want to use a proper user agent parser
-        return 'Unknown'
-    
-    def _get_os_type(self, user_agent):
-        if 'Windows' in user_agent:
-            return 'Windows'
-        elif 'Mac' in user_agent:
-            return 'MacOS'
-        elif 'Linux' in user_agent:
-            return 'Linux'
-        elif 'Android' in user_agent:
-            return 'Android'
-        elif 'iOS' in user_agent:
-            return 'iOS'
-        return 'Unknown'
-    
-    def _get_os_version(self, user_agent):
-        # This is a simplified version - you might want to use a proper user agent parser
-        return 'Unknown'
 
 # Add this new serializer class
 class UserProfileUpdateSerializer(serializers.ModelSerializer):
@@ -217,7 +213,8 @@ class UserProfileUpdateSerializer(serializers.ModelSerializer):
             'password', 
             'user_permissions', 
             'groups', 
-            'last_login'
+            'last_login',
+            'updated'
         ]
         
     def validate_email(self, value):
@@ -380,7 +377,7 @@ class AdminPasswordUpdateSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
-class UserListSerializer(serializers.ModelSerializer):
+class UserListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     dept = DepartmentSerializers(read_only=True)
     unit = UnitSerializers(read_only=True)
     full_name = serializers.SerializerMethodField()
@@ -403,23 +400,44 @@ class UserListSerializer(serializers.ModelSerializer):
             'date_joined'
         ]
 
+    # columns and relations each field reads, for sparse_queryset()
+    field_columns = {
+        'id': ['id'],
+        'username': ['username'],
+        'full_name': ['first_name', 'sur_name'],
+        'email': ['email'],
+        'phone': ['phone'],
+        'designation': ['designation'],
+        'dept': ['dept'],
+        'unit': ['unit'],
+        'role': ['role'],
+        'is_active': ['is_active'],
+        'date_joined': ['date_joined'],
+    }
+    field_related = {'dept': 'dept', 'unit': 'unit'}
+
     def get_full_name(self, obj):
         return f"{obj.first_name} {obj.sur_name}"
 
     def get_role(self, obj):
-        if obj.is_superuser:
-            return 'Superuser'
-        elif obj.is_hr:
-            return 'HR'
-        elif obj.is_hod:
-            return 'HOD'
-        elif obj.is_unit_head:
-            return 'Unit Head'
-        elif obj.is_manager:
-            return 'Manager'
-        else:
-            return 'Employee'
+        return obj.get_role_display()
         
+class StatusHistoryLoginsListSerializer(serializers.ListSerializer):
+    """
+    Loads the users and changed_by of the whole list, and their login_history,
+    before AccountStatusHistorySerializer runs per row: one query each
+    instead of one per row.
+    """
+
+    def to_representation(self, data):
+        records = list(data.all() if isinstance(data, BaseManager) else data)
+        # relations already loaded with select_related() are not fetched again
+        prefetch_related_objects(records, 'user', 'changed_by')
+        users = {id(user): user for record in records for user in (record.user, record.changed_by)}
+        prefetch_recent_logins(users.values())
+        return super().to_representation(records)
+
+
 class AccountStatusHistorySerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     changed_by = UserSerializer(read_only=True)
@@ -438,6 +456,13 @@ class AccountStatusHistorySerializer(serializers.ModelSerializer):
             'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'status_change']
+        list_serializer_class = StatusHistoryLoginsListSerializer
+
+    def to_representation(self, instance):
+        # one login history query for both nested users; a no-op for rows of
+        # a list, which StatusHistoryLoginsListSerializer has prefetched
+        prefetch_recent_logins([instance.user, instance.changed_by])
+        return super().to_representation(instance)
 
 class UserMinimalSerializer(serializers.ModelSerializer):
     """
@@ -461,18 +486,7 @@ class UserMinimalSerializer(serializers.ModelSerializer):
         return f"{obj.first_name} {obj.sur_name}"
     
     def get_role(self, obj):
-        if obj.is_superuser:
-            return 'Superuser'
-        elif obj.is_hr:
-            return 'HR'
-        elif obj.is_hod:
-            return 'HOD'
-        elif obj.is_unit_head:
-            return 'Unit Head'
-        elif obj.is_manager:
-            return 'Manager'
-        else:
-            return 'Employee'
+        return obj.get_role_display()
 
 class AccountStatusHistoryListSerializer(serializers.ModelSerializer):
     """
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from UserAccounts.login_stats import remove_from_daily_stats
+from UserAccounts.models import LoginHistory
+
+
+@receiver(post_delete, sender=LoginHistory)
+def login_deleted(sender, instance, **kwargs):
+    # also sent for the logins deleted along with their user
+    remove_from_daily_stats([instance])
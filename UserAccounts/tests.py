@@ -1,3 +1,750 @@
-from django.test import TestCase
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import Department
+from core.utils.cache_versions import bump_version, employee_version_key
+from UserAccounts.authentication import CachedJWTAuthentication, shared_cache_key, user_cache
+from UserAccounts.login_history import (
+    CLAIM_MARKER, JOURNAL_MARKER, SPOOL_SUFFIX, LoginHistoryWriter, fcntl, record_login,
+)
+from UserAccounts.login_stats import login_statistics, rebuild_login_daily_stats
+from UserAccounts.models import AccountStatusHistory, LoginDailyStats, LoginHistory, UserAccounts
+from UserAccounts.serializers import (
+    RECENT_LOGINS, AccountStatusHistorySerializer, UserProfileUpdateSerializer, UserSerializer,
+)
+from UserAccounts import user_agents
+from UserAccounts.user_agents import MAX_USER_AGENT_LENGTH, UserAgent, parse_user_agent
+from UserAccounts.views import AccountStatusHistoryView, LoginHistoryListView, UserListView, UserLoginHistoryView
+
+
+class UserSerializerLoginHistoryTests(TestCase):
+    """login_history must cost one query per page of users, not one per user."""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.users = []
+        for i in range(4):
+            user = UserAccounts.objects.create_user(f'user{i}', 'password', sur_name=f'Sur{i}', first_name=f'First{i}')
+            for minutes in range(RECENT_LOGINS + 3):
+                login_time = now - timedelta(minutes=minutes)
+                LoginHistory.objects.create(
+                    user=user, browser=f'browser{minutes}',
+                    login_time=login_time, login_date=timezone.localdate(login_time),
+                )
+            cls.users.append(user)
+
+    def user_queryset(self, count=None):
+        return UserAccounts.objects.order_by('id')[:count]
+
+    def test_updated_stamp_is_not_shown(self):
+        user = self.user_queryset().first()
+        self.assertNotIn('updated', UserSerializer(user).data)
+        self.assertNotIn('updated', UserProfileUpdateSerializer(user).data)
+
+    def test_many_users_share_one_login_history_query(self):
+        users = list(self.user_queryset())
+        with self.assertNumQueries(1):
+            data = UserSerializer(users, many=True).data
+        for row in data:
+            self.assertEqual(
+                [login['browser'] for login in row['login_history']],
+                [f'browser{minutes}' for minutes in range(RECENT_LOGINS)],
+            )
+
+    def test_query_count_does_not_grow_with_users(self):
+        for count in (1, 2, 4):
+            with self.assertNumQueries(2):
+                data = UserSerializer(self.user_queryset(count), many=True).data
+            self.assertEqual(len(data), count)
+
+    def test_single_user(self):
+        user = UserAccounts.objects.get(pk=self.users[0].pk)
+        with self.assertNumQueries(1):
+            data = UserSerializer(user).data
+        self.assertEqual(len(data['login_history']), RECENT_LOGINS)
+
+    def test_omitted_login_history_is_not_queried(self):
+        users = list(self.user_queryset())
+        request = Request(APIRequestFactory().get('/', {'omit': 'login_history'}))
+        with self.assertNumQueries(0):
+            data = UserSerializer(users, many=True, context={'request': request}).data
+        self.assertNotIn('login_history', data[0])
+
+    def test_account_status_history_users_share_one_query(self):
+        AccountStatusHistory.objects.create(
+            user=self.users[0], changed_by=self.users[1], previous_status=True, new_status=False
+        )
+        record = AccountStatusHistory.objects.select_related('user', 'changed_by').get()
+        with self.assertNumQueries(1):
+            data = AccountStatusHistorySerializer(record).data
+        self.assertEqual(len(data['user']['login_history']), RECENT_LOGINS)
+        self.assertEqual(len(data['changed_by']['login_history']), RECENT_LOGINS)
+
+    def create_status_changes(self, count):
+        AccountStatusHistory.objects.bulk_create(
+            AccountStatusHistory(
+                user=self.users[i % 4], changed_by=self.users[(i + 1) % 4], previous_status=True, new_status=False
+            )
+            for i in range(count)
+        )
+
+    def test_account_status_history_list_shares_queries(self):
+        self.create_status_changes(6)
+        # the records, their users, their changed_by and the logins of all of them
+        with self.assertNumQueries(4):
+            data = AccountStatusHistorySerializer(AccountStatusHistory.objects.all(), many=True).data
+        self.assertEqual(len(data), 6)
+        for row in data:
+            self.assertEqual(len(row['user']['login_history']), RECENT_LOGINS)
+            self.assertEqual(len(row['changed_by']['login_history']), RECENT_LOGINS)
+
+        with self.assertNumQueries(2):
+            AccountStatusHistorySerializer(
+                AccountStatusHistory.objects.select_related('user', 'changed_by'), many=True
+            ).data
+
+    def test_account_status_history_endpoint_queries_do_not_grow(self):
+        admin = UserAccounts.objects.create_superuser('admin', 'password', sur_name='Admin', first_name='Admin')
+
+        def list_queries():
+            request = APIRequestFactory().get('/')
+            force_authenticate(request, user=admin)
+            with CaptureQueriesContext(connection) as queries:
+                response = AccountStatusHistoryView.as_view()(request)
+            self.assertEqual(response.status_code, 200)
+            return len(queries), len(response.data['results'])
+
+        self.create_status_changes(2)
+        few, rows = list_queries()
+        self.assertEqual(rows, 2)
+        self.create_status_changes(6)
+        self.assertEqual(list_queries(), (few, 8))
+
+
+class LoginHistoryStatisticsTests(TestCase):
+    """
+    The statistics cost two queries: one aggregate and one browser/OS GROUP BY,
+    or for the list, one GROUP BY of the daily rollup and one of the partial days.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = UserAccounts.objects.create_superuser('admin', 'password', sur_name='Admin', first_name='Admin')
+        cls.user = UserAccounts.objects.create_employee('staff', 'password', sur_name='Staff', first_name='Staff')
+        now = timezone.now()
+        rows = [
+            ('success', 'desktop', 'Chrome', 'Windows', 1),
+            ('success', 'mobile', 'Chrome', 'Android', 2),
+            ('success', 'tablet', 'Safari', 'iOS', 3),
+            ('failed', 'desktop', 'Firefox', 'Linux', 4),
+            ('blocked', 'desktop', None, None, 50),
+        ]
+        for login_status, device_type, browser, os_type, days in rows:
+            LoginHistory.objects.create(
+                user=cls.user, login_status=login_status, device_type=device_type,
+                browser=browser, os_type=os_type, login_time=now - timedelta(days=days),
+            )
+        cls.last_login = now - timedelta(days=1)
+        cls.last_failed_login = now - timedelta(days=4)
+        # rows created directly skip the login history writer
+        rebuild_login_daily_stats()
+
+    def get(self, view, params=None, **kwargs):
+        request = APIRequestFactory().get('/', params or {})
+        force_authenticate(request, user=self.admin)
+        return view.as_view()(request, **kwargs)
+
+    def test_list_statistics_queries(self):
+        # statistics, then the page
+        with self.assertNumQueries(3):
+            response = self.get(LoginHistoryListView)
+        statistics = response.data['statistics']
+        self.assertEqual(statistics['total_logins'], 5)
+        self.assertEqual(statistics['successful_logins'], 3)
+        self.assertEqual(statistics['failed_logins'], 1)
+        self.assertEqual(statistics['blocked_logins'], 1)
+        self.assertEqual(statistics['success_rate'], 60.0)
+        self.assertEqual(statistics['device_breakdown'], {'desktop': 3, 'mobile': 1, 'tablet': 1})
+        self.assertCountEqual(statistics['browser_breakdown'], [
+            {'browser': 'Chrome', 'count': 2}, {'browser': 'Safari', 'count': 1},
+            {'browser': 'Firefox', 'count': 1}, {'browser': None, 'count': 0},
+        ])
+        self.assertCountEqual(statistics['os_breakdown'], [
+            {'os_type': 'Windows', 'count': 1}, {'os_type': 'Android', 'count': 1},
+            {'os_type': 'iOS', 'count': 1}, {'os_type': 'Linux', 'count': 1}, {'os_type': None, 'count': 0},
+        ])
+        self.assertNotIn('last_login', statistics)
+
+    def test_statistics_follow_filters(self):
+        start = (timezone.now() - timedelta(days=10)).isoformat()
+        end = timezone.now().isoformat()
+        with self.assertNumQueries(3):
+            response = self.get(LoginHistoryListView, {'start_date': start, 'end_date': end, 'device_type': 'desktop'})
+        statistics = response.data['statistics']
+        self.assertEqual(statistics['total_logins'], 2)
+        self.assertEqual(statistics['failed_logins'], 1)
+        self.assertEqual(statistics['blocked_logins'], 0)
+
+    def test_user_statistics_queries(self):
+        # the user, statistics with last logins, then the page
+        with self.assertNumQueries(4):
+            response = self.get(UserLoginHistoryView, user_id=self.user.pk)
+        statistics = response.data['statistics']
+        self.assertEqual(statistics['total_logins'], 5)
+        self.assertEqual(statistics['last_login'], self.last_login)
+        self.assertEqual(statistics['last_failed_login'], self.last_failed_login)
+
+    def test_user_statistics_without_logins(self):
+        response = self.get(UserLoginHistoryView, user_id=self.admin.pk)
+        statistics = response.data['statistics']
+        self.assertEqual(statistics['total_logins'], 0)
+        self.assertEqual(statistics['success_rate'], 0)
+        self.assertIsNone(statistics['last_login'])
+        self.assertIsNone(statistics['last_failed_login'])
+
+
+class LoginDailyStatsTests(TestCase):
+    """The daily rollup must give the same statistics as the raw rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dept = Department.objects.create(name='Finance', type='NON-CLINICAL')
+        cls.admin = UserAccounts.objects.create_superuser('admin', 'password', sur_name='Admin', first_name='Admin')
+        cls.user = UserAccounts.objects.create_employee(
+            'staff', 'password', sur_name='Staff', first_name='Staff', dept=cls.dept
+        )
+        cls.other = UserAccounts.objects.create_employee('other', 'password', sur_name='Other', first_name='Other')
+
+    def log_in(self, writer, user, days=0, **fields):
+        event = dict(user_id=user.pk, login_time=timezone.now() - timedelta(days=days), **fields)
+        event['login_date'] = timezone.localdate(event['login_time'])
+        writer.write([event])
+
+    def get(self, params=None, user=None, rollup=True):
+        request = APIRequestFactory().get('/', params or {})
+        force_authenticate(request, user=user or self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            statistics = LoginHistoryListView.as_view()(request).data['statistics']
+        self.assertEqual(any(LoginDailyStats._meta.db_table in query['sql'] for query in queries), rollup)
+        return statistics
+
+    def assertRollupCurrent(self):
+        stats = list(LoginDailyStats.objects.values_list(
+            'date', 'login_status', 'device_type', 'browser', 'os_type', 'count'
+        ))
+        rebuild_login_daily_stats()
+        self.assertCountEqual(stats, LoginDailyStats.objects.values_list(
+            'date', 'login_status', 'device_type', 'browser', 'os_type', 'count'
+        ))
+
+    def assertMatchesRaw(self, statistics, queryset):
+        expected = login_statistics(queryset)
+        for key in ('browser_breakdown', 'os_breakdown'):
+            self.assertCountEqual(statistics.pop(key), expected.pop(key))
+        self.assertEqual(statistics, expected)
+
+    def test_writer_and_record_login_keep_rollup_current(self):
+        writer = LoginHistoryWriter()
+        for days in (0, 1, 1, 3):
+            self.log_in(writer, self.user, days, browser='Chrome', os_type='Windows')
+        self.log_in(writer, self.other, 2, login_status='failed', device_type='mobile')
+        with override_settings(LOGIN_HISTORY_ASYNC=False):
+            record_login(user=self.user, browser='Firefox', os_type='Linux')
+        # users of different departments share a row
+        self.log_in(writer, self.other, 3, browser='Chrome', os_type='Windows')
+
+        self.assertRollupCurrent()
+        self.assertEqual(LoginDailyStats.objects.get(date=timezone.localdate(), browser='Chrome').count, 1)
+        self.assertEqual(
+            LoginDailyStats.objects.get(date=timezone.localdate() - timedelta(days=3), browser='Chrome').count, 2
+        )
+
+    def test_statistics_match_raw_rows(self):
+        writer = LoginHistoryWriter()
+        for days in (0, 0.5, 1, 1.5, 2, 6, 9, 30):
+            self.log_in(writer, self.user, days, browser='Chrome', os_type='Android', device_type='mobile')
+            self.log_in(writer, self.other, days, login_status='failed')
+
+        now = timezone.now()
+        start = now - timedelta(days=7)
+        for params, queryset in (
+            ({}, LoginHistory.objects.all()),
+            ({'login_status': 'failed'}, LoginHistory.objects.filter(login_status='failed')),
+            (
+                {'start_date': start.isoformat(), 'end_date': now.isoformat(), 'device_type': 'mobile'},
+                LoginHistory.objects.filter(login_time__range=[start, now], device_type='mobile'),
+            ),
+            (
+                {'start_date': start.date().isoformat(), 'end_date': (now - timedelta(days=1)).date().isoformat()},
+                LoginHistory.objects.filter(
+                    login_time__range=[start.date().isoformat(), (now - timedelta(days=1)).date().isoformat()]
+                ),
+            ),
+        ):
+            with self.subTest(params=params):
+                self.assertMatchesRaw(self.get(params), queryset)
+
+    def test_hod_statistics_cover_their_department(self):
+        writer = LoginHistoryWriter()
+        for days in (0, 2, 5):
+            self.log_in(writer, self.user, days)
+            self.log_in(writer, self.other, days)
+        hod = UserAccounts.objects.create_hod('hod', 'password', sur_name='Hod', first_name='Hod', dept=self.dept)
+        self.assertMatchesRaw(self.get(user=hod, rollup=False), LoginHistory.objects.filter(user__dept=self.dept))
+
+        # the rollup counted these logins under Finance; the HOD now sees them
+        # with the user's new department, like the rows they list
+        self.other.dept = self.dept
+        self.other.save()
+        self.user.dept = Department.objects.create(name='Audit', type='NON-CLINICAL')
+        self.user.save()
+        statistics = self.get(user=hod, rollup=False)
+        self.assertEqual(statistics['total_logins'], 3)
+        self.assertMatchesRaw(statistics, LoginHistory.objects.filter(user=self.other))
+
+    def test_deleted_logins_leave_rollup(self):
+        writer = LoginHistoryWriter()
+        for days in (0, 1, 1, 3):
+            self.log_in(writer, self.user, days, browser='Chrome', os_type='Windows')
+            self.log_in(writer, self.other, days, browser='Firefox', os_type='Linux')
+
+        LoginHistory.objects.filter(user=self.user, browser='Chrome').first().delete()
+        self.assertRollupCurrent()
+        LoginHistory.objects.filter(login_time__lt=timezone.now() - timedelta(days=2)).delete()
+        self.assertRollupCurrent()
+        self.assertMatchesRaw(self.get(), LoginHistory.objects.all())
+
+    def test_deleted_user_logins_leave_rollup(self):
+        writer = LoginHistoryWriter()
+        for days in (0, 1, 1, 3):
+            self.log_in(writer, self.user, days, browser='Chrome')
+            self.log_in(writer, self.other, days, browser='Firefox')
+
+        self.user.delete()
+        self.assertFalse(LoginHistory.objects.filter(user_id=self.user.pk).exists())
+        self.assertEqual(LoginDailyStats.objects.aggregate(total=Sum('count'))['total'], 4)
+        self.assertFalse(LoginDailyStats.objects.filter(browser='Chrome').exists())
+        self.assertMatchesRaw(self.get(), LoginHistory.objects.all())
+
+
+class LoginHistoryWriterTests(TestCase):
+    """Queued, journalled and spooled rows all reach the database."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccounts.objects.create_employee('staff', 'password', sur_name='Staff', first_name='Staff')
+
+    def setUp(self):
+        self.spool_dir = self.enterContext(tempfile.TemporaryDirectory())
+        # no writer thread: the tests flush themselves, inside the test transaction
+        self.enterContext(mock.patch.object(LoginHistoryWriter, 'ensure_started'))
+
+    def writer(self, **kwargs):
+        return LoginHistoryWriter(spool_dir=self.spool_dir, **kwargs)
+
+    def event(self, **fields):
+        now = timezone.now()
+        return {'user_id': self.user.pk, 'login_time': now, 'login_date': timezone.localdate(now), **fields}
+
+    def spool_files(self):
+        return sorted(os.listdir(self.spool_dir))
+
+    @skipIf(fcntl is None, "journals need fcntl")
+    def test_record_journals_rows_until_they_are_written(self):
+        writer = self.writer()
+        writer.record(self.event())
+        writer.record(self.event())
+        [journal] = self.spool_files()
+        self.assertTrue(journal.endswith(f'{SPOOL_SUFFIX}{JOURNAL_MARKER}{os.getpid()}'))
+
+        # another writer leaves the journal alone while its writer holds it
+        self.writer().replay_spool()
+        self.assertEqual(self.spool_files(), [journal])
+        self.assertFalse(LoginHistory.objects.exists())
+
+        self.assertEqual(writer.flush(), 2)
+        self.assertEqual(LoginHistory.objects.count(), 2)
+        self.assertEqual(self.spool_files(), [])
+
+    @skipIf(fcntl is None, "journals need fcntl")
+    def test_journal_of_killed_process_is_replayed(self):
+        killed = self.writer()
+        killed.record(self.event(browser='Chrome'))
+        killed.record(self.event(browser='Firefox'))
+        [journal] = self.spool_files()
+        # a killed process's lock goes with it, possibly in the middle of a line
+        killed._journal.close()
+        with open(os.path.join(self.spool_dir, journal), 'a', encoding='utf-8') as journal_file:
+            journal_file.write('{"user_id": ')
+
+        with self.assertLogs('UserAccounts.login_history', 'WARNING'):
+            self.writer().replay_spool()
+        self.assertCountEqual(LoginHistory.objects.values_list('browser', flat=True), ['Chrome', 'Firefox'])
+        self.assertEqual(LoginDailyStats.objects.aggregate(total=Sum('count'))['total'], 2)
+        self.assertEqual(self.spool_files(), [])
+
+    def test_full_queue_writes_in_request(self):
+        writer = self.writer(max_queue=1)
+        writer.record(self.event())
+        writer.record(self.event())
+        self.assertEqual(LoginHistory.objects.count(), 1)
+        self.assertEqual(writer.flush(), 1)
+        self.assertEqual(LoginHistory.objects.count(), 2)
+
+    def test_unreachable_database_spools_batch(self):
+        writer = self.writer()
+        with mock.patch.object(LoginHistory.objects, 'bulk_create', side_effect=OperationalError), \
+                self.assertLogs('UserAccounts.login_history', 'ERROR'):
+            self.assertFalse(writer.write([self.event(), self.event()]))
+        [spooled] = self.spool_files()
+        self.assertTrue(spooled.endswith(SPOOL_SUFFIX))
+        with open(os.path.join(self.spool_dir, spooled), encoding='utf-8') as spool_file:
+            self.assertEqual(len(spool_file.readlines()), 2)
+        self.assertFalse(LoginHistory.objects.exists())
+
+        writer.replay_spool()
+        self.assertEqual(LoginHistory.objects.count(), 2)
+        self.assertEqual(self.spool_files(), [])
+
+    def spool_claims(self, *browsers):
+        """Spool one batch per browser and claim each as a killed replayer would have left it."""
+        writer = self.writer()
+        with mock.patch.object(LoginHistory.objects, 'bulk_create', side_effect=OperationalError), \
+                self.assertLogs('UserAccounts.login_history', 'ERROR'):
+            for browser in browsers:
+                writer.write([self.event(browser=browser)])
+        # a finished process, and this one: a PID that has come back
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        claims = []
+        for name, pid in zip(self.spool_files(), (process.pid, os.getpid())):
+            claims.append(os.path.join(self.spool_dir, f'{name}{CLAIM_MARKER}{pid}'))
+            os.rename(os.path.join(self.spool_dir, name), claims[-1])
+        return claims
+
+    @skipIf(fcntl is None, "claims are only taken over with fcntl")
+    def test_abandoned_claims_are_taken_over(self):
+        self.spool_claims('Chrome', 'Firefox')
+        self.writer().replay_spool()
+        self.assertCountEqual(LoginHistory.objects.values_list('browser', flat=True), ['Chrome', 'Firefox'])
+        self.assertEqual(self.spool_files(), [])
+
+    @skipIf(fcntl is None, "claims are only taken over with fcntl")
+    def test_held_claim_is_left_alone(self):
+        abandoned, held = self.spool_claims('Chrome', 'Firefox')
+        with open(held, encoding='utf-8') as held_file:
+            fcntl.flock(held_file, fcntl.LOCK_EX)
+            self.writer().replay_spool()
+        self.assertEqual(list(LoginHistory.objects.values_list('browser', flat=True)), ['Chrome'])
+        self.assertEqual(self.spool_files(), [os.path.basename(held)])
+
+    def test_rejected_row_does_not_hold_back_batch(self):
+        writer = self.writer()
+        with self.assertLogs('UserAccounts.login_history', 'ERROR'):
+            self.assertTrue(writer.write([self.event(), self.event(login_status=None), self.event()]))
+        self.assertEqual(LoginHistory.objects.count(), 2)
+        self.assertEqual(LoginDailyStats.objects.aggregate(total=Sum('count'))['total'], 2)
+        self.assertEqual(self.spool_files(), [])
+
+
+# user agent, then browser, browser version, OS, OS version, device type and bot flag
+USER_AGENT_CASES = [
+    (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+        ('Chrome', '124.0.0.0', 'Windows', '10', 'desktop', False),
+    ),
+    (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 Edg/124.0.2478.51",
+        ('Edge', '124.0.2478.51', 'Windows', '10', 'desktop', False),
+    ),
+    (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0",
+        ('Firefox', '125.0', 'Windows', '10', 'desktop', False),
+    ),
+    (
+        "Mozilla/5.0 (Windows NT 6.1; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36 OPR/95.0.0.0",
+        ('Opera', '95.0.0.0', 'Windows', '7', 'desktop', False),
+    ),
+    (
+        "Mozilla/5.0 (Windows NT 6.1; WOW64; Trident/7.0; rv:11.0) like Gecko",
+        ('Internet Explorer', '11.0', 'Windows', '7', 'desktop', False),
+    ),
+    (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4.1 Safari/605.1.15",
+        ('Safari', '17.4.1', 'MacOS', '10.15.7', 'desktop', False),
+    ),
+    (
+        "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:124.0) Gecko/20100101 Firefox/124.0",
+        ('Firefox', '124.0', 'Linux', 'Unknown', 'desktop', False),
+    ),
+    (
+        "Mozilla/5.0 (X11; CrOS x86_64 14541.0.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+        ('Chrome', '124.0.0.0', 'Chrome OS', '14541.0.0', 'desktop', False),
+    ),
+    (
+        "Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36",
+        ('Chrome', '124.0.0.0', 'Android', '10', 'mobile', False),
+    ),
+    (
+        "Mozilla/5.0 (Linux; Android 13; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/24.0 Chrome/117.0.0.0 Mobile Safari/537.36",
+        ('Samsung Internet', '24.0', 'Android', '13', 'mobile', False),
+    ),
+    (
+        # an Android tablet: no "Mobile"
+        "Mozilla/5.0 (Linux; Android 14; SM-X710) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+        ('Chrome', '124.0.0.0', 'Android', '14', 'tablet', False),
+    ),
+    (
+        "Mozilla/5.0 (Linux; Android 13; Pixel 7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36 EdgA/124.0.2478.50",
+        ('Edge', '124.0.2478.50', 'Android', '13', 'mobile', False),
+    ),
+    (
+        "Mozilla/5.0 (Android 14; Mobile; rv:125.0) Gecko/125.0 Firefox/125.0",
+        ('Firefox', '125.0', 'Android', '14', 'mobile', False),
+    ),
+    (
+        "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4.1 Mobile/15E148 Safari/604.1",
+        ('Safari', '17.4.1', 'iOS', '17.4.1', 'mobile', False),
+    ),
+    (
+        "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) CriOS/124.0.6367.88 Mobile/15E148 Safari/604.1",
+        ('Chrome', '124.0.6367.88', 'iOS', '17.4', 'mobile', False),
+    ),
+    (
+        "Mozilla/5.0 (iPad; CPU OS 16_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.6 Mobile/15E148 Safari/604.1",
+        ('Safari', '16.6', 'iOS', '16.6', 'tablet', False),
+    ),
+    (
+        # an in-app web view
+        "Mozilla/5.0 (iPhone; CPU iPhone OS 16_7 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148",
+        ('Safari', 'Unknown', 'iOS', '16.7', 'mobile', False),
+    ),
+    (
+        "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+        ('Unknown', 'Unknown', 'Unknown', 'Unknown', 'other', True),
+    ),
+    (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) HeadlessChrome/124.0.0.0 Safari/537.36",
+        ('Chrome', '124.0.0.0', 'Windows', '10', 'other', True),
+    ),
+    ("python-requests/2.31.0", ('Unknown', 'Unknown', 'Unknown', 'Unknown', 'other', True)),
+    ("curl/8.4.0", ('Unknown', 'Unknown', 'Unknown', 'Unknown', 'other', True)),
+    ("okhttp/4.12.0", ('Unknown', 'Unknown', 'Unknown', 'Unknown', 'other', True)),
+    ("", ('Unknown', 'Unknown', 'Unknown', 'Unknown', 'desktop', False)),
+    (None, ('Unknown', 'Unknown', 'Unknown', 'Unknown', 'desktop', False)),
+]
+
+
+class UserAgentTests(TestCase):
+    """parse_user_agent() on user agents sent by real browsers, apps and crawlers."""
+
+    def test_user_agents(self):
+        for user_agent, expected in USER_AGENT_CASES:
+            with self.subTest(user_agent=user_agent):
+                self.assertEqual(parse_user_agent(user_agent), UserAgent(*expected))
+
+    def test_hostile_user_agents_parse_quickly(self):
+        for user_agent in (
+            'iPhone AppleWebKit/' * 400,
+            '(iPhone ' * 1000,
+            'Trident/' * 1000,
+            'Version/1 ' * 800,
+            'Mozilla/5.0 (iPhone' + ' AppleWebKit/1 Mobile' * 300,
+        ):
+            with self.subTest(user_agent=user_agent[:40]):
+                user_agents._parse_user_agent.cache_clear()
+                started = time.perf_counter()
+                parse_user_agent(user_agent)
+                self.assertLess(time.perf_counter() - started, 0.05)
+
+    def test_long_user_agents_are_cut_before_caching(self):
+        user_agent = USER_AGENT_CASES[0][0]
+        padding = ' ' + 'x' * MAX_USER_AGENT_LENGTH
+        user_agents._parse_user_agent.cache_clear()
+        self.assertEqual(parse_user_agent(user_agent + padding), parse_user_agent(user_agent + padding * 2))
+        self.assertEqual(user_agents._parse_user_agent.cache_info().currsize, 1)
+
+    def test_device_flags(self):
+        for device_type, flags in (
+            ('desktop', (True, False, False)),
+            ('mobile', (False, True, False)),
+            ('tablet', (False, False, True)),
+            ('other', (False, False, False)),
+        ):
+            with self.subTest(device_type=device_type):
+                login = LoginHistory(device_type=device_type)
+                login.set_device_flags()
+                self.assertEqual((login.is_desktop, login.is_mobile, login.is_tablet), flags)
+
+
+class UserRoleTests(TestCase):
+    """role follows the flags on every save, and ?role= filters on the flags."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = UserAccounts.objects.create_superuser('admin', 'password', sur_name='Admin', first_name='Admin')
+        cls.hr_hod = UserAccounts.objects.create_user('hrhod', 'password', sur_name='Hr', first_name='Hod', is_hr=True, is_hod=True)
+        cls.hod = UserAccounts.objects.create_user('hod', 'password', sur_name='Hod', first_name='Hod', is_hod=True)
+        cls.staff = UserAccounts.objects.create_user('staff', 'password', sur_name='Staff', first_name='Staff')
+
+    def stored_role(self, user):
+        return UserAccounts.objects.values_list('role', flat=True).get(pk=user.pk)
+
+    def test_role_on_create(self):
+        self.assertEqual(
+            [self.stored_role(user) for user in (self.admin, self.hr_hod, self.hod, self.staff)],
+            ['superuser', 'hr', 'hod', 'employee'],
+        )
+
+    def test_save_syncs_role(self):
+        self.staff.is_unit_head = True
+        self.staff.save()
+        self.assertEqual(self.stored_role(self.staff), 'unit_head')
+
+    def test_save_with_update_fields_syncs_role(self):
+        self.hr_hod.is_hr = False
+        self.hr_hod.save(update_fields=['is_hr'])
+        self.assertEqual(self.stored_role(self.hr_hod), 'hod')
+        self.hod.is_hod = False
+        self.hod.save(update_fields=('is_hod',))
+        self.assertEqual(self.stored_role(self.hod), 'employee')
+
+    def test_update_fields_without_flags_leave_role_alone(self):
+        # a flag changed in memory is not saved unless it is named
+        self.staff.is_manager = True
+        self.staff.sur_name = 'Renamed'
+        self.staff.save(update_fields=['sur_name'])
+        self.assertEqual(
+            UserAccounts.objects.values_list('sur_name', 'is_manager', 'role').get(pk=self.staff.pk),
+            ('Renamed', False, 'employee'),
+        )
+
+    def list_usernames(self, role):
+        request = APIRequestFactory().get('/', {'role': role})
+        force_authenticate(request, user=self.admin)
+        response = UserListView.as_view()(request)
+        return sorted(row['username'] for row in response.data)
+
+    def test_filter_on_flags(self):
+        # create_superuser sets every flag, so the superuser holds every role
+        self.assertEqual(self.list_usernames('hod'), ['admin', 'hod', 'hrhod'])
+        self.assertEqual(self.list_usernames('hr'), ['admin', 'hrhod'])
+        self.assertEqual(self.list_usernames('manager'), ['admin'])
+        self.assertEqual(self.list_usernames('superuser'), ['admin'])
+        self.assertEqual(self.list_usernames('employee'), ['staff'])
+
+    def test_unknown_role_is_ignored(self):
+        self.assertEqual(self.list_usernames('janitor'), ['admin', 'hod', 'hrhod', 'staff'])
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    """Cached users follow every change to the account, in every process."""
+
+    @classmethod
+    def setUpClass(cls):
+        # a file-based cache is shared by every process on the host
+        location = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccounts.objects.create_user('hod', 'password', sur_name='Hod', first_name='Hod', is_hod=True)
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.token = AccessToken(str(AccessToken.for_user(self.user)))
+
+    def authenticate(self):
+        return CachedJWTAuthentication().get_user(self.token)
+
+    def change(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            user = UserAccounts.objects.get(pk=self.user.pk)
+            for name, value in fields.items():
+                setattr(user, name, value)
+            user.save()
+        return user
+
+    def test_served_from_cache(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate().pk, self.user.pk)
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertEqual((user.username, user.is_hod, user.dept_id), ('hod', True, None))
+
+    def test_password_hash_is_not_cached(self):
+        self.authenticate()
+        version = cache.get(employee_version_key(self.user.pk))
+        cached = cache.get(shared_cache_key(self.user.pk, version))
+        self.assertNotIn('password', cached)
+        self.assertNotIn(self.user.password, cached.values())
+        # it loads on demand
+        with self.assertNumQueries(1):
+            self.assertTrue(self.authenticate().check_password('password'))
+
+    def test_deactivation(self):
+        self.authenticate()
+        self.change(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_password_change(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            user = UserAccounts.objects.get(pk=self.user.pk)
+            user.set_password('changed')
+            user.save()
+        self.assertTrue(self.authenticate().check_password('changed'))
+
+    def test_role_change(self):
+        self.assertTrue(self.authenticate().is_hod)
+        self.change(is_hod=False, is_hr=True)
+        user = self.authenticate()
+        self.assertEqual((user.is_hod, user.is_hr, user.role), (False, True, 'hr'))
+
+    def test_change_in_another_process(self):
+        self.authenticate()
+        # the row changed and the stamp moved, but not through this process
+        UserAccounts.objects.filter(pk=self.user.pk).update(is_active=False)
+        bump_version(employee_version_key(self.user.pk))
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_other_users_stay_cached(self):
+        other = UserAccounts.objects.create_user('staff', 'password', sur_name='Staff', first_name='Staff')
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            other.sur_name = 'Renamed'
+            other.save()
+        with self.assertNumQueries(0):
+            self.authenticate()
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_local_memory_cache_is_not_used(self):
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                self.authenticate()
+        self.change(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
@@ -0,0 +1,113 @@
+"""
+User-agent parsing for login history.
+
+The tables below are tried in order and the first match wins, so the more
+specific products come first: Edge, Opera and Samsung Internet all claim to
+be Chrome and Safari, and Chrome claims to be Safari. Results are memoised
+in a bounded LRU cache because the same few user-agent strings log in over
+and over.
+
+The header is client-controlled, so it is cut to MAX_USER_AGENT_LENGTH before
+it reaches the patterns or the cache, and the gaps inside a pattern never span
+more than one parenthesised comment or a couple of space-separated tokens: a
+free `.*` between repeated tokens backtracks polynomially on hostile input.
+"""
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+UNKNOWN = 'Unknown'
+USER_AGENT_CACHE_SIZE = 1024
+# LoginHistory's browser/os columns are CharField(max_length=50)
+MAX_LENGTH = 50
+# real user agents stay well under this; longer ones are cut before parsing
+MAX_USER_AGENT_LENGTH = 512
+
+
+class UserAgent(NamedTuple):
+    browser: str
+    browser_version: str
+    os_type: str
+    os_version: str
+    device_type: str
+    is_bot: bool
+
+
+BOT_RE = re.compile(
+    r'bot\b|crawl|spider|slurp|headless|python-requests|python-urllib|curl/|wget/|okhttp|'
+    r'go-http-client|java/|facebookexternalhit',
+    re.IGNORECASE,
+)
+
+# (browser, pattern with the version as group 1)
+BROWSERS = [(name, re.compile(pattern)) for name, pattern in (
+    ('Edge', r'(?:Edg|Edge|EdgA|EdgiOS)/([\d.]+)'),
+    ('Opera', r'(?:OPR|OPiOS|Opera)/([\d.]+)'),
+    ('Samsung Internet', r'SamsungBrowser/([\d.]+)'),
+    ('Firefox', r'(?:Firefox|FxiOS)/([\d.]+)'),
+    ('Chrome', r'(?:CriOS|Chrome)/([\d.]+)'),
+    ('Internet Explorer', r'(?:MSIE |Trident/[^)]*rv:)([\d.]+)'),
+    ('Safari', r'Version/([\d.]+) (?:[^ ]+ ){0,2}Safari/'),
+    # in-app web views on iOS
+    ('Safari', r'\((?:iPhone|iPad|iPod)[^)]*\) AppleWebKit/[^ ]+ (?:\([^)]*\) )?Mobile/()'),
+)]
+
+# (os, pattern with the version as group 1, '_' separated on Apple platforms)
+OPERATING_SYSTEMS = [(name, re.compile(pattern)) for name, pattern in (
+    ('Windows Phone', r'Windows Phone(?: OS)? ([\d.]+)'),
+    ('Windows', r'Windows NT ([\d.]+)'),
+    ('iOS', r'\((?:iPhone|iPad|iPod)[^)]*? OS ([\d_]+)'),
+    ('Android', r'Android ?([\d.]*)'),
+    ('Chrome OS', r'CrOS \S+ ([\d.]+)'),
+    ('MacOS', r'Mac OS X ?([\d_.]*)'),
+    ('Linux', r'Linux()'),
+)]
+
+WINDOWS_VERSIONS = {'10.0': '10', '6.3': '8.1', '6.2': '8', '6.1': '7', '6.0': 'Vista', '5.1': 'XP'}
+
+TABLET_RE = re.compile(r'iPad|Tablet|PlayBook|Silk/|Kindle')
+MOBILE_RE = re.compile(r'Mobi|iPhone|iPod|Windows Phone|Opera Mini')
+
+
+def _first_match(table, user_agent):
+    for name, pattern in table:
+        match = pattern.search(user_agent)
+        if match:
+            return name, match.group(1)
+    return UNKNOWN, ''
+
+
+def _device_type(user_agent, os_type, is_bot):
+    if is_bot:
+        return 'other'
+    if TABLET_RE.search(user_agent):
+        return 'tablet'
+    if MOBILE_RE.search(user_agent):
+        return 'mobile'
+    # Android tablets leave "Mobile" out
+    if os_type == 'Android':
+        return 'tablet'
+    return 'desktop'
+
+
+def parse_user_agent(user_agent):
+    """Browser, OS, their versions, device type and bot flag of a User-Agent header."""
+    return _parse_user_agent((user_agent or '')[:MAX_USER_AGENT_LENGTH])
+
+
+@lru_cache(maxsize=USER_AGENT_CACHE_SIZE)
+def _parse_user_agent(user_agent):
+    is_bot = bool(BOT_RE.search(user_agent))
+    browser, browser_version = _first_match(BROWSERS, user_agent)
+    os_type, os_version = _first_match(OPERATING_SYSTEMS, user_agent)
+    if os_type == 'Windows':
+        os_version = WINDOWS_VERSIONS.get(os_version, os_version)
+    os_version = os_version.replace('_', '.')
+    return UserAgent(
+        browser=browser,
+        browser_version=browser_version[:MAX_LENGTH] or UNKNOWN,
+        os_type=os_type,
+        os_version=os_version[:MAX_LENGTH] or UNKNOWN,
+        device_type=_device_type(user_agent, os_type, is_bot),
+        is_bot=is_bot,
+    )
@@ -7,12 +7,15 @@ from .serializers import *
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.exceptions import PermissionDenied
 
-from .models import UserAccounts
+from .models import ROLE_FLAGS, UserAccounts
 # from core.api.permissions import IsAdminOrHROrHOD, CanRegisterUser,CanUpdateOwnUsernameOrPassword
 from core.api.permissions import *
+from core.api.pagination import LoginHistoryPagination
+from core.api.parsers import FastJSONParser
+from .login_stats import login_statistics, parse_bound, rollup_login_statistics
 from django.db.models import Q
 
 
@@ -74,7 +77,7 @@ class UserProfileUpdateView(UpdateAPIView):
     """
     permission_classes = [IsAuthenticated]
     serializer_class = UserProfileUpdateSerializer
-    parser_classes = (MultiPartParser, FormParser, JSONParser)  # Added JSONParser
+    parser_classes = (MultiPartParser, FormParser, FastJSONParser)  # Added JSONParser
     
     def get_object(self):
         """
@@ -109,7 +112,7 @@ class UserProfileAdminUpdateView(UpdateAPIView):
     """
     permission_classes = [IsAuthenticated, IsAdminOrHROrHOD]
     serializer_class = UserProfileAdminUpdateSerializer
-    parser_classes = (MultiPartParser, FormParser, JSONParser)
+    parser_classes = (MultiPartParser, FormParser, FastJSONParser)
     
     def get_object(self):
         """
@@ -152,7 +155,7 @@ class UserProfileByIDUpdateView(UpdateAPIView):
     """
     permission_classes = [IsAuthenticated, IsAdminOrHROrHOD]
     serializer_class = UserProfileByIDUpdateSerializer
-    parser_classes = (MultiPartParser, FormParser, JSONParser)
+    parser_classes = (MultiPartParser, FormParser, FastJSONParser)
     
     def get_object(self):
         """
@@ -271,7 +274,8 @@ class UserListView(ListAPIView):
         return User.objects.none()  # Return empty queryset for unauthorized users
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
+        # only the columns and relations behind ?fields= / ?omit=
+        queryset = UserListSerializer.sparse_queryset(self.get_queryset(), request)
         
         # Apply search filter if provided
         search_query = request.query_params.get('search', None)
@@ -293,27 +297,14 @@ class UserListView(ListAPIView):
         if unit_id:
             queryset = queryset.filter(unit_id=unit_id)
         
-        # Apply role filter if provided
+        # Apply role filter if provided: everyone holding the role's flag,
+        # whatever their primary role; employees hold none (indexed column)
         role = request.query_params.get('role', None)
-        if role:
-            if role == 'superuser':
-                queryset = queryset.filter(is_superuser=True)
-            elif role == 'hr':
-                queryset = queryset.filter(is_hr=True)
-            elif role == 'hod':
-                queryset = queryset.filter(is_hod=True)
-            elif role == 'unit_head':
-                queryset = queryset.filter(is_unit_head=True)
-            elif role == 'manager':
-                queryset = queryset.filter(is_manager=True)
-            elif role == 'employee':
-                queryset = queryset.filter(
-                    is_superuser=False,
-                    is_hr=False,
-                    is_hod=False,
-                    is_unit_head=False,
-                    is_manager=False
-                )
+        role_flags = {role: flag for flag, role in ROLE_FLAGS}
+        if role in role_flags:
+            queryset = queryset.filter(**{role_flags[role]: True})
+        elif role == 'employee':
+            queryset = queryset.filter(role='employee')
         
         # Apply active status filter if provided
         is_active = request.query_params.get('is_active', None)
@@ -357,21 +348,13 @@ class AccountStatusHistoryView(ListAPIView):
             'user__first_name',
             'user__sur_name',
             'user__is_active',
-            'user__is_superuser',
-            'user__is_hr',
-            'user__is_hod',
-            'user__is_unit_head',
-            'user__is_manager',
+            'user__role',
             'changed_by__id',
             'changed_by__username',
             'changed_by__first_name',
             'changed_by__sur_name',
             'changed_by__is_active',
-            'changed_by__is_superuser',
-            'changed_by__is_hr',
-            'changed_by__is_hod',
-            'changed_by__is_unit_head',
-            'changed_by__is_manager'
+            'changed_by__role'
         ).all()
         
         # Apply filters based on user role
@@ -621,42 +604,63 @@ class LoginHistoryListView(ListAPIView):
     """
     serializer_class = LoginHistorySerializer
     permission_classes = [IsAuthenticated, CanViewLoginHistory]
+    pagination_class = LoginHistoryPagination
     
     def get_queryset(self):
         user = self.request.user
         
-        # Base queryset with select_related for user
-        queryset = LoginHistory.objects.select_related('user').all()
+        # LoginHistorySerializer shows no user fields, so no join
+        queryset = LoginHistory.objects.all()
         
         # Apply filters based on user role
         if user.is_superuser or user.is_hr:
             return queryset
         elif user.is_hod:
-            return queryset.filter(user__dept=user.dept)
+            return queryset.filter(user__dept_id=user.dept_id)
         elif user.is_unit_head:
-            return queryset.filter(user__unit=user.unit)
+            return queryset.filter(user__unit_id=user.unit_id)
         else:
             return queryset.filter(user=user)
     
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        
-        # Calculate statistics
-        total_logins = queryset.count()
-        successful_logins = queryset.filter(login_status='success').count()
-        failed_logins = queryset.filter(login_status='failed').count()
-        blocked_logins = queryset.filter(login_status='blocked').count()
-        
-        # Device statistics
-        desktop_logins = queryset.filter(device_type='desktop').count()
-        mobile_logins = queryset.filter(device_type='mobile').count()
-        tablet_logins = queryset.filter(device_type='tablet').count()
+    def get_rollup_queryset(self):
+        """
+        LoginDailyStats rows matching get_queryset() and the filters, or None
+        when the rollup cannot answer them (department, unit and per-user
+        scopes, user_id).
+        """
+        user = self.request.user
+        if self.request.query_params.get('user_id'):
+            return None
+        # the rollup has no department or unit to narrow it by
+        if not (user.is_superuser or user.is_hr):
+            return None
         
-        # Browser statistics
-        browser_stats = queryset.values('browser').annotate(count=models.Count('browser'))
+        rollup = LoginDailyStats.objects.all()
         
-        # OS statistics
-        os_stats = queryset.values('os_type').annotate(count=models.Count('os_type'))
+        login_status = self.request.query_params.get('login_status')
+        if login_status:
+            rollup = rollup.filter(login_status=login_status)
+        device_type = self.request.query_params.get('device_type')
+        if device_type:
+            rollup = rollup.filter(device_type=device_type)
+        return rollup
+    
+    def get_statistics(self, queryset):
+        # whole past days from the daily rollup, when it can answer the filters
+        rollup = self.get_rollup_queryset()
+        start = end = None
+        start_date = self.request.query_params.get('start_date')
+        end_date = self.request.query_params.get('end_date')
+        if start_date and end_date:
+            start, end = parse_bound(start_date), parse_bound(end_date)
+            if start is None or end is None:
+                rollup = None
+        if rollup is None:
+            return login_statistics(queryset)
+        return rollup_login_statistics(queryset, rollup, start, end)
+    
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
         
         # Apply date range filter if provided
         start_date = request.query_params.get('start_date')
@@ -681,6 +685,9 @@ class LoginHistoryListView(ListAPIView):
         if device_type:
             queryset = queryset.filter(device_type=device_type)
         
+        # Calculate statistics over the filtered rows
+        statistics = self.get_statistics(queryset)
+        
         # Add pagination
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -688,45 +695,16 @@ class LoginHistoryListView(ListAPIView):
             response = self.get_paginated_response(serializer.data)
             
             # Add statistics to the response
-            response.data['statistics'] = {
-                'total_logins': total_logins,
-                'successful_logins': successful_logins,
-                'failed_logins': failed_logins,
-                'blocked_logins': blocked_logins,
-                'success_rate': round((successful_logins / total_logins * 100) if total_logins > 0 else 0, 2),
-                'failure_rate': round((failed_logins / total_logins * 100) if total_logins > 0 else 0, 2),
-                'block_rate': round((blocked_logins / total_logins * 100) if total_logins > 0 else 0, 2),
-                'device_breakdown': {
-                    'desktop': desktop_logins,
-                    'mobile': mobile_logins,
-                    'tablet': tablet_logins
-                },
-                'browser_breakdown': list(browser_stats),
-                'os_breakdown': list(os_stats)
-            }
+            response.data['statistics'] = statistics
             return response
         
         serializer = self.get_serializer(queryset, many=True)
         return Response({
             'results': serializer.data,
-            'statistics': {
-                'total_logins': total_logins,
-                'successful_logins': successful_logins,
-                'failed_logins': failed_logins,
-                'blocked_logins': blocked_logins,
-                'success_rate': round((successful_logins / total_logins * 100) if total_logins > 0 else 0, 2),
-                'failure_rate': round((failed_logins / total_logins * 100) if total_logins > 0 else 0, 2),
-                'block_rate': round((blocked_logins / total_logins * 100) if total_logins > 0 else 0, 2),
-                'device_breakdown': {
-                    'desktop': desktop_logins,
-                    'mobile': mobile_logins,
-                    'tablet': tablet_logins
-                },
-                'browser_breakdown': list(browser_stats),
-                'os_breakdown': list(os_stats)
-            }
+            'statistics': statistics
         })
         
+
 # view to list user login history using user_id
 class UserLoginHistoryView(ListAPIView):
     """
@@ -735,6 +713,7 @@ class UserLoginHistoryView(ListAPIView):
     """
     serializer_class = LoginHistorySerializer
     permission_classes = [IsAuthenticated, CanViewLoginHistory]
+    pagination_class = LoginHistoryPagination
     
     def get_queryset(self):
         user_id = self.kwargs.get('user_id')
@@ -743,33 +722,16 @@ class UserLoginHistoryView(ListAPIView):
         
         # Check if the requesting user has permission to view this user's history
         if not (request_user.is_superuser or request_user.is_hr or 
-                (request_user.is_hod and user.dept == request_user.dept) or
-                (request_user.is_unit_head and user.unit == request_user.unit) or
+                (request_user.is_hod and user.dept_id == request_user.dept_id) or
+                (request_user.is_unit_head and user.unit_id == request_user.unit_id) or
                 request_user.id == user_id):
             raise PermissionDenied("You don't have permission to view this user's login history.")
         
-        return LoginHistory.objects.filter(user=user).select_related('user')
+        return LoginHistory.objects.filter(user=user)
     
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
         
-        # Calculate statistics
-        total_logins = queryset.count()
-        successful_logins = queryset.filter(login_status='success').count()
-        failed_logins = queryset.filter(login_status='failed').count()
-        blocked_logins = queryset.filter(login_status='blocked').count()
-        
-        # Device statistics
-        desktop_logins = queryset.filter(device_type='desktop').count()
-        mobile_logins = queryset.filter(device_type='mobile').count()
-        tablet_logins = queryset.filter(device_type='tablet').count()
-        
-        # Browser statistics
-        browser_stats = queryset.values('browser').annotate(count=models.Count('browser'))
-        
-        # OS statistics
-        os_stats = queryset.values('os_type').annotate(count=models.Count('os_type'))
-        
         # Apply date range filter if provided
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
@@ -788,6 +750,9 @@ class UserLoginHistoryView(ListAPIView):
         if device_type:
             queryset = queryset.filter(device_type=device_type)
         
+        # Calculate statistics over the filtered rows
+        statistics = login_statistics(queryset, last_logins=True)
+        
         # Add pagination
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -795,49 +760,16 @@ class UserLoginHistoryView(ListAPIView):
             response = self.get_paginated_response(serializer.data)
             
             # Add statistics to the response
-            response.data['statistics'] = {
-                'total_logins': total_logins,
-                'successful_logins': successful_logins,
-                'failed_logins': failed_logins,
-                'blocked_logins': blocked_logins,
-                'success_rate': round((successful_logins / total_logins * 100) if total_logins > 0 else 0, 2),
-                'failure_rate': round((failed_logins / total_logins * 100) if total_logins > 0 else 0, 2),
-                'block_rate': round((blocked_logins / total_logins * 100) if total_logins > 0 else 0, 2),
-                'device_breakdown': {
-                    'desktop': desktop_logins,
-                    'mobile': mobile_logins,
-                    'tablet': tablet_logins
-                },
-                'browser_breakdown': list(browser_stats),
-                'os_breakdown': list(os_stats),
-                'last_login': queryset.order_by('-login_time').first().login_time if queryset.exists() else None,
-                'last_failed_login': queryset.filter(login_status='failed').order_by('-login_time').first().login_time if queryset.filter(login_status='failed').exists() else None
-            }
+            response.data['statistics'] = statistics
             return response
         
         serializer = self.get_serializer(queryset, many=True)
         return Response({
             'results': serializer.data,
-            'statistics': {
-                'total_logins': total_logins,
-                'successful_logins': successful_logins,
-                'failed_logins': failed_logins,
-                'blocked_logins': blocked_logins,
-                'success_rate': round((successful_logins / total_logins * 100) if total_logins > 0 else 0, 2),
-                'failure_rate': round((failed_logins / total_logins * 100) if total_logins > 0 else 0, 2),
-                'block_rate': round((blocked_logins / total_logins * 100) if total_logins > 0 else 0, 2),
-                'device_breakdown': {
-                    'desktop': desktop_logins,
-                    'mobile': mobile_logins,
-                    'tablet': tablet_logins
-                },
-                'browser_breakdown': list(browser_stats),
-                'os_breakdown': list(os_stats),
-                'last_login': queryset.order_by('-login_time').first().login_time if queryset.exists() else None,
-                'last_failed_login': queryset.filter(login_status='failed').order_by('-login_time').first().login_time if queryset.filter(login_status='failed').exists() else None
-            }
+            'statistics': statistics
         })
 
+
 class LoginHistoryDetailView(RetrieveAPIView):
     """
     View to get detailed information about a specific login history record.
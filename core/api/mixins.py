@@ -0,0 +1,67 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework import generics
+
+
+class ConditionalListMixin:
+    """
+    ETag / Last-Modified support for list endpoints that are polled.
+
+    The validators come from one aggregate over the filtered queryset: Count,
+    Max(last_modified_field) and the Max of each of `related_modified_fields`
+    (timestamps of related rows the response shows, e.g. the employee behind
+    a name). get_extra_state() adds data the rows do not reach at all, such
+    as the holidays behind working days. Everything is read from the
+    database, so every process gives the same validators for the same data.
+
+    A matching If-None-Match or If-Modified-Since gets a 304 before any row
+    is fetched or serialized. Deletions change the count, so they only show
+    up in the ETag, which clients send in preference to If-Modified-Since.
+    """
+    last_modified_field = 'updated'
+    related_modified_fields = ()
+
+    def get_validator_queryset(self):
+        # the plain filtered queryset, before any values() conversion
+        return generics.GenericAPIView.filter_queryset(self, self.get_queryset())
+
+    def get_extra_state(self):
+        """
+        (fingerprint, last modified or None) of data the response depends on
+        besides the rows and their relations.
+        """
+        return '', None
+
+    def get_list_validators(self, request):
+        modified_fields = (self.last_modified_field, *self.related_modified_fields)
+        state = self.get_validator_queryset().order_by().aggregate(
+            count=Count('pk'), **{f'modified_{i}': Max(field) for i, field in enumerate(modified_fields)}
+        )
+        extra_fingerprint, extra_modified = self.get_extra_state()
+        timestamps = [state[f'modified_{i}'] for i in range(len(modified_fields))] + [extra_modified]
+        fingerprint = ':'.join([
+            str(state['count']),
+            ','.join(timestamp.isoformat() if timestamp else '' for timestamp in timestamps),
+            extra_fingerprint,
+            request.get_full_path(),
+            request.accepted_media_type or '',
+        ])
+        etag = quote_etag(hashlib.md5(fingerprint.encode()).hexdigest())
+        last_modified = max((timestamp for timestamp in timestamps if timestamp), default=None)
+        # HTTP dates have whole seconds
+        return etag, int(last_modified.timestamp()) if last_modified else None
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.get_list_validators(request)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # polls must revalidate, and shared caches must not keep user data
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,59 @@
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+# Hard ceiling on page sizes a client can ask for
+MAX_PAGE_SIZE = 200
+
+
+class OffsetPagination(LimitOffsetPagination):
+    default_limit = 50
+    max_limit = MAX_PAGE_SIZE
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination: every page, however deep, is an index range scan on
+    `ordering` instead of an OFFSET that reads and discards earlier rows.
+
+    ?page_size= picks the page size up to MAX_PAGE_SIZE. Clients that need
+    random access can opt into offset pagination by passing ?limit= and/or
+    ?offset=, with the same ceiling.
+
+    DRF positions the cursor on the first `ordering` field only; rows that
+    tie on it are stepped over with an offset, and the later fields only
+    fix their order. Paging through ties is exact as long as no row with
+    the same value is added or removed between two pages.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+    offset_pagination_class = OffsetPagination
+
+    def use_offset(self, request):
+        params = request.query_params
+        return OffsetPagination.limit_query_param in params or OffsetPagination.offset_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_offset(request):
+            self.offset_paginator = self.offset_pagination_class()
+            return self.offset_paginator.paginate_queryset(queryset.order_by(*self.ordering), request, view)
+        self.offset_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+# newest first; id breaks ties between rows created in the same instant
+class LeaveRequestPagination(KeysetPagination):
+    ordering = ('-created_on', '-id')
+
+
+class LoginHistoryPagination(KeysetPagination):
+    ordering = ('-login_time', '-id')
+
+
+# search results are ordered by relevance, which has no stable cursor
+class LeaveSearchPagination(OffsetPagination):
+    default_limit = 25
@@ -9,7 +9,7 @@ class IsOwnerOrAdminHRManager(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         # Check if the user is trying to edit/cancel their own leave
-        if obj.employee == request.user:
+        if obj.employee_id == request.user.pk:
             return True
 
         # TODO
@@ -26,7 +26,7 @@ class IsOwnerOrSuperAdmin(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         # Check if the user is trying to edit/cancel their own leave
-        if obj.employee == request.user:
+        if obj.employee_id == request.user.pk:
             return True
 
         if request.user.is_superuser:
@@ -56,7 +56,7 @@ class IsUnitHeadRecommend(permissions.BasePermission):
 
         return (
             user.is_unit_head and
-            obj.employee.unit == user.unit
+            obj.employee.unit_id == user.unit_id
         )
         
 class IsHodOrManager(permissions.BasePermission):
@@ -80,7 +80,7 @@ class IsHodOrManager(permissions.BasePermission):
 
         return (
             user.is_manager and user.is_hod and
-            obj.employee.dept == user.dept
+            obj.employee.dept_id == user.dept_id
         )  
         
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -116,6 +116,13 @@ class IsSuperuserDeleteOrReadOnly(permissions.BasePermission):
         # Disallow all other unsafe methods (e.g., POST, PUT, PATCH)
         return False
 
+class IsHROrSuperuser(permissions.BasePermission):
+    """
+    Custom permission to allow only HR and superusers, e.g. for bulk imports.
+    """
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and (request.user.is_superuser or request.user.is_hr)
+
 class IsAdminOrHROrHOD(permissions.BasePermission):
     """
     Custom permission to allow only:
@@ -142,11 +149,11 @@ class IsAdminOrHROrHOD(permissions.BasePermission):
 
         # HOD can only update users in their department
         if request.user.is_hod:
-            return obj.dept == request.user.dept
+            return obj.dept_id == request.user.dept_id
 
         # Unit Head can only update users in their unit
         if request.user.is_unit_head:
-            return obj.unit == request.user.unit
+            return obj.unit_id == request.user.unit_id
 
         return False
 
@@ -217,11 +224,11 @@ class CanListUsers(permissions.BasePermission):
 
         # HOD can only see users in their department
         if request.user.is_hod:
-            return obj.dept == request.user.dept
+            return obj.dept_id == request.user.dept_id
 
         # Unit Head can only see users in their unit
         if request.user.is_unit_head:
-            return obj.unit == request.user.unit
+            return obj.unit_id == request.user.unit_id
 
         return False
 
@@ -250,11 +257,11 @@ class CanManageAccountStatus(permissions.BasePermission):
 
         # HOD can only manage users in their department
         if request.user.is_hod:
-            return obj.user.dept == request.user.dept
+            return obj.user.dept_id == request.user.dept_id
 
         # Unit Head can only manage users in their unit
         if request.user.is_unit_head:
-            return obj.user.unit == request.user.unit
+            return obj.user.unit_id == request.user.unit_id
 
         return False
     
@@ -267,7 +274,7 @@ class CanViewOwnAccountStatus(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         # Check if the user is trying to view their own status history
-        return obj.user == request.user
+        return obj.user_id == request.user.pk
 
 class CanViewAccountStatusDetail(permissions.BasePermission):
     """
@@ -286,14 +293,14 @@ class CanViewAccountStatusDetail(permissions.BasePermission):
 
         # HOD can only view status history for users in their department
         if request.user.is_hod:
-            return obj.user.dept == request.user.dept
+            return obj.user.dept_id == request.user.dept_id
 
         # Unit Head can only view status history for users in their unit
         if request.user.is_unit_head:
-            return obj.user.unit == request.user.unit
+            return obj.user.unit_id == request.user.unit_id
 
         # Users can view their own status history
-        return obj.user == request.user
+        return obj.user_id == request.user.pk
 
 class CanViewLoginHistory(permissions.BasePermission):
     """
@@ -315,11 +322,11 @@ class CanViewLoginHistory(permissions.BasePermission):
 
         # HOD can only view login history for users in their department
         if request.user.is_hod:
-            return obj.user.dept == request.user.dept
+            return obj.user.dept_id == request.user.dept_id
 
         # Unit Head can only view login history for users in their unit
         if request.user.is_unit_head:
-            return obj.user.unit == request.user.unit
+            return obj.user.unit_id == request.user.unit_id
 
         # Users can view their own login history
-        return obj.user == request.user
\ No newline at end of file
+        return obj.user_id == request.user.pk
\ No newline at end of file
@@ -0,0 +1,44 @@
+"""
+JSON renderer backed by orjson when it is installed, falling back to DRF's
+stdlib JSONRenderer otherwise. The output is byte-for-byte what
+JSONRenderer produces for the compact, non-ASCII-escaped default.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # UTC as "Z" like DRF's encoder; numpy values from the busdays helpers
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+_drf_encoder = JSONEncoder()
+
+
+def _default(obj):
+    # types orjson does not handle natively (Decimal, lazy translations,
+    # timedelta, querysets, ...) are encoded exactly as JSONRenderer would,
+    # e.g. raw latitude/longitude Decimals become numbers
+    return _drf_encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            # orjson only indents by two; the browsable API asks for four
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers past 64 bits, which the stdlib encoder writes out
+            return super().render(data, accepted_media_type, renderer_context)
+        # same escaping as JSONRenderer so the output is safe inside <script>
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -2,7 +2,10 @@ from UserAccounts.models import *
 from core.models import *
 
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -33,7 +36,71 @@ class LeaveTypeSerializers(serializers.ModelSerializer):
         fields = '__all__'
         
 
-class LeaveRequestSerializers(serializers.ModelSerializer):
+def requested_fields(request, available):
+    """
+    The field names a GET asked for with ?fields=a,b (only these) and/or
+    ?omit=c,d (all but these), limited to `available`. None when the
+    request names neither, or is not a read.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    fields = request.query_params.get('fields')
+    omit = request.query_params.get('omit')
+    if not fields and not omit:
+        return None
+
+    keep = set(available)
+    if fields:
+        keep &= {name.strip() for name in fields.split(',')}
+    if omit:
+        keep -= {name.strip() for name in omit.split(',')}
+    return keep
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin for ?fields= / ?omit=. Fields that were not asked for
+    are removed before serialization, so their sources (related objects,
+    properties) are never touched.
+
+    `extra_fields` names keys a serializer adds in to_representation; check
+    them with wants(). `field_columns` maps fields to the model columns they
+    read and `field_related` to the relations they follow, which lets
+    sparse_queryset() trim a queryset to match.
+    """
+    extra_fields = ()
+    field_columns = {}
+    field_related = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requested = requested_fields(
+            self.context.get('request'), [*self.fields, *self.extra_fields]
+        )
+        if self.requested is not None:
+            for name in list(self.fields):
+                if name not in self.requested:
+                    self.fields.pop(name)
+
+    def wants(self, name):
+        return self.requested is None or name in self.requested
+
+    @classmethod
+    def sparse_queryset(cls, queryset, request):
+        """Load only the columns and relations behind the requested fields."""
+        keep = requested_fields(request, cls.field_columns)
+        if keep is None:
+            return queryset
+        columns = {queryset.model._meta.pk.name}
+        related = []
+        for name in keep:
+            columns.update(cls.field_columns[name])
+            if name in cls.field_related:
+                related.append(cls.field_related[name])
+        return queryset.select_related(None).select_related(*related).only(*columns)
+
+
+class LeaveRequestSerializers(SparseFieldsetMixin, serializers.ModelSerializer):
     
     employee = serializers.StringRelatedField(read_only=True)
     
@@ -41,10 +108,208 @@ class LeaveRequestSerializers(serializers.ModelSerializer):
         model = LeaveRequest
         fields = '__all__'
         # read_only_fields = ['end_date']
-        
+        # generated by the server, see core.utils.leave_codes
+        read_only_fields = ['leave_code']
+
+
+class LeaveRequestListSerializer(LeaveRequestSerializers):
+    """
+    What the leave list endpoints show: the leave request plus its working
+    days and the names next to the ids, so that lists need no lookups on the
+    client. Give it LeaveRequest.objects.with_working_days() with the leave
+    type, department and unit selected; the list endpoints render the same
+    JSON from values() rows with LeaveRequestValuesSerializer.
+    """
+    working_days = serializers.IntegerField(read_only=True)
+    leave_type_name = serializers.CharField(source='leave_type.name', read_only=True)
+    dept_name = serializers.CharField(source='dept.name', read_only=True)
+    unit_name = serializers.CharField(source='unit.name', read_only=True)
+
+def _datetime_representation(value):
+    """Same string as serializers.DateTimeField for the default ISO 8601 format."""
+    if value is None:
+        return None
+    if settings.USE_TZ and timezone.is_aware(value):
+        value = value.astimezone(timezone.get_current_timezone())
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _date_representation(value):
+    return None if value is None else value.isoformat()
+
+
+class LeaveRequestValuesSerializer(serializers.BaseSerializer):
+    """
+    Read-only twin of LeaveRequestListSerializer for list endpoints. Rows come
+    from LeaveRequestValuesSerializer.values(queryset) as plain dicts, with
+    the employee, leave type, department and unit names joined in the same
+    query, so no model instances or per-field serializer objects are built.
+    The JSON is identical.
+    """
+
+    # output field -> (values() column, conversion)
+    FIELDS = {
+        'id': ('id', None),
+        'employee': ('employee__sur_name', None),
+        'leave_type_name': ('leave_type__name', None),
+        'dept_name': ('dept__name', None),
+        'unit_name': ('unit__name', None),
+        'working_days': ('annotated_working_days', None),
+        'start_date': ('start_date', _datetime_representation),
+        'end_date': ('end_date', _datetime_representation),
+        'reason': ('reason', None),
+        'leave_last_taken': ('leave_last_taken', _date_representation),
+        'number_of_days': ('number_of_days', None),
+        'leave_code': ('leave_code', None),
+        'home_address': ('home_address', None),
+        'place_to_spend_leave': ('place_to_spend_leave', None),
+        'alt_phone': ('alt_phone', None),
+        'status': ('status', None),
+        'created_on': ('created_on', _datetime_representation),
+        'updated_on': ('updated_on', _datetime_representation),
+        'leave_type': ('leave_type_id', None),
+        'dept': ('dept_id', None),
+        'unit': ('unit_id', None),
+        'approved_by': ('approved_by_id', None),
+        'recommended_by': ('recommended_by_id', None),
+    }
+
+    # always read: the cursor pagination orders on them
+    ORDERING_COLUMNS = ('id', 'created_on')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        keep = requested_fields(self.context.get('request'), self.FIELDS)
+        self.output_fields = {
+            name: spec for name, spec in self.FIELDS.items() if keep is None or name in keep
+        }
+
+    @classmethod
+    def values(cls, queryset, fields=None):
+        """
+        Turn a LeaveRequest queryset into the values() rows this serializer
+        reads. With `fields`, only their columns are selected, so the joins
+        and the working-days computation are skipped when those fields are
+        not wanted.
+        """
+        names = cls.FIELDS if fields is None else [name for name in cls.FIELDS if name in fields]
+        if 'working_days' in names and 'annotated_working_days' not in queryset.query.annotations:
+            queryset = queryset.with_working_days()
+        columns = dict.fromkeys(cls.ORDERING_COLUMNS)
+        columns.update(dict.fromkeys(cls.FIELDS[name][0] for name in names))
+        return queryset.values(*columns)
+
+    def to_representation(self, row):
+        return {
+            name: row[column] if convert is None else convert(row[column])
+            for name, (column, convert) in self.output_fields.items()
+        }
+
+
 class HolidaySerializers(serializers.ModelSerializer):
     
     class Meta:
         model = Holiday
         fields = '__all__'
+        # the per-scope unique constraints are conditional, so they are
+        # checked in validate() instead of by DRF's generated validators
+        validators = []
+        
+    def validate(self, data):
+        date = data.get('date', getattr(self.instance, 'date', None))
+        dept_type = data.get('dept_type', getattr(self.instance, 'dept_type', None)) or None
+        dept = data.get('dept', getattr(self.instance, 'dept', None))
+        if dept_type and dept:
+            raise serializers.ValidationError("A holiday can be limited to a department type or to a department, not both.")
+
+        existing = Holiday.objects.filter(date=date, dept_type=dept_type, dept=dept)
+        if self.instance is not None:
+            existing = existing.exclude(pk=self.instance.pk)
+        if existing.exists():
+            raise serializers.ValidationError({"date": "A holiday already exists on this date for the same staff."})
+        return data
         
+
+
+class MemoizedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that looks each pk up once. Used with many=True,
+    where one field instance validates every item, so that a batch naming
+    the same few departments costs a query per department, not per item.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, (int, str)):
+            return super().to_internal_value(data)
+        looked_up = self.__dict__.setdefault('_looked_up', {})
+        if data not in looked_up:
+            looked_up[data] = super().to_internal_value(data)
+        return looked_up[data]
+
+
+class LeaveDateQuerySerializer(serializers.Serializer):
+    """One (start_date, number_of_days) or (start_date, end_date) pair."""
+
+    start_date = serializers.DateField()
+    number_of_days = serializers.IntegerField(required=False, min_value=0)
+    end_date = serializers.DateField(required=False)
+    dept = MemoizedPrimaryKeyRelatedField(queryset=Department.objects.all(), required=False)
+
+    def validate(self, data):
+        if ('number_of_days' in data) == ('end_date' in data):
+            raise serializers.ValidationError("Provide either number_of_days or end_date.")
+        if 'end_date' in data and data['end_date'] < data['start_date']:
+            raise serializers.ValidationError({"end_date": "End date cannot be before start date."})
+        return data
+
+
+class LeaveEligibilityQuerySerializer(serializers.Serializer):
+    """Query parameters of the leave eligibility precheck."""
+
+    leave_type = serializers.PrimaryKeyRelatedField(queryset=LeaveType.objects.all())
+    start_date = serializers.DateField()
+    days = serializers.IntegerField(min_value=0)
+    dept = serializers.PrimaryKeyRelatedField(queryset=Department.objects.all(), required=False)
+
+
+class LeaveImportRowSerializer(serializers.Serializer):
+    """
+    One row of a bulk leave import. References are given by id or name and
+    resolved by the importer against data loaded once per import.
+    """
+
+    employee = serializers.CharField()
+    leave_type = serializers.CharField()
+    dept = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    unit = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    start_date = serializers.DateTimeField(input_formats=['iso-8601', '%Y-%m-%d'])
+    number_of_days = serializers.IntegerField(min_value=1)
+    reason = serializers.CharField()
+    leave_last_taken = serializers.DateField()
+    # allocated by the importer when left empty
+    leave_code = serializers.CharField(max_length=250, required=False)
+    home_address = serializers.CharField()
+    place_to_spend_leave = serializers.CharField()
+    alt_phone = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    status = serializers.ChoiceField(choices=LeaveRequest.STATUS_CHOICES, default='pending')
+
+
+class LeaveExportQuerySerializer(serializers.Serializer):
+    """Query parameters of the leave export; every filter is optional."""
+
+    # not "format", which DRF reserves for renderer selection
+    export_format = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')
+    dept = serializers.IntegerField(required=False)
+    unit = serializers.IntegerField(required=False)
+    user = serializers.IntegerField(required=False)
+    status = serializers.ChoiceField(choices=LeaveRequest.STATUS_CHOICES, required=False)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if 'start_date' in data and 'end_date' in data and data['end_date'] < data['start_date']:
+            raise serializers.ValidationError({"end_date": "End date cannot be before start date."})
+        return data
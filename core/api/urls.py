@@ -13,10 +13,14 @@ urlpatterns = [
     
     path('holidays/', HolidayCreateList.as_view(), name='holiday-list-create'),
     path('holidays/<int:pk>/', HolidayDetail.as_view(), name='Holiday-detail'),
+    path('leave-dates/calculate/', LeaveDateCalculator.as_view(), name='leave-date-calculator'),
     
     # TODO
     
     path('leave-request/',CreateLeaveApplication.as_view(), name='leave-app'),
+    path('leave-request/eligibility/', LeaveEligibilityCheck.as_view(), name='leave-eligibility'),
+    path('leave-request/import/', LeaveRequestImport.as_view(), name='leave-request-import'),
+    path('leave-request/export/', LeaveRequestExport.as_view(), name='leave-request-export'),
     path('list-leave-request/', ListLeaveRequest.as_view(), name='list-leave-app'),
     path('leave-request-detail/<int:pk>/', LeaveRequestDetail.as_view(),name="leave-request-detail"),
     path('update-leave-request/<int:pk>/', LeaveRequestUpdate.as_view(),name="update-leave-request"),
@@ -24,6 +28,7 @@ urlpatterns = [
     path('leave-request-approval/<int:pk>/', ApproveRejectLeaveRequest.as_view(),name="leave-request-approval"),
     path('delete-leave-request/<int:pk>/',DeleteLeaveRequest.as_view(),name='delete-leave-request'),
     
+    path('leave-requests/search/', LeaveRequestSearch.as_view(), name='leave-request-search-query'),
     path('leave-requests/search/<str:search>/', LeaveRequestSearch.as_view(), name='leave-request-search'),
 
     # path('leave-balances/', LeaveBalanceList.as_view(), name='leave-balance-list'),
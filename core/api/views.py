@@ -1,5 +1,7 @@
 from django.shortcuts import render
-from datetime import datetime
+from datetime import datetime, time, timedelta
+import csv
+import os
 
 # generics view classes
 # from rest_framework.generics import GenericAPIView, RetrieveAPIView
@@ -12,7 +14,8 @@ from rest_framework.permissions import AllowAny, IsAuthenticated,IsAdminUser
 from .serializers import *
 
 from core.models import *
-from django.db.models import Q
+from django.db.models import Count, Max, Q
+from django.db import transaction
 
 from rest_framework.response import Response
 from rest_framework import status
@@ -23,11 +26,23 @@ from rest_framework.exceptions import PermissionDenied
 # import validation errors
 from rest_framework.exceptions import ValidationError
 from core.utils.utilities import *
+from core.utils.busdays import batch_end_dates, batch_working_days
+from core.utils.leave_balances import check_leave_eligibility, reserve_leave_days
+from core.utils.leave_codes import allocate_leave_code
+from core.utils.leave_search import search_leave_requests
+from core.utils.leave_export import EXPORT_FORMATS, export_rows
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from core.utils.leave_import import IMPORT_CHUNK_SIZE, import_leave_requests, iter_import_rows, open_text
+from rest_framework.parsers import MultiPartParser
+from core.api.parsers import FastJSONParser
 from core.api.permissions import *
+from core.api.pagination import LeaveRequestPagination, LeaveSearchPagination
+from core.api.mixins import ConditionalListMixin
 
 
 # using concrete views
-class DeptCreateList(generics.ListCreateAPIView):
+class DeptCreateList(ConditionalListMixin, generics.ListCreateAPIView):
     queryset = Department.objects.all()
     serializer_class = DepartmentSerializers
     permission_classes = [IsAuthenticated]
@@ -83,7 +98,7 @@ class DeptDetailView(generics.RetrieveUpdateDestroyAPIView):
    
 
 
-class UnitCreateList(generics.ListCreateAPIView):
+class UnitCreateList(ConditionalListMixin, generics.ListCreateAPIView):
     queryset = Unit.objects.all()
     serializer_class = UnitSerializers
     
@@ -92,7 +107,7 @@ class UnitsDetail(generics.RetrieveUpdateDestroyAPIView):
     queryset = Unit.objects.all()
     serializer_class= UnitSerializers
     
-class LeaveTypeCreateList(generics.ListCreateAPIView):
+class LeaveTypeCreateList(ConditionalListMixin, generics.ListCreateAPIView):
     queryset = LeaveType.objects.all()
     serializer_class= LeaveTypeSerializers
     permission_classes = [IsAuthenticated]
@@ -102,7 +117,7 @@ class LeaveTypeDetail(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = LeaveTypeSerializers
     
 
-class HolidayCreateList(generics.ListCreateAPIView):
+class HolidayCreateList(ConditionalListMixin, generics.ListCreateAPIView):
     queryset = Holiday.objects.all()
     serializer_class = HolidaySerializers
     
@@ -111,6 +126,157 @@ class HolidayDetail(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = HolidaySerializers
     
     
+# Compute end dates and working days for a batch of leave periods
+class LeaveDateCalculator(APIView):
+    """
+    Read-only calculator for planning tools. POST a list of
+    {"start_date", "number_of_days"} or {"start_date", "end_date"} objects
+    (at most MAX_ITEMS) and get end dates and working days for all of them,
+    using the same weekend and holiday rules as leave submission.
+    Each item may name a "dept" whose holidays apply; it defaults to the
+    caller's department. Nothing is saved.
+    """
+    permission_classes = [IsAuthenticated]
+    MAX_ITEMS = 1000
+
+    def post(self, request, *args, **kwargs):
+        serializer = LeaveDateQuerySerializer(data=request.data, many=True, max_length=self.MAX_ITEMS)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data
+
+        starts = [item['start_date'] for item in items]
+        depts = [item['dept'].pk if 'dept' in item else request.user.dept_id for item in items]
+        # rows given an end date are counted as they are; the rest get their end date computed
+        end_dates = [item.get('end_date') for item in items]
+        pending = [i for i, item in enumerate(items) if 'number_of_days' in item]
+        if pending:
+            computed = batch_end_dates(
+                [starts[i] for i in pending],
+                [items[i]['number_of_days'] for i in pending],
+                depts=[depts[i] for i in pending],
+            ).astype(object)
+            for i, end_date in zip(pending, computed):
+                end_dates[i] = end_date
+
+        working_days = batch_working_days(starts, end_dates, depts=depts)
+
+        results = []
+        for item, end_date, days in zip(items, end_dates, working_days):
+            result = {
+                'start_date': item['start_date'],
+                'end_date': end_date,
+                'working_days': int(days),
+            }
+            if 'number_of_days' in item:
+                result['number_of_days'] = item['number_of_days']
+            results.append(result)
+
+        return Response(results, status=status.HTTP_200_OK)
+
+
+# Check whether a leave could be submitted, without submitting it
+class LeaveEligibilityCheck(APIView):
+    """
+    GET ?leave_type=<id>&start_date=<date>&days=<n>[&dept=<id>]
+
+    Runs the same checks as leave submission in one query and returns
+    whether the request would be accepted, why not, the remaining balance
+    and the computed end date.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        serializer = LeaveEligibilityQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        user = request.user
+
+        eligibility = check_leave_eligibility(
+            user, params['leave_type'], datetime.now().year, params['days']
+        )
+        eligibility['end_date'] = calc_end_date(
+            params['start_date'], params['days'], dept=params.get('dept', user.dept_id)
+        )
+        return Response(eligibility, status=status.HTTP_200_OK)
+
+
+class LeaveRequestImport(APIView):
+    """
+    Bulk import of leave applications for HR, e.g. paper forms backfilled
+    after an outage.
+
+    Upload a CSV, NDJSON or JSON file as "file" (multipart), or POST a JSON
+    list of rows. Valid rows are saved and the response lists the errors of
+    every rejected row. Pass ?dry_run=true to only validate.
+    """
+    permission_classes = [IsHROrSuperuser]
+    parser_classes = [MultiPartParser, FastJSONParser]
+    FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson', '.json': 'json'}
+
+    def post(self, request, *args, **kwargs):
+        dry_run = request.query_params.get('dry_run', '').lower() in ('1', 'true', 'yes')
+
+        upload = request.FILES.get('file')
+        if upload is not None:
+            file_format = request.data.get('import_format') or self.FORMATS.get(os.path.splitext(upload.name)[1].lower())
+            if file_format not in self.FORMATS.values():
+                raise ValidationError({"import_format": "Use csv, ndjson or json."})
+            rows = iter_import_rows(open_text(upload.file), file_format)
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            raise ValidationError({"file": "Upload a file or send a list of rows."})
+
+        try:
+            report = import_leave_requests(rows, chunk_size=IMPORT_CHUNK_SIZE, dry_run=dry_run)
+        except (ValueError, csv.Error) as exc:
+            # malformed file (bad JSON line, broken CSV quoting, wrong encoding)
+            raise ValidationError({"file": str(exc)})
+
+        response_status = status.HTTP_200_OK if dry_run or not report['created'] else status.HTTP_201_CREATED
+        return Response(report, status=response_status)
+
+
+class LeaveRequestExport(APIView):
+    """
+    GET ?export_format=csv|ndjson[&dept=&unit=&user=&status=&start_date=&end_date=]
+
+    Streams every matching leave request with employee, leave type,
+    department, unit and approver names. start_date/end_date select leave
+    that overlaps the range. Rows are fetched in chunks while the response
+    is written, so memory use does not grow with the export.
+    """
+    permission_classes = [IsHROrSuperuser]
+
+    def get(self, request, *args, **kwargs):
+        serializer = LeaveExportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        queryset = LeaveRequest.objects.all()
+        if 'dept' in params:
+            queryset = queryset.filter(dept=params['dept'])
+        if 'unit' in params:
+            queryset = queryset.filter(unit=params['unit'])
+        if 'user' in params:
+            queryset = queryset.filter(employee=params['user'])
+        if 'status' in params:
+            queryset = queryset.filter(status=params['status'])
+        # compare with datetimes so the start_date/end_date indexes apply
+        if 'start_date' in params:
+            range_start = timezone.make_aware(datetime.combine(params['start_date'], time.min))
+            queryset = queryset.filter(end_date__gte=range_start)
+        if 'end_date' in params:
+            range_end = timezone.make_aware(datetime.combine(params['end_date'] + timedelta(days=1), time.min))
+            queryset = queryset.filter(start_date__lt=range_end)
+
+        stream, content_type = EXPORT_FORMATS[params['export_format']]
+        response = StreamingHttpResponse(stream(export_rows(queryset)), content_type=content_type)
+        filename = f"leave-requests-{timezone.localdate():%Y%m%d}.{params['export_format']}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
 class CreateLeaveApplication(generics.CreateAPIView):
     serializer_class = LeaveRequestSerializers
     permission_classes = [IsAuthenticated]
@@ -125,74 +291,69 @@ class CreateLeaveApplication(generics.CreateAPIView):
         leave_days = serializer.validated_data['number_of_days']
         deductible_leave = serializer.validated_data.get('deductible_leave', 0)
         current_year = datetime.now().year
-        end_date = calc_end_date(start_date, leave_days)
-
-        # Check if the user has any existing approved or pending leave requests
-        existing_request = LeaveRequest.objects.filter(
-            employee=user,
-            status__in=['pending', 'approved']
-        ).exists()
-
-        if existing_request:
-            raise PermissionDenied(detail="You already have a pending or approved leave request.")
-
-        # Check if the user has already applied for the same leave type in the current year
-        same_type_request_this_year = LeaveRequest.objects.filter(
-            employee=user,
-            leave_type=leave_type,
-            start_date__year=current_year
-        ).exists()
-
-        if same_type_request_this_year:
-            raise PermissionDenied(detail="You have already applied for this type of leave this year.")
-
-        # Get or create leave balance for the current year
-        leave_balance, created = LeaveBalance.objects.get_or_create(
-            employee=user,
-            leave_type=leave_type,
-            year=current_year,
-            defaults={
-                'total_days': 30,  # You might want to make this configurable
-                'days_used': 0,
-                'days_remaining': 30
-            }
-        )
+        end_date = calc_end_date(start_date, leave_days, dept=serializer.validated_data['dept'])
 
         # Calculate actual leave days after deduction
         actual_leave_days = max(0, leave_days - deductible_leave)
 
-        # Check if user has enough leave days remaining
-        if actual_leave_days > leave_balance.days_remaining:
-            raise PermissionDenied(
-                detail=f"Insufficient leave balance. You have {leave_balance.days_remaining} days remaining."
+        # Checks, balance reservation and insert succeed or fail together
+        with transaction.atomic():
+            # Locks the applicant's row so parallel submissions by the same
+            # user are checked one after the other
+            eligibility = check_leave_eligibility(
+                user, leave_type, current_year, actual_leave_days, lock=True
+            )
+            if not eligibility['eligible']:
+                raise PermissionDenied(detail=eligibility['reasons'][0])
+
+            # Take the days from this year's balance, creating it if needed
+            reserve_leave_days(user, leave_type, current_year, actual_leave_days)
+
+            # Save the leave request with actual leave days and the next
+            # leave code of the department
+            serializer.save(
+                employee=user,
+                end_date=end_date,
+                number_of_days=actual_leave_days,
+                leave_code=allocate_leave_code(serializer.validated_data['dept'], current_year),
             )
+        
+class LeaveRequestValuesListMixin:
+    """
+    Serialize a leave request list from values() rows instead of model
+    instances; the response is the same as with LeaveRequestListSerializer.
+    """
+    serializer_class = LeaveRequestValuesSerializer
+
+    def filter_queryset(self, queryset):
+        # only the columns behind ?fields= / ?omit=
+        fields = requested_fields(self.request, LeaveRequestValuesSerializer.FIELDS)
+        return LeaveRequestValuesSerializer.values(super().filter_queryset(queryset), fields)
+
+
+class ConditionalLeaveListMixin(ConditionalListMixin):
+    """
+    Conditional GET for leave lists. Besides the leave rows, the response
+    shows the employee, leave type, department and unit names, and the
+    working days depend on the holidays and on the department types.
+    """
+    last_modified_field = 'updated_on'
+    related_modified_fields = ('employee__updated', 'leave_type__updated', 'dept__updated', 'unit__updated')
+
+    def get_extra_state(self):
+        holidays = Holiday.objects.aggregate(count=Count('pk'), last_modified=Max('updated'))
+        last_modified = holidays['last_modified']
+        fingerprint = f"{holidays['count']}@{last_modified.isoformat() if last_modified else ''}"
+        return fingerprint, last_modified
 
-        # Update leave balance
-        leave_balance.days_used += actual_leave_days
-        leave_balance.save()
 
-        # Save the leave request with actual leave days
-        serializer.save(
-            employee=user,
-            end_date=end_date,
-            number_of_days=actual_leave_days,
-            deductible_leave=deductible_leave
-        )
-        
 # list all leave request
-class ListLeaveRequest(generics.ListAPIView):
+class ListLeaveRequest(ConditionalLeaveListMixin, LeaveRequestValuesListMixin, generics.ListAPIView):
   
-    serializer_class = LeaveRequestSerializers
+    pagination_class = LeaveRequestPagination
     
     def get_queryset(self):
-        leaveQueryset = LeaveRequest.objects.select_related(
-            'employee',
-            'leave_type',
-            'dept',
-            'unit',
-            'approved_by',
-            'recommended_by'
-        ).all()
+        leaveQueryset = LeaveRequest.objects.all()
         
         return leaveQueryset
     
@@ -215,7 +376,8 @@ class LeaveRequestUpdate(generics.RetrieveUpdateAPIView):
         # check if leave if still pending
         start_date = serializer.validated_data['start_date']
         leave_days = serializer.validated_data['number_of_days']
-        end_date = calc_end_date(start_date, leave_days)
+        dept = serializer.validated_data.get('dept', obj.dept)
+        end_date = calc_end_date(start_date, leave_days, dept=dept)
         
         if obj.status !='pending':
             raise ValidationError({"detail":"Update denied! This leave is not in pending state"})
@@ -271,30 +433,20 @@ class ApproveRejectLeaveRequest(generics.RetrieveUpdateAPIView):
   
 
 # Search for leave application using surname, staff Number
-class LeaveRequestSearch(generics.ListAPIView):
-    
-    serializer_class  = LeaveRequestSerializers
+class LeaveRequestSearch(LeaveRequestValuesListMixin, generics.ListAPIView):
+    """
+    Fuzzy search on employee surname, first name and username, leave code
+    and leave type name, best matches first. The term comes from the URL
+    or from ?q=.
+    """
+    # results are ordered by rank, so they are paged by offset
+    pagination_class = LeaveSearchPagination
     
     def get_queryset(self):
        
-        queryset = LeaveRequest.objects.select_related( 'employee',
-            'leave_type',
-            'dept',
-            'unit',
-            'approved_by',
-            'recommended_by'
-            )
-        
-        # search_term = self.request.query_params.get('search', None)
-        search_term = self.kwargs.get('search')
-        print(search_term)
-
-        if search_term:
-            queryset = queryset.filter(
-                Q(employee__sur_name__icontains=search_term)
-                # |# Q(staff__staff_number__icontains=search_term)
-            )
-        return queryset
+        queryset = LeaveRequest.objects.all()
+        search_term = self.kwargs.get('search') or self.request.query_params.get('q')
+        return search_leave_requests(queryset, search_term)
         
 
 class  DeleteLeaveRequest(generics.RetrieveDestroyAPIView):
@@ -305,55 +457,34 @@ class  DeleteLeaveRequest(generics.RetrieveDestroyAPIView):
     
 
 # list all leaves by Department given a dept ID
-class ListDeptLeaveRequest(generics.ListAPIView):
+class ListDeptLeaveRequest(ConditionalLeaveListMixin, LeaveRequestValuesListMixin, generics.ListAPIView):
   
-    serializer_class = LeaveRequestSerializers
+    pagination_class = LeaveRequestPagination
     
     def get_queryset(self):
         pk = self.kwargs.get('pk')
-        leaveQueryset = LeaveRequest.objects.select_related(
-            'employee',
-            'leave_type',
-            'dept',
-            'unit',
-            'approved_by',
-            'recommended_by'
-        ).filter(dept=pk)
+        leaveQueryset = LeaveRequest.objects.filter(dept=pk)
         
         return leaveQueryset
     
 # Leave requests by unit given a unit ID
-class ListUnitLeaveRequest(generics.ListAPIView):
+class ListUnitLeaveRequest(ConditionalLeaveListMixin, LeaveRequestValuesListMixin, generics.ListAPIView):
   
-    serializer_class = LeaveRequestSerializers
+    pagination_class = LeaveRequestPagination
     
     def get_queryset(self):
         pk = self.kwargs.get('pk')
-        leaveQueryset = LeaveRequest.objects.select_related(
-            'employee',
-            'leave_type',
-            'dept',
-            'unit',
-            'approved_by',
-            'recommended_by'
-        ).filter(unit=pk)
+        leaveQueryset = LeaveRequest.objects.filter(unit=pk)
         
         return leaveQueryset
     
 # list all leave request given a user ID
-class ListUserLeaveRequest(generics.ListAPIView):
+class ListUserLeaveRequest(ConditionalLeaveListMixin, LeaveRequestValuesListMixin, generics.ListAPIView):
   
-    serializer_class = LeaveRequestSerializers
+    pagination_class = LeaveRequestPagination
     
     def get_queryset(self):
         pk = self.kwargs.get('pk')
-        leaveQueryset = LeaveRequest.objects.select_related(
-            'employee',
-            'leave_type',
-            'dept',
-            'unit',
-            'approved_by',
-            'recommended_by'
-        ).filter(employee=pk)
+        leaveQueryset = LeaveRequest.objects.filter(employee=pk)
         
         return leaveQueryset
\ No newline at end of file
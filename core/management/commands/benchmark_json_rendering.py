@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+
+from core.api import renderers
+from core.api.renderers import FastJSONRenderer
+from core.api.serializers import LeaveRequestValuesSerializer
+from core.models import LeaveRequest
+from core.utils.benchmark import benchmark_database, seed_leave_data, seed_login_history
+from UserAccounts.models import LoginHistory
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare bytes per second of DRF's JSONRenderer and FastJSONRenderer on leave "
+        "request and login history pages, and the gzipped wire size, on a throwaway database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help="Leave requests and login history rows to generate")
+        parser.add_argument('--users', type=int, default=1000, help="Employees to generate")
+        parser.add_argument('--page-size', type=int, default=1000, help="Rows rendered per run")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per renderer")
+        parser.add_argument('--keepdb', action='store_true', help="Reuse and keep the test database")
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            self.stderr.write("orjson is not installed; FastJSONRenderer falls back to JSONRenderer.")
+
+        with benchmark_database(keepdb=options['keepdb']):
+            if not LeaveRequest.objects.exists():
+                self.stdout.write(f"Seeding {options['rows']} leave requests and login history rows...")
+                seed_leave_data(options['rows'], users=options['users'])
+                seed_login_history(options['rows'])
+
+            page_size = options['page_size']
+            leave_page = LeaveRequestValuesSerializer(
+                LeaveRequestValuesSerializer.values(LeaveRequest.objects.order_by('-created_on', '-id')[:page_size]),
+                many=True,
+            ).data
+            # raw values() rows: datetimes and latitude/longitude Decimals go through the encoders
+            login_page = list(LoginHistory.objects.order_by('-login_time', '-id').values()[:page_size])
+
+            for label, data in (('leave requests', leave_page), ('login history', login_page)):
+                self.stdout.write(f"{label} ({len(data)} rows):")
+                outputs = {}
+                for renderer in (JSONRenderer(), FastJSONRenderer()):
+                    outputs[type(renderer).__name__] = self.report(renderer, data, options['repeat'])
+                if len(set(outputs.values())) != 1:
+                    raise CommandError(f"The renderers produce different output for {label}.")
+                self.stdout.write(
+                    f"  {len(outputs['JSONRenderer']):,} bytes, "
+                    f"{len(compress_string(outputs['JSONRenderer'])):,} bytes gzipped"
+                )
+
+    def report(self, renderer, data, repeat):
+        best = None
+        content = b''
+        for _ in range(repeat):
+            started = time.perf_counter()
+            content = renderer.render(data)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        rate = len(content) / best / 1e6 if best else 0
+        self.stdout.write(f"  {type(renderer).__name__}: {best * 1000:.2f} ms, {rate:,.1f} MB/s")
+        return content
@@ -0,0 +1,83 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.api.views import (
+    LeaveRequestSearch, ListDeptLeaveRequest, ListLeaveRequest, ListUnitLeaveRequest, ListUserLeaveRequest,
+)
+from core.models import LeaveRequest
+from core.utils.benchmark import benchmark_database, explain, seed_leave_data, time_queryset, view_queryset
+from core.utils.leave_balances import eligibility_queryset
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database with synthetic leave requests and record "
+        "EXPLAIN plans and timings of the leave list querysets."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help="Leave requests to generate")
+        parser.add_argument('--users', type=int, default=2000, help="Employees to generate")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per query")
+        parser.add_argument('--page-size', type=int, default=50, help="Rows fetched per list query")
+        parser.add_argument('--output', help="Write plans and timings to this JSON file")
+        parser.add_argument('--keepdb', action='store_true', help="Reuse and keep the test database")
+        parser.add_argument('--no-plans', action='store_true', help="Only print timings")
+
+    def handle(self, *args, **options):
+        with benchmark_database(keepdb=options['keepdb']):
+            if not LeaveRequest.objects.exists():
+                self.stdout.write(f"Seeding {options['rows']} leave requests...")
+                seed_leave_data(options['rows'], users=options['users'])
+            results = [
+                self.measure(name, queryset, options)
+                for name, queryset in self.querysets(options['page_size'])
+            ]
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def querysets(self, page_size):
+        """The querysets behind each list view plus the other hot filters."""
+        # an employee with leave history for the per-employee queries
+        employee = User.objects.filter(username__startswith='bench').order_by('-leave_requests__id').first()
+        admin = User(username='benchmark', is_superuser=True)
+        ordering = ListLeaveRequest.pagination_class.ordering
+        year = timezone.now().year
+        today = timezone.now()
+
+        def first_page(view_class, **kwargs):
+            return view_queryset(view_class, admin, **kwargs).order_by(*ordering)[:page_size]
+
+        return [
+            ('ListLeaveRequest', first_page(ListLeaveRequest)),
+            ('ListDeptLeaveRequest', first_page(ListDeptLeaveRequest, pk=employee.dept_id)),
+            ('ListUnitLeaveRequest', first_page(ListUnitLeaveRequest, pk=employee.unit_id)),
+            ('ListUserLeaveRequest', first_page(ListUserLeaveRequest, pk=employee.pk)),
+            # ranked by relevance, so not re-ordered
+            ('LeaveRequestSearch', view_queryset(LeaveRequestSearch, admin, search=employee.sur_name)[:page_size]),
+            ('eligibility check', eligibility_queryset(employee, employee.leave_requests.first().leave_type_id, year)),
+            ('employee open requests', LeaveRequest.objects.filter(employee=employee, status__in=['pending', 'approved'])),
+            ('dept pending approvals', LeaveRequest.objects.filter(dept=employee.dept_id, status='pending')),
+            ('unit calendar (next 30 days)', LeaveRequest.objects.filter(
+                unit=employee.unit_id, start_date__range=(today, today + timedelta(days=30))
+            )),
+        ]
+
+    def measure(self, name, queryset, options):
+        timings = time_queryset(queryset, repeat=options['repeat'])
+        result = {'name': name, 'sql': str(queryset.query), **timings}
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        self.stdout.write(f"  min {timings['min_ms']} ms, median {timings['median_ms']} ms, max {timings['max_ms']} ms")
+        if not options['no_plans']:
+            result['plan'] = explain(queryset)
+            self.stdout.write("  " + result['plan'].replace("\n", "\n  "))
+        return result
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.api.serializers import LeaveRequestListSerializer, LeaveRequestValuesSerializer
+from core.models import LeaveRequest
+from core.utils.benchmark import benchmark_database, seed_leave_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows per second of LeaveRequestListSerializer and the values()-based "
+        "LeaveRequestValuesSerializer on a throwaway database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help="Leave requests to generate")
+        parser.add_argument('--users', type=int, default=1000, help="Employees to generate")
+        parser.add_argument('--page-size', type=int, default=1000, help="Rows serialized per run")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per serializer")
+        parser.add_argument('--keepdb', action='store_true', help="Reuse and keep the test database")
+
+    def handle(self, *args, **options):
+        with benchmark_database(keepdb=options['keepdb']):
+            if not LeaveRequest.objects.exists():
+                self.stdout.write(f"Seeding {options['rows']} leave requests...")
+                seed_leave_data(options['rows'], users=options['users'])
+
+            # the queryset ListLeaveRequest used before the values() path
+            queryset = LeaveRequest.objects.select_related(
+                'employee', 'leave_type', 'dept', 'unit', 'approved_by', 'recommended_by'
+            ).with_working_days().order_by('-created_on', '-id')[:options['page_size']]
+
+            def model_path():
+                return LeaveRequestListSerializer(queryset.all(), many=True).data
+
+            def values_path():
+                return LeaveRequestValuesSerializer(LeaveRequestValuesSerializer.values(queryset.all()), many=True).data
+
+            for name, run in (('LeaveRequestListSerializer', model_path), ('LeaveRequestValuesSerializer', values_path)):
+                self.report(name, run, options['repeat'])
+
+    def report(self, name, run, repeat):
+        best = None
+        rows = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = len(run())
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        rate = rows / best if best else 0
+        self.stdout.write(f"{name}: {rows} rows in {best * 1000:.1f} ms, {rate:,.0f} rows/s (query included)")
@@ -0,0 +1,92 @@
+import multiprocessing
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.utils.benchmark import benchmark_database
+from UserAccounts.login_history import login_history_writer
+from UserAccounts.models import LoginHistory
+
+User = get_user_model()
+
+PASSWORD = 'bench-password'
+
+
+def client_logins(args):
+    """
+    Log in one user after another, like a single sync worker serving them;
+    runs in a forked process. Returns the request timings in ms.
+    """
+    usernames, indexes = args
+    client = Client()
+    url = reverse('token_obtain_pair')
+    timings = []
+    try:
+        for i in indexes:
+            started = time.perf_counter()
+            response = client.post(url, {'username': usernames[i % len(usernames)], 'password': PASSWORD})
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"Login failed: {response.content!r}")
+        # what a worker would write when it exits
+        login_history_writer.flush()
+    finally:
+        connections.close_all()
+    return timings
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure jwt/token/ latency under concurrent logins, one process per client, with "
+        "LoginHistory written inside the request and by the background writer, on a throwaway database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help="Employees to generate")
+        parser.add_argument('--logins', type=int, default=2000, help="Logins per run")
+        parser.add_argument('--concurrency', type=int, default=16, help="Concurrent clients")
+        parser.add_argument('--keepdb', action='store_true', help="Reuse and keep the test database")
+
+    def handle(self, *args, **options):
+        # a fast hasher, so the timings are not all PBKDF2
+        with benchmark_database(keepdb=options['keepdb']), \
+                override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            if not User.objects.filter(username__startswith='login-bench').exists():
+                password = make_password(PASSWORD)
+                User.objects.bulk_create(
+                    User(username=f'login-bench{i}', sur_name='Bench', first_name=str(i), password=password)
+                    for i in range(options['users'])
+                )
+            usernames = list(User.objects.filter(username__startswith='login-bench').values_list('username', flat=True))
+
+            # warm up connections and code paths before anything is timed
+            self.run_logins(usernames, options['concurrency'] * 5, options['concurrency'])
+
+            for label, write_async in (('in request', False), ('background writer', True)):
+                before = LoginHistory.objects.count()
+                with override_settings(LOGIN_HISTORY_ASYNC=write_async):
+                    timings = self.run_logins(usernames, options['logins'], options['concurrency'])
+                written = LoginHistory.objects.count() - before
+                self.report(label, timings, written)
+
+    def run_logins(self, usernames, logins, concurrency):
+        # connections must not be shared with the forked clients
+        connections.close_all()
+        slices = [(usernames, range(first, logins, concurrency)) for first in range(concurrency)]
+        with multiprocessing.get_context('fork').Pool(concurrency) as pool:
+            return sorted(t for timings in pool.map(client_logins, slices) for t in timings)
+
+    def report(self, label, timings, written):
+        def percentile(p):
+            return timings[min(len(timings) - 1, int(len(timings) * p / 100))]
+
+        self.stdout.write(
+            f"{label}: {len(timings)} logins, p50 {statistics.median(timings):.1f} ms, "
+            f"p95 {percentile(95):.1f} ms, p99 {percentile(99):.1f} ms, {written} rows written"
+        )
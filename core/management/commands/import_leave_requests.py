@@ -0,0 +1,44 @@
+import csv
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.utils.leave_import import IMPORT_CHUNK_SIZE, import_leave_requests, iter_import_rows, open_text
+
+
+class Command(BaseCommand):
+    help = "Bulk import leave applications from a CSV, NDJSON or JSON file."
+
+    FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson', '.json': 'json'}
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import")
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'ndjson', 'json'],
+                            help="File format (default: from the file extension)")
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE,
+                            help="Rows validated and inserted per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Validate only, save nothing")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['file_format'] or self.FORMATS.get(os.path.splitext(path)[1].lower())
+        if file_format is None:
+            raise CommandError("Cannot tell the file format, pass --format.")
+
+        try:
+            with open(path, 'rb') as f:
+                report = import_leave_requests(
+                    iter_import_rows(open_text(f), file_format),
+                    chunk_size=options['chunk_size'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, ValueError, csv.Error) as exc:
+            raise CommandError(str(exc))
+
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'], default=str)}")
+        action = "Validated" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {report['created']} of {report['total_rows']} rows, {report['failed']} failed."
+        ))
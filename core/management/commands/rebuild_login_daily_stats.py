@@ -0,0 +1,20 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from UserAccounts.login_stats import rebuild_login_daily_stats
+
+
+class Command(BaseCommand):
+    help = "Recount the LoginDailyStats rollup from LoginHistory, e.g. after importing logins or deleting them in SQL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help="First day to recount, YYYY-MM-DD (default: the first login)")
+        parser.add_argument('--end', type=date.fromisoformat, help="Last day to recount, YYYY-MM-DD (default: the last login)")
+
+    def handle(self, *args, **options):
+        count = rebuild_login_daily_stats(options['start'], options['end'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {count} daily login rows from {options['start'] or 'the first login'} "
+            f"to {options['end'] or 'the last login'}."
+        ))
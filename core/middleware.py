@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+
+
+class ThresholdGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that leaves responses under settings.GZIP_MIN_LENGTH bytes
+    alone; below about a kilobyte the CPU cost outweighs the bytes saved.
+    Streaming responses (the leave export) are always compressed.
+
+    Views named in settings.GZIP_EXCLUDE_URL_NAMES are never compressed:
+    they return tokens next to input the client chose, which compression
+    would expose to length side channels (BREACH).
+    """
+
+    def process_response(self, request, response):
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match is not None and resolver_match.url_name in getattr(settings, 'GZIP_EXCLUDE_URL_NAMES', ()):
+            return response
+        min_length = getattr(settings, 'GZIP_MIN_LENGTH', 1024)
+        if not response.streaming and len(response.content) < min_length:
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:57
+
+from datetime import date, timedelta
+
+from django.db import migrations, models
+
+
+def populate_working_days(apps, schema_editor):
+    Holiday = apps.get_model('core', 'Holiday')
+    WorkingDay = apps.get_model('core', 'WorkingDay')
+
+    holidays = set(Holiday.objects.values_list('date', flat=True))
+    year = date.today().year
+    day, last = date(year - 1, 1, 1), date(year + 5, 12, 31)
+    rows = []
+    ordinal = 0
+    while day <= last:
+        is_working_day = day.weekday() < 5 and day not in holidays
+        ordinal += int(is_working_day)
+        rows.append(WorkingDay(date=day, is_working_day=is_working_day, ordinal=ordinal))
+        day += timedelta(days=1)
+    WorkingDay.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_remove_leaverequest_deductible_leave_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkingDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('is_working_day', models.BooleanField()),
+                ('ordinal', models.IntegerField()),
+            ],
+            options={
+                'ordering': ['date'],
+                'indexes': [models.Index(condition=models.Q(('is_working_day', True)), fields=['ordinal'], name='core_workingday_ordinal_idx')],
+            },
+        ),
+        migrations.RunPython(populate_working_days, migrations.RunPython.noop),
+    ]
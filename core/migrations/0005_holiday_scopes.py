@@ -0,0 +1,45 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_workingday'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='holiday',
+            name='dept',
+            field=models.ForeignKey(blank=True, help_text='Only observed by this department', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='holidays', to='core.department'),
+        ),
+        migrations.AddField(
+            model_name='holiday',
+            name='dept_type',
+            field=models.CharField(blank=True, choices=[('CLINICAL', 'CLINICAL'), ('NON-CLINICAL', 'NON-CLINICAL')], help_text='Only observed by departments of this type', max_length=200, null=True),
+        ),
+        migrations.AlterField(
+            model_name='holiday',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.AddConstraint(
+            model_name='holiday',
+            constraint=models.UniqueConstraint(condition=models.Q(('dept__isnull', True), ('dept_type__isnull', True)), fields=('date',), name='core_holiday_unique_global_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='holiday',
+            constraint=models.UniqueConstraint(condition=models.Q(('dept__isnull', True), ('dept_type__isnull', False)), fields=('date', 'dept_type'), name='core_holiday_unique_dept_type_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='holiday',
+            constraint=models.UniqueConstraint(condition=models.Q(('dept__isnull', False)), fields=('date', 'dept'), name='core_holiday_unique_dept_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='holiday',
+            constraint=models.CheckConstraint(condition=models.Q(('dept_type__isnull', True), ('dept__isnull', True), _connector='OR'), name='core_holiday_single_scope'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:06
+
+import re
+
+from django.db import migrations, models
+
+
+def seed_sequences(apps, schema_editor):
+    # Start the counters after any existing code that already looks like
+    # PREFIX-YEAR-NUMBER so that generated codes cannot hit the unique index
+    LeaveRequest = apps.get_model('core', 'LeaveRequest')
+    LeaveCodeSequence = apps.get_model('core', 'LeaveCodeSequence')
+
+    last_values = {}
+    for code in LeaveRequest.objects.values_list('leave_code', flat=True).iterator():
+        match = re.match(r'^([A-Z0-9]{1,10})-(\d{4})-(\d+)$', code)
+        if match:
+            key = (match.group(1), int(match.group(2)))
+            last_values[key] = max(last_values.get(key, 0), int(match.group(3)))
+    LeaveCodeSequence.objects.bulk_create(
+        LeaveCodeSequence(prefix=prefix, year=year, last_value=value)
+        for (prefix, year), value in last_values.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_holiday_scopes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveCodeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=10)),
+                ('year', models.IntegerField()),
+                ('last_value', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('prefix', 'year')},
+            },
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
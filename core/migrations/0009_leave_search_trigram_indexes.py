@@ -0,0 +1,51 @@
+import sys
+
+from django.db import DatabaseError, migrations, transaction
+
+# (index name, app label, model, column) served by the leave search
+TRIGRAM_INDEXES = [
+    ('core_leave_code_trgm_idx', 'core', 'LeaveRequest', 'leave_code'),
+    ('core_leavetype_name_trgm_idx', 'core', 'LeaveType', 'name'),
+    ('useraccounts_surname_trgm_idx', 'UserAccounts', 'UserAccounts', 'sur_name'),
+    ('useraccounts_firstname_trgm_idx', 'UserAccounts', 'UserAccounts', 'first_name'),
+    ('useraccounts_username_trgm_idx', 'UserAccounts', 'UserAccounts', 'username'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # GIN trigram indexes only exist on PostgreSQL; other databases use
+    # the icontains fallback in core.utils.leave_search
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError as exc:
+        sys.stderr.write(f"pg_trgm is not available, leave search falls back to icontains: {exc}\n")
+        return
+
+    quote = schema_editor.quote_name
+    for name, app_label, model_name, column in TRIGRAM_INDEXES:
+        table = apps.get_model(app_label, model_name)._meta.db_table
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} USING gin ({quote(column)} gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, *_ in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(name)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_leaverequest_access_indexes'),
+        ('UserAccounts', '0009_loginhistory_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
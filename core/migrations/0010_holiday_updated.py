@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_leave_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='holiday',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:50
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_holiday_updated'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='WorkingDay',
+        ),
+    ]
@@ -1,3 +1,5 @@
+import re
+
 from django.db import models
 from datetime import timedelta
 from django.utils.timezone import now
@@ -8,6 +10,137 @@ User = get_user_model()
 from django.utils import timezone
 from django.contrib.gis.geoip2 import GeoIP2
 
+class HolidayScopedFunc(models.Func):
+    """
+    Base for SQL working-day arithmetic over the holidays observed by a
+    department. Subclasses give the SQL per backend, with {name} for each
+    argument in arg_names and {scope} for the holiday scope condition.
+    """
+    arg_names = ()
+
+    # A holiday applies to everyone, to the department's type, or to the
+    # department itself (see Holiday)
+    holiday_scope_sql = (
+        "(core_holiday.dept_id = {dept} OR (core_holiday.dept_id IS NULL AND "
+        "(core_holiday.dept_type IS NULL OR core_holiday.dept_type = "
+        "(SELECT core_department.type FROM core_department WHERE core_department.id = {dept}))))"
+    )
+
+    def _render(self, compiler, template):
+        compiled = {
+            name: compiler.compile(expression) for name, expression in zip(self.arg_names, self.source_expressions)
+        }
+        sql = []
+        params = []
+        # odd parts are argument names; params follow their order in the SQL
+        for i, part in enumerate(re.split(r'\{(\w+)\}', template.replace('{scope}', self.holiday_scope_sql))):
+            if i % 2:
+                part_sql, part_params = compiled[part]
+                sql.append(part_sql)
+                params.extend(part_params)
+            else:
+                sql.append(part)
+        return ''.join(sql), tuple(params)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self._render(compiler, self.postgresql_sql)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self._render(compiler, self.sqlite_sql)
+
+
+class WorkingDaysBetween(HolidayScopedFunc):
+    """
+    SQL count of the days from start to end (both included, UTC dates) that
+    are neither weekends nor holidays observed by the given department.
+    Mirrors LeaveRequest.working_days without a query per row.
+    """
+    output_field = models.IntegerField()
+    arity = 3
+    arg_names = ('start', 'end', 'dept')
+
+    postgresql_sql = (
+        "(SELECT COUNT(*) FROM generate_series("
+        "date_trunc('day', {start} AT TIME ZONE 'UTC'), "
+        "date_trunc('day', {end} AT TIME ZONE 'UTC'), "
+        "interval '1 day') AS series(day) "
+        "WHERE EXTRACT(ISODOW FROM series.day) < 6 "
+        "AND NOT EXISTS (SELECT 1 FROM core_holiday WHERE core_holiday.date = series.day::date "
+        "AND {scope}))"
+    )
+    # SQLite has no generate_series, so the date series is a recursive CTE
+    sqlite_sql = (
+        "(WITH RECURSIVE series(day) AS ("
+        "SELECT date({start}) "
+        "UNION ALL SELECT date(day, '+1 day') FROM series WHERE day < date({end})"
+        ") SELECT COUNT(*) FROM series "
+        "WHERE strftime('%%w', day) NOT IN ('0', '6') "
+        "AND day NOT IN (SELECT core_holiday.date FROM core_holiday WHERE {scope}))"
+    )
+
+
+class WorkingDaysAfter(HolidayScopedFunc):
+    """
+    SQL date that is `days` working days after start for the given
+    department: the start day is not counted and the time of day is kept.
+    Mirrors calc_end_date(); `days` <= 0 gives the start itself.
+    """
+    output_field = models.DateTimeField()
+    arity = 3
+    arg_names = ('start', 'days', 'dept')
+
+    # walks day by day, counting working days, until the count reaches `days`
+    postgresql_sql = (
+        "(WITH RECURSIVE series(day, worked) AS ("
+        "SELECT date_trunc('day', {start} AT TIME ZONE 'UTC'), 0 "
+        "UNION ALL SELECT series.day + interval '1 day', series.worked + CASE "
+        "WHEN EXTRACT(ISODOW FROM series.day + interval '1 day') < 6 "
+        "AND NOT EXISTS (SELECT 1 FROM core_holiday "
+        "WHERE core_holiday.date = (series.day + interval '1 day')::date AND {scope}) "
+        "THEN 1 ELSE 0 END FROM series WHERE series.worked < {days}"
+        ") SELECT {start} + (MIN(series.day) - date_trunc('day', {start} AT TIME ZONE 'UTC')) "
+        "FROM series WHERE series.worked >= {days})"
+    )
+    # datetimes are 'YYYY-MM-DD HH:MM:SS[.ffffff]' text, so the time of day
+    # is the start's text from the 11th character on
+    sqlite_sql = (
+        "(WITH RECURSIVE series(day, worked) AS ("
+        "SELECT date({start}), 0 "
+        "UNION ALL SELECT date(day, '+1 day'), worked + ("
+        "strftime('%%w', date(day, '+1 day')) NOT IN ('0', '6') "
+        "AND date(day, '+1 day') NOT IN (SELECT core_holiday.date FROM core_holiday WHERE {scope})"
+        ") FROM series WHERE worked < {days}"
+        ") SELECT MIN(day) || substr({start}, 11) FROM series WHERE worked >= {days})"
+    )
+
+
+class LeaveRequestQuerySet(models.QuerySet):
+
+    def with_working_days(self):
+        """
+        Annotate each leave request with its working days, computed in SQL.
+        The count is a subquery per row, meant for a page of results; it is
+        NULL while the end date is not set, as LeaveRequest.working_days is None.
+        """
+        return self.annotate(annotated_working_days=models.Case(
+            models.When(
+                start_date__isnull=False, end_date__isnull=False,
+                then=WorkingDaysBetween('start_date', 'end_date', 'dept'),
+            ),
+            default=None,
+            output_field=models.IntegerField(),
+        ))
+
+    def with_end_dates(self):
+        """
+        Annotate each leave request with the date number_of_days working days
+        after its start, as calc_end_date() computes it, for reports that
+        compare it with the stored end date. A subquery per row, like
+        with_working_days().
+        """
+        return self.annotate(calculated_end_date=WorkingDaysAfter('start_date', 'number_of_days', 'dept'))
+
+
 # This model definition stores information about all depts in the Hosp
 # 
 class Department(models.Model):
@@ -84,6 +217,28 @@ class LeaveRequest(models.Model):
     created_on = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField(auto_now=True)
     
+    objects = LeaveRequestQuerySet.as_manager()
+
+    class Meta:
+        # match the keyset pagination order of the list endpoints
+        indexes = [
+            models.Index(fields=['-created_on', '-id'], name='core_leave_created_idx'),
+            models.Index(fields=['dept', '-created_on', '-id'], name='core_leave_dept_created_idx'),
+            models.Index(fields=['unit', '-created_on', '-id'], name='core_leave_unit_created_idx'),
+            models.Index(fields=['employee', '-created_on', '-id'], name='core_leave_emp_created_idx'),
+            # filters used by the submission checks, approvals and calendars
+            models.Index(fields=['employee', 'status'], name='core_leave_emp_status_idx'),
+            models.Index(fields=['employee', 'leave_type', 'start_date'], name='core_leave_emp_type_start_idx'),
+            models.Index(fields=['dept', 'status'], name='core_leave_dept_status_idx'),
+            models.Index(fields=['unit', 'start_date'], name='core_leave_unit_start_idx'),
+            # the "already has an open request" check only looks at open leave
+            models.Index(
+                fields=['employee'],
+                condition=models.Q(status__in=['pending', 'approved']),
+                name='core_leave_open_emp_idx',
+            ),
+        ]
+    
     def __str__(self):
         
         return f"{self.employee.sur_name} - {self.start_date} to {self.end_date}"
@@ -91,32 +246,45 @@ class LeaveRequest(models.Model):
     @property
     def working_days(self):
         """Returns the number of leave days excluding weekends and public holidays."""
-        start = self.start_date.date()
-        end = self.end_date.date()
+        # already computed by LeaveRequest.objects.with_working_days()
+        if 'annotated_working_days' in self.__dict__:
+            return self.annotated_working_days
 
-        total_days = (end - start).days + 1  # include both start and end date
-        leave_days = 0
+        if self.start_date is None or self.end_date is None:
+            return None
 
-        for i in range(total_days):
-            day = start + timedelta(days=i)
-            if day.weekday() >= 5:  # 5 = Saturday, 6 = Sunday
-                continue  # skip weekends
-            if Holiday.objects.filter(date=day).exists():
-                continue  # skip public holidays
-            leave_days += 1
+        from core.utils.holidays import get_holiday_calendar
 
-        return leave_days
+        return get_holiday_calendar(self.dept_id).count_working_days(self.start_date, self.end_date)
 
 
-# This stores holidays available in a year
+# This stores holidays available in a year. A holiday applies to all staff
+# unless it is limited to a department type or to a single department.
 class Holiday(models.Model):
     name = models.CharField(max_length=255)
-    date = models.DateField(unique=True)  # Ensures no duplicate dates
+    date = models.DateField()
     description = models.TextField(blank=True, null=True)
+    dept_type = models.CharField(max_length=200, choices=Department.DEPT_TYPES, blank=True, null=True, help_text="Only observed by departments of this type")
+    dept = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='holidays', blank=True, null=True, help_text="Only observed by this department")
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Ensures no duplicate dates within a scope
+            models.UniqueConstraint(fields=['date'], condition=models.Q(dept_type__isnull=True, dept__isnull=True), name='core_holiday_unique_global_date'),
+            models.UniqueConstraint(fields=['date', 'dept_type'], condition=models.Q(dept_type__isnull=False, dept__isnull=True), name='core_holiday_unique_dept_type_date'),
+            models.UniqueConstraint(fields=['date', 'dept'], condition=models.Q(dept__isnull=False), name='core_holiday_unique_dept_date'),
+            models.CheckConstraint(condition=models.Q(dept_type__isnull=True) | models.Q(dept__isnull=True), name='core_holiday_single_scope'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.date}"
     
+    def save(self, *args, **kwargs):
+        # a blank type means the holiday is not limited to a department type
+        self.dept_type = self.dept_type or None
+        super().save(*args, **kwargs)
+    
 
 # This model stores the leave balance for each employee
 class LeaveBalance(models.Model):
@@ -140,3 +308,16 @@ class LeaveBalance(models.Model):
 
     
     
+
+
+# This model stores the last leave code number handed out per prefix and year
+class LeaveCodeSequence(models.Model):
+    prefix = models.CharField(max_length=10)
+    year = models.IntegerField()
+    last_value = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['prefix', 'year']
+
+    def __str__(self):
+        return f"{self.prefix}-{self.year} ({self.last_value})"
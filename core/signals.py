@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished, request_started
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Department, Holiday
+from core.utils.cache_versions import bump_version, employee_version_key
+from core.utils.holidays import begin_request, end_request, invalidate_holiday_calendar
+
+
+# The holiday calendars are checked against the database once per request
+request_started.connect(begin_request, dispatch_uid='core.holidays.begin_request')
+request_finished.connect(end_request, dispatch_uid='core.holidays.end_request')
+
+
+# Rebuild this process's holiday calendars as soon as it changes a Holiday
+# or a department type
+@receiver(post_save, sender=Holiday)
+@receiver(post_delete, sender=Holiday)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def holiday_changed(sender, **kwargs):
+    invalidate_holiday_calendar()
+
+
+# CachedJWTAuthentication serves users cached under their version. Bumped
+# after commit so nobody caches the old row under the new version.
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def employee_changed(sender, instance, **kwargs):
+    key = employee_version_key(instance.pk)
+    transaction.on_commit(lambda: bump_version(key))
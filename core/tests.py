@@ -1,3 +1,1046 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import random
+import threading
+import uuid
+from datetime import date, datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError, PermissionDenied
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.api.pagination import MAX_PAGE_SIZE, LoginHistoryPagination
+from core.api.parsers import FastJSONParser
+from core.api.serializers import (
+    HolidaySerializers, LeaveRequestListSerializer, LeaveRequestSerializers, LeaveRequestValuesSerializer,
+    requested_fields,
+)
+from core.api.renderers import FastJSONRenderer
+from core.api.views import (
+    HolidayCreateList, LeaveDateCalculator, LeaveEligibilityCheck, LeaveRequestExport, ListLeaveRequest,
+)
+from core.models import Department, Holiday, LeaveBalance, LeaveRequest, LeaveType, Unit
+from core.utils.busdays import batch_end_dates, batch_working_days, get_busdaycalendar
+from core.utils.holidays import HolidayCalendar, begin_request, end_request, working_day_window
+from core.utils.leave_balances import DEFAULT_LEAVE_DAYS, ensure_leave_balance, reserve_leave_days
+from core.utils.leave_codes import allocate_leave_code, claim_leave_codes, parse_leave_code
+from core.utils.leave_import import LeaveImporter, import_leave_requests, iter_import_rows
+from core.utils.leave_search import _icontains_search, search_leave_requests, trigram_search_available
+from core.utils.utilities import calc_end_date, compute_leave_days
+from UserAccounts.models import LoginHistory, UserAccounts
+
+FRIDAY = date(2027, 1, 8)
+MONDAY = date(2027, 1, 11)
+TUESDAY = date(2027, 1, 12)
+
+
+def is_working_day(day, holidays):
+    return day.weekday() < 5 and day not in holidays
+
+
+def walk_end_date(start, leave_days, holidays):
+    """calc_end_date the slow way, one day at a time."""
+    end = start
+    while leave_days > 0:
+        end += timedelta(days=1)
+        leave_days -= is_working_day(end, holidays)
+    return end
+
+
+def walk_working_days(start, end, holidays):
+    """compute_leave_days the slow way, one day at a time."""
+    return sum(is_working_day(start + timedelta(days=i), holidays) for i in range((end - start).days + 1))
+
+
+class HolidayCalendarTests(TestCase):
+    """HolidayCalendar must agree with walking the calendar, inside and outside its window."""
+
+    def setUp(self):
+        rng = random.Random(1)
+        first, last = working_day_window()
+        # dates from a year before to a year after the precomputed window
+        self.first = first - timedelta(days=365)
+        self.span = (last - first).days + 730
+        self.holidays = {self.first + timedelta(days=rng.randrange(self.span)) for _ in range(150)}
+        self.calendar = HolidayCalendar(self.holidays)
+        self.rng = random.Random(2)
+
+    def random_day(self):
+        return self.first + timedelta(days=self.rng.randrange(self.span))
+
+    def test_add_working_days(self):
+        for _ in range(1000):
+            start, days = self.random_day(), self.rng.randrange(-2, 60)
+            self.assertEqual(
+                self.calendar.add_working_days(start, days), walk_end_date(start, days, self.holidays), (start, days)
+            )
+
+    def test_count_working_days(self):
+        for _ in range(1000):
+            start = self.random_day()
+            end = start + timedelta(days=self.rng.randrange(-5, 90))
+            self.assertEqual(
+                self.calendar.count_working_days(start, end), walk_working_days(start, end, self.holidays), (start, end)
+            )
+
+    def test_datetime_keeps_time_of_day(self):
+        calendar = HolidayCalendar([MONDAY])
+        start = datetime(2027, 1, 8, 9, 30)
+        self.assertEqual(calendar.add_working_days(start, 1), datetime(2027, 1, 12, 9, 30))
+        self.assertEqual(calendar.count_working_days(start, datetime(2027, 1, 12, 8)), 2)
+
+    def test_empty_calendar_counts_weekdays(self):
+        calendar = HolidayCalendar([])
+        self.assertEqual(calendar.add_working_days(FRIDAY, 1), MONDAY)
+        self.assertEqual(calendar.count_working_days(FRIDAY, TUESDAY), 3)
+
+
+class HolidayCalendarCacheTests(TestCase):
+    """The cached calendar follows Holiday rows changed in any process."""
+
+    def test_holidays_are_skipped(self):
+        self.assertEqual(calc_end_date(FRIDAY, 1), MONDAY)
+        Holiday.objects.create(name='Closure', date=MONDAY)
+        self.assertEqual(calc_end_date(FRIDAY, 1), TUESDAY)
+        self.assertEqual(compute_leave_days(FRIDAY, TUESDAY), 2)
+
+    def test_changes_made_without_signals_are_seen(self):
+        self.assertEqual(calc_end_date(FRIDAY, 1), MONDAY)
+        # bulk_create and raw SQL send no signals, like a save in another worker
+        Holiday.objects.bulk_create([Holiday(name='Closure', date=MONDAY)])
+        self.assertEqual(calc_end_date(FRIDAY, 1), TUESDAY)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {Holiday._meta.db_table}")
+        self.assertEqual(calc_end_date(FRIDAY, 1), MONDAY)
+
+    def test_checked_once_per_request(self):
+        Holiday.objects.create(name='Closure', date=MONDAY)
+        begin_request()
+        try:
+            self.assertEqual(calc_end_date(FRIDAY, 1), TUESDAY)
+            with self.assertNumQueries(0):
+                self.assertEqual(calc_end_date(FRIDAY, 2), date(2027, 1, 13))
+                self.assertEqual(compute_leave_days(FRIDAY, TUESDAY), 2)
+        finally:
+            end_request()
+        begin_request()
+        try:
+            with self.assertNumQueries(1):
+                calc_end_date(FRIDAY, 1)
+        finally:
+            end_request()
+
+
+class ScopedHolidayTests(TestCase):
+    """A holiday limited to a department type or a department moves only that scope's dates."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.surgery = Department.objects.create(name='Surgery', type='CLINICAL')
+        cls.pharmacy = Department.objects.create(name='Pharmacy', type='CLINICAL')
+        cls.accounts = Department.objects.create(name='Accounts', type='NON-CLINICAL')
+
+    def end_dates(self):
+        return [calc_end_date(FRIDAY, 1, dept=dept) for dept in (None, self.surgery, self.pharmacy, self.accounts)]
+
+    def test_department_type_holiday(self):
+        Holiday.objects.create(name='Clinical day', date=MONDAY, dept_type='CLINICAL')
+        self.assertEqual(self.end_dates(), [MONDAY, TUESDAY, TUESDAY, MONDAY])
+
+    def test_department_holiday(self):
+        Holiday.objects.create(name='Audit', date=MONDAY, dept=self.accounts)
+        self.assertEqual(self.end_dates(), [MONDAY, MONDAY, MONDAY, TUESDAY])
+        self.assertEqual(compute_leave_days(FRIDAY, TUESDAY, dept=self.accounts), 2)
+        self.assertEqual(compute_leave_days(FRIDAY, TUESDAY, dept=self.surgery), 3)
+
+    def test_department_type_change(self):
+        Holiday.objects.create(name='Clinical day', date=MONDAY, dept_type='CLINICAL')
+        self.accounts.type = 'CLINICAL'
+        self.accounts.save()
+        self.assertEqual(calc_end_date(FRIDAY, 1, dept=self.accounts), TUESDAY)
+
+    def test_same_date_in_different_scopes(self):
+        Holiday.objects.create(name='Closure', date=MONDAY)
+        Holiday.objects.create(name='Clinical day', date=MONDAY, dept_type='CLINICAL')
+        Holiday.objects.create(name='Audit', date=MONDAY, dept=self.accounts)
+        Holiday.objects.create(name='Audit', date=MONDAY, dept=self.surgery)
+        self.assertEqual(self.end_dates(), [TUESDAY] * 4)
+
+    def test_duplicate_in_scope_is_refused_by_the_database(self):
+        Holiday.objects.create(name='Closure', date=MONDAY)
+        Holiday.objects.create(name='Clinical day', date=MONDAY, dept_type='CLINICAL')
+        Holiday.objects.create(name='Audit', date=MONDAY, dept=self.accounts)
+        for scope in ({}, {'dept_type': 'CLINICAL'}, {'dept': self.accounts}, {'dept_type': 'NON-CLINICAL', 'dept': self.surgery}):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                Holiday.objects.create(name='Again', date=MONDAY, **scope)
+
+    def test_serializer_rejects_duplicate_in_scope(self):
+        Holiday.objects.create(name='Audit', date=MONDAY, dept=self.accounts)
+        Holiday.objects.create(name='Clinical day', date=MONDAY, dept_type='CLINICAL')
+        for scope in ({'dept': self.accounts.pk}, {'dept_type': 'CLINICAL'}):
+            serializer = HolidaySerializers(data={'name': 'Again', 'date': MONDAY, **scope})
+            self.assertFalse(serializer.is_valid(), scope)
+            self.assertIn('date', serializer.errors)
+        for scope in ({}, {'dept_type': ''}, {'dept': self.surgery.pk}, {'dept_type': 'NON-CLINICAL'}):
+            serializer = HolidaySerializers(data={'name': 'Other scope', 'date': MONDAY, **scope})
+            self.assertTrue(serializer.is_valid(), (scope, serializer.errors))
+
+    def test_serializer_rejects_two_scopes(self):
+        serializer = HolidaySerializers(data={
+            'name': 'Both', 'date': MONDAY, 'dept_type': 'CLINICAL', 'dept': self.surgery.pk,
+        })
+        self.assertFalse(serializer.is_valid())
+
+    def test_serializer_update_keeps_its_own_date(self):
+        holiday = Holiday.objects.create(name='Audit', date=MONDAY, dept=self.accounts)
+        serializer = HolidaySerializers(holiday, data={'name': 'Year-end audit'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+
+class BusdayEngineTests(TestCase):
+    """The numpy engine must give the same answers as the scalar functions, per department."""
+
+    @classmethod
+    def setUpTestData(cls):
+        clinical = Department.objects.create(name='Surgery', type='CLINICAL')
+        accounts = Department.objects.create(name='Accounts', type='NON-CLINICAL')
+        cls.depts = [None, clinical.pk, accounts.pk]
+        rng = random.Random(3)
+        cls.first = date(2024, 1, 1)
+        scopes = [{}, {'dept_type': 'CLINICAL'}, {'dept': accounts}]
+        for scope in scopes:
+            days = {cls.first + timedelta(days=rng.randrange(3650)) for _ in range(60)}
+            Holiday.objects.bulk_create(Holiday(name='Holiday', date=day, **scope) for day in days)
+
+    def setUp(self):
+        self.rng = random.Random(4)
+        self.starts = [self.first + timedelta(days=self.rng.randrange(3650)) for _ in range(500)]
+        self.row_depts = [self.rng.choice(self.depts) for _ in self.starts]
+
+    def test_end_dates_match_calc_end_date(self):
+        days = [self.rng.randrange(-1, 45) for _ in self.starts]
+        ends = batch_end_dates(self.starts, days, depts=self.row_depts).tolist()
+        for start, count, dept, end in zip(self.starts, days, self.row_depts, ends):
+            self.assertEqual(end, calc_end_date(start, count, dept=dept), (start, count, dept))
+
+    def test_working_days_match_compute_leave_days(self):
+        ends = [start + timedelta(days=self.rng.randrange(-5, 60)) for start in self.starts]
+        counts = batch_working_days(self.starts, ends, depts=self.row_depts).tolist()
+        for start, end, dept, count in zip(self.starts, ends, self.row_depts, counts):
+            self.assertEqual(count, compute_leave_days(start, end, dept=dept), (start, end, dept))
+
+    def test_single_department_and_datetimes(self):
+        dept = self.depts[1]
+        starts = [datetime.combine(start, datetime.min.time()) for start in self.starts[:50]]
+        ends = batch_end_dates(starts, 10, depts=dept).tolist()
+        self.assertEqual(ends, [calc_end_date(start, 10, dept=dept).date() for start in starts])
+
+    def test_empty_holiday_calendar(self):
+        busdaycal = get_busdaycalendar(HolidayCalendar([]))
+        self.assertEqual(len(busdaycal.holidays), 0)
+
+
+class WorkingDaysAnnotationTests(TestCase):
+    """with_working_days() must count in SQL what LeaveRequest.working_days counts in Python."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(6)
+        clinical = Department.objects.create(name='Surgery', type='CLINICAL')
+        accounts = Department.objects.create(name='Accounts', type='NON-CLINICAL')
+        units = [Unit.objects.create(name=dept.name, dept=dept) for dept in (clinical, accounts)]
+        employee = UserAccounts.objects.create_user('employee', 'password', first_name='Em', sur_name='Ployee')
+        leave_type = LeaveType.objects.create(name='Annual Leave', number_of_days=30)
+        for scope in ({}, {'dept_type': 'CLINICAL'}, {'dept': accounts}):
+            days = {FRIDAY + timedelta(days=rng.randrange(-60, 60)) for _ in range(15)}
+            Holiday.objects.bulk_create(Holiday(name='Holiday', date=day, **scope) for day in days)
+        for i in range(60):
+            unit = rng.choice(units)
+            start = timezone.make_aware(datetime.combine(FRIDAY, datetime.min.time()) + timedelta(
+                days=rng.randrange(-50, 30), hours=rng.randrange(24)
+            ))
+            LeaveRequest.objects.create(
+                employee=employee, leave_type=leave_type, dept=unit.dept, unit=unit,
+                start_date=start, end_date=start + timedelta(days=rng.randrange(0, 30), hours=rng.randrange(24)),
+                reason='Rest', leave_last_taken=FRIDAY, number_of_days=1, leave_code=f'AL-{i}',
+                home_address='Home', place_to_spend_leave='Home',
+            )
+
+    def test_annotation_matches_compute_leave_days(self):
+        for leave in LeaveRequest.objects.with_working_days():
+            self.assertEqual(
+                leave.annotated_working_days,
+                compute_leave_days(leave.start_date, leave.end_date, dept=leave.dept_id),
+                (leave.start_date, leave.end_date, leave.dept_id),
+            )
+
+    def test_annotation_matches_property(self):
+        annotated = {leave.pk: leave.working_days for leave in LeaveRequest.objects.with_working_days()}
+        self.assertEqual(annotated, {leave.pk: leave.working_days for leave in LeaveRequest.objects.all()})
+
+    def test_end_date_annotation_matches_calc_end_date(self):
+        rng = random.Random(7)
+        for leave in LeaveRequest.objects.all():
+            LeaveRequest.objects.filter(pk=leave.pk).update(number_of_days=rng.randrange(0, 40))
+        for leave in LeaveRequest.objects.with_end_dates():
+            self.assertEqual(
+                leave.calculated_end_date,
+                calc_end_date(leave.start_date, leave.number_of_days, dept=leave.dept_id),
+                (leave.start_date, leave.number_of_days, leave.dept_id),
+            )
+
+    def test_missing_end_date(self):
+        LeaveRequest.objects.update(end_date=None)
+        self.assertEqual({leave.working_days for leave in LeaveRequest.objects.with_working_days()}, {None})
+        self.assertEqual({leave.working_days for leave in LeaveRequest.objects.all()}, {None})
+
+
+class LeaveDateCalculatorTests(TestCase):
+    """POST /leave-dates/calculate/ answers as leave submission would."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dept = Department.objects.create(name='Surgery', type='CLINICAL')
+        cls.other = Department.objects.create(name='Accounts', type='NON-CLINICAL')
+        cls.user = UserAccounts.objects.create_user('planner', 'password', first_name='Plan', sur_name='Ner', dept=cls.dept)
+        Holiday.objects.create(name='Closure', date=MONDAY)
+        Holiday.objects.create(name='Theatre day', date=TUESDAY, dept=cls.dept)
+
+    def post(self, items):
+        request = APIRequestFactory().post('/leave-dates/calculate/', items, format='json')
+        force_authenticate(request, user=self.user)
+        return LeaveDateCalculator.as_view()(request)
+
+    def test_matches_calc_end_date(self):
+        rng = random.Random(5)
+        items = []
+        for _ in range(200):
+            start = FRIDAY + timedelta(days=rng.randrange(-30, 30))
+            item = {'start_date': start.isoformat()}
+            if rng.random() < 0.5:
+                item['number_of_days'] = rng.randrange(0, 30)
+            else:
+                item['end_date'] = (start + timedelta(days=rng.randrange(0, 40))).isoformat()
+            if rng.random() < 0.5:
+                item['dept'] = self.other.pk
+            items.append(item)
+
+        response = self.post(items)
+        self.assertEqual(response.status_code, 200)
+        for item, result in zip(items, response.data):
+            start = date.fromisoformat(item['start_date'])
+            dept = item.get('dept', self.dept.pk)
+            if 'number_of_days' in item:
+                self.assertEqual(result['end_date'], calc_end_date(start, item['number_of_days'], dept=dept), item)
+                self.assertEqual(result['number_of_days'], item['number_of_days'])
+            else:
+                self.assertEqual(result['end_date'], date.fromisoformat(item['end_date']))
+            self.assertEqual(result['working_days'], compute_leave_days(start, result['end_date'], dept=dept), item)
+
+    def test_department_defaults_to_the_callers(self):
+        response = self.post([
+            {'start_date': FRIDAY.isoformat(), 'number_of_days': 1},
+            {'start_date': FRIDAY.isoformat(), 'number_of_days': 1, 'dept': self.other.pk},
+        ])
+        self.assertEqual([result['end_date'] for result in response.data], [date(2027, 1, 13), TUESDAY])
+
+    def test_departments_are_looked_up_once(self):
+        items = [
+            {'start_date': FRIDAY.isoformat(), 'number_of_days': 1, 'dept': dept.pk}
+            for dept in (self.dept, self.other) * 50
+        ]
+        # one lookup per department, not one per item
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.post(items).status_code, 200)
+        self.assertLessEqual(len(queries), 6)
+
+    def test_item_limit(self):
+        item = {'start_date': FRIDAY.isoformat(), 'number_of_days': 1}
+        self.assertEqual(self.post([item] * LeaveDateCalculator.MAX_ITEMS).status_code, 200)
+        self.assertEqual(self.post([item] * (LeaveDateCalculator.MAX_ITEMS + 1)).status_code, 400)
+
+    def test_validation_errors(self):
+        start = FRIDAY.isoformat()
+        for item in (
+            {'start_date': start},
+            {'start_date': start, 'number_of_days': 1, 'end_date': start},
+            {'start_date': start, 'end_date': '2027-01-01'},
+            {'start_date': start, 'number_of_days': -1},
+            {'start_date': 'not a date', 'number_of_days': 1},
+            # unknown departments must not fall back to the global calendar
+            {'start_date': start, 'number_of_days': 1, 'dept': 0},
+            {'start_date': start, 'number_of_days': 1, 'dept': 'Surgery'},
+            {'start_date': start, 'number_of_days': 1, 'dept': [self.dept.pk]},
+        ):
+            response = self.post([{'start_date': start, 'number_of_days': 1}, item])
+            self.assertEqual(response.status_code, 400, item)
+            self.assertEqual(response.data[0], {}, item)
+            self.assertTrue(response.data[1], item)
+
+
+class LeaveBalanceTests(TestCase):
+    """Reservations take days from the balance and never overdraw it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = UserAccounts.objects.create_user('employee', 'password', first_name='Em', sur_name='Ployee')
+        cls.leave_type = LeaveType.objects.create(name='Annual Leave', number_of_days=30)
+
+    def balance(self):
+        return LeaveBalance.objects.values_list('days_used', 'days_remaining').get(
+            employee=self.employee, leave_type=self.leave_type, year=2027
+        )
+
+    def test_ensure_leave_balance_is_idempotent(self):
+        ensure_leave_balance(self.employee, self.leave_type, 2027)
+        reserve_leave_days(self.employee, self.leave_type, 2027, 5)
+        ensure_leave_balance(self.employee, self.leave_type, 2027)
+        self.assertEqual(LeaveBalance.objects.count(), 1)
+        self.assertEqual(self.balance(), (5, DEFAULT_LEAVE_DAYS - 5))
+
+    def test_reserve_up_to_the_balance(self):
+        reserve_leave_days(self.employee, self.leave_type, 2027, DEFAULT_LEAVE_DAYS - 1)
+        reserve_leave_days(self.employee, self.leave_type, 2027, 1)
+        self.assertEqual(self.balance(), (DEFAULT_LEAVE_DAYS, 0))
+
+    def test_overdraw_is_refused(self):
+        reserve_leave_days(self.employee, self.leave_type, 2027, DEFAULT_LEAVE_DAYS - 3)
+        with self.assertRaisesMessage(PermissionDenied, 'You have 3 days remaining'):
+            reserve_leave_days(self.employee, self.leave_type, 2027, 4)
+        self.assertEqual(self.balance(), (DEFAULT_LEAVE_DAYS - 3, 3))
+
+    def test_years_are_separate(self):
+        reserve_leave_days(self.employee, self.leave_type, 2027, DEFAULT_LEAVE_DAYS)
+        reserve_leave_days(self.employee, self.leave_type, 2028, DEFAULT_LEAVE_DAYS)
+        self.assertEqual(LeaveBalance.objects.filter(days_remaining=0).count(), 2)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentLeaveBalanceTests(TransactionTestCase):
+    """Concurrent reservations from separate connections share one balance."""
+
+    def test_concurrent_reservations_do_not_overdraw(self):
+        employee = UserAccounts.objects.create_user('employee', 'password', first_name='Em', sur_name='Ployee')
+        leave_type = LeaveType.objects.create(name='Annual Leave', number_of_days=30)
+        barrier = threading.Barrier(8)
+        outcomes = []
+
+        def reserve():
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    reserve_leave_days(employee, leave_type, 2027, 10)
+                outcomes.append(True)
+            except PermissionDenied:
+                outcomes.append(False)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=reserve) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count(True), DEFAULT_LEAVE_DAYS // 10)
+        balance = LeaveBalance.objects.get(employee=employee)
+        self.assertEqual((balance.days_used, balance.days_remaining), (DEFAULT_LEAVE_DAYS, 0))
+
+
+class LeaveEligibilityCheckTests(TestCase):
+    """GET /leave-request/eligibility/ runs the submission checks without submitting."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dept = Department.objects.create(name='Accounts', type='NON-CLINICAL')
+        cls.unit = Unit.objects.create(name='Payroll', dept=cls.dept)
+        cls.user = UserAccounts.objects.create_user('employee', 'password', first_name='Em', sur_name='Ployee', dept=cls.dept)
+        cls.leave_type = LeaveType.objects.create(name='Annual Leave', number_of_days=30)
+        Holiday.objects.create(name='Audit', date=MONDAY, dept=cls.dept)
+
+    def get(self, **params):
+        request = APIRequestFactory().get('/leave-request/eligibility/', params)
+        force_authenticate(request, user=self.user)
+        return LeaveEligibilityCheck.as_view()(request)
+
+    def test_eligible(self):
+        response = self.get(leave_type=self.leave_type.pk, start_date=FRIDAY, days=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'eligible': True, 'reasons': [], 'days_remaining': DEFAULT_LEAVE_DAYS, 'end_date': TUESDAY,
+        })
+
+    def test_ineligible(self):
+        LeaveRequest.objects.create(
+            employee=self.user, leave_type=self.leave_type, dept=self.dept, unit=self.unit,
+            start_date=timezone.now(), reason='Rest', leave_last_taken=FRIDAY, number_of_days=1,
+            leave_code='AL-1', home_address='Home', place_to_spend_leave='Home',
+        )
+        response = self.get(leave_type=self.leave_type.pk, start_date=FRIDAY, days=DEFAULT_LEAVE_DAYS + 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['eligible'])
+        self.assertEqual(len(response.data['reasons']), 3)
+
+    def test_other_department(self):
+        other = Department.objects.create(name='Surgery', type='CLINICAL')
+        response = self.get(leave_type=self.leave_type.pk, start_date=FRIDAY, days=1, dept=other.pk)
+        self.assertEqual(response.data['end_date'], MONDAY)
+
+    def test_unknown_leave_type_or_department(self):
+        missing = LeaveType.objects.order_by('-pk').values_list('pk', flat=True).first() + 1
+        response = self.get(leave_type=missing, start_date=FRIDAY, days=1)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('leave_type', response.data)
+
+        response = self.get(leave_type=self.leave_type.pk, start_date=FRIDAY, days=1, dept=self.dept.pk + 100)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('dept', response.data)
+
+
+class LeaveImportTests(TestCase):
+    """Bulk import saves the valid rows and reports every rejected row by number."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dept = Department.objects.create(name='Accident & Emergency', type='CLINICAL')
+        cls.unit = Unit.objects.create(name='Triage', dept=cls.dept)
+        cls.leave_type = LeaveType.objects.create(name='Annual Leave', number_of_days=30)
+        for name in ('ada', 'bola'):
+            UserAccounts.objects.create_user(name, 'password', first_name=name, sur_name=name, dept=cls.dept, unit=cls.unit)
+
+    def row(self, **fields):
+        row = {
+            'employee': 'ada', 'leave_type': 'Annual Leave', 'start_date': '2027-01-08',
+            'number_of_days': '1', 'reason': 'Rest', 'leave_last_taken': '2026-01-01',
+            'home_address': 'Home', 'place_to_spend_leave': 'Home',
+        }
+        row.update(fields)
+        return row
+
+    def days_remaining(self, username='ada'):
+        return LeaveBalance.objects.values_list('days_remaining', flat=True).get(employee__username=username)
+
+    def test_rows_are_saved_with_defaults(self):
+        Holiday.objects.create(name='Closure', date=MONDAY)
+        report = import_leave_requests([self.row(), self.row(employee='bola', number_of_days='2', status='approved')])
+        self.assertEqual((report['created'], report['failed'], report['errors']), (2, 0, []))
+        leave = LeaveRequest.objects.get(employee__username='ada')
+        self.assertEqual((leave.dept, leave.unit, leave.status), (self.dept, self.unit, 'pending'))
+        self.assertEqual(leave.end_date.date(), TUESDAY)
+        self.assertEqual(leave.leave_code, f'AE-{FRIDAY.year}-00001')
+        self.assertEqual(self.days_remaining('bola'), DEFAULT_LEAVE_DAYS - 2)
+
+    def test_row_errors_are_reported_by_row(self):
+        rows = [
+            self.row(),
+            self.row(employee='nobody'),
+            self.row(leave_type='Sabbatical'),
+            self.row(start_date='someday'),
+            self.row(leave_code='AE-1'),
+            self.row(employee='bola', leave_code='AE-1'),
+            self.row(employee='bola', number_of_days=str(DEFAULT_LEAVE_DAYS + 1)),
+            ['not', 'an', 'object'],
+        ]
+        report = import_leave_requests(rows)
+        self.assertEqual((report['total_rows'], report['created'], report['failed']), (8, 2, 6))
+        errors = {error['row']: set(error['errors']) for error in report['errors']}
+        self.assertEqual(errors, {
+            2: {'employee'}, 3: {'leave_type'}, 4: {'start_date'}, 6: {'leave_code'},
+            7: {'number_of_days'}, 8: {'non_field_errors'},
+        })
+
+    def test_chunks(self):
+        rows = [self.row(number_of_days='10') for _ in range(4)] + [self.row(employee='nobody')]
+        report = import_leave_requests(rows, chunk_size=2)
+        self.assertEqual(report['created'], 3)
+        # the balance carries over between chunks
+        self.assertEqual([error['row'] for error in report['errors']], [4, 5])
+        self.assertEqual(self.days_remaining(), 0)
+        self.assertEqual(LeaveRequest.objects.count(), 3)
+
+    def test_dry_run_saves_nothing(self):
+        rows = [self.row(number_of_days='10') for _ in range(4)]
+        report = import_leave_requests(rows, chunk_size=2, dry_run=True)
+        self.assertTrue(report['dry_run'])
+        self.assertEqual(report['created'], 3)
+        self.assertEqual([error['row'] for error in report['errors']], [4])
+        self.assertFalse(LeaveRequest.objects.exists())
+        self.assertFalse(LeaveBalance.objects.exists())
+
+    def test_explicit_codes_move_the_counter(self):
+        year = FRIDAY.year
+        rows = [self.row(leave_code=f'AE-{year}-00050'), self.row(employee='bola')]
+        report = import_leave_requests(rows)
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(LeaveRequest.objects.get(employee__username='bola').leave_code, f'AE-{year}-00051')
+        self.assertEqual(allocate_leave_code(self.dept, year), f'AE-{year}-00052')
+
+    def test_conflict_rejects_only_the_conflicting_row(self):
+        validate_chunk = LeaveImporter.validate_chunk
+
+        def validate_then_conflict(importer, numbered_rows):
+            valid = validate_chunk(importer, numbered_rows)
+            # another import takes a code after this one checked it
+            LeaveRequest.objects.create(
+                employee=UserAccounts.objects.get(username='bola'), leave_type=self.leave_type,
+                dept=self.dept, unit=self.unit, start_date=timezone.now(), reason='Rest',
+                leave_last_taken=FRIDAY, number_of_days=1, leave_code='AE-TAKEN',
+                home_address='Home', place_to_spend_leave='Home',
+            )
+            return valid
+
+        rows = [self.row(number_of_days='2'), self.row(leave_code='AE-TAKEN', number_of_days='3'), self.row()]
+        with mock.patch.object(LeaveImporter, 'validate_chunk', validate_then_conflict):
+            report = import_leave_requests(rows)
+        self.assertEqual((report['created'], report['failed']), (2, 1))
+        self.assertEqual(report['errors'][0]['row'], 2)
+        self.assertEqual(LeaveRequest.objects.filter(employee__username='ada').count(), 2)
+        # the rejected row's days are given back
+        self.assertEqual(self.days_remaining(), DEFAULT_LEAVE_DAYS - 3)
+
+    def test_file_formats(self):
+        csv_text = "employee,leave_type,start_date,number_of_days,alt_phone\nada,Annual Leave,2027-01-08,1,\n"
+        self.assertEqual(list(iter_import_rows(io.StringIO(csv_text), 'csv')), [{
+            'employee': 'ada', 'leave_type': 'Annual Leave', 'start_date': '2027-01-08',
+            'number_of_days': '1', 'alt_phone': '',
+        }])
+        ndjson = json.dumps(self.row()) + "\n\n{broken\n"
+        rows = list(iter_import_rows(io.StringIO(ndjson), 'ndjson'))
+        self.assertEqual(rows[0], self.row())
+        report = import_leave_requests(rows)
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(report['errors'][0]['row'], 2)
+
+
+class LeaveCodeTests(TestCase):
+    """Leave codes are handed out once per department and year."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dept = Department.objects.create(name='Accident & Emergency', type='CLINICAL')
+
+    def test_parse_leave_code(self):
+        self.assertEqual(parse_leave_code('AE-2027-00042'), ('AE', 2027, 42))
+        self.assertEqual(parse_leave_code('AE-2027-123456'), ('AE', 2027, 123456))
+        for code in ('AE-2027-42', 'ae-2027-00042', 'AE-00042', 'PAPER-17', '', None):
+            self.assertIsNone(parse_leave_code(code), code)
+
+    def test_claimed_codes_are_not_handed_out(self):
+        self.assertEqual(allocate_leave_code(self.dept, 2027), 'AE-2027-00001')
+        claim_leave_codes(['AE-2027-00007', 'AE-2027-00005', 'AE-2028-00003', 'PAPER-17'])
+        self.assertEqual(allocate_leave_code(self.dept, 2027), 'AE-2027-00008')
+        self.assertEqual(allocate_leave_code(self.dept, 2028), 'AE-2028-00004')
+
+    def test_lower_claims_do_not_move_the_counter_back(self):
+        for _ in range(3):
+            allocate_leave_code(self.dept, 2027)
+        claim_leave_codes(['AE-2027-00002'])
+        self.assertEqual(allocate_leave_code(self.dept, 2027), 'AE-2027-00004')
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages cover every row once, ties included; ?limit/?offset switch to offset pages."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = UserAccounts.objects.create_user('employee', 'password', first_name='Em', sur_name='Ployee')
+        now = timezone.now()
+        # three logins per instant, so most page boundaries fall inside a tie
+        LoginHistory.objects.bulk_create(
+            LoginHistory(user=user, login_time=now - timedelta(minutes=i // 3)) for i in range(30)
+        )
+        cls.expected = list(LoginHistory.objects.order_by('-login_time', '-id').values_list('pk', flat=True))
+
+    def paginate(self, url='/', **params):
+        paginator = LoginHistoryPagination()
+        request = Request(APIRequestFactory().get(url, params))
+        page = paginator.paginate_queryset(LoginHistory.objects.all(), request)
+        return [row.pk for row in page], paginator.get_paginated_response([]).data
+
+    def walk(self, page_size):
+        seen, data = self.paginate(page_size=page_size)
+        while data['next'] is not None:
+            pks, data = self.paginate(data['next'])
+            seen += pks
+        return seen
+
+    def test_cursor_pages_cover_every_row_once(self):
+        for page_size in (1, 2, 4, 7, 30):
+            self.assertEqual(self.walk(page_size), self.expected, page_size)
+
+    def test_cursor_after_a_new_row(self):
+        pks, data = self.paginate(page_size=5)
+        LoginHistory.objects.create(user=UserAccounts.objects.get())
+        self.assertEqual(self.paginate(data['next'])[0], self.expected[5:10])
+
+    def test_offset_pages(self):
+        pks, data = self.paginate(limit=4, offset=10)
+        self.assertEqual(pks, self.expected[10:14])
+        self.assertEqual(data['count'], 30)
+        self.assertEqual(self.paginate(offset=28)[0], self.expected[28:])
+
+    def test_page_size_ceiling(self):
+        LoginHistory.objects.bulk_create(
+            LoginHistory(user=UserAccounts.objects.get()) for _ in range(MAX_PAGE_SIZE)
+        )
+        self.assertEqual(len(self.paginate(page_size=MAX_PAGE_SIZE + 50)[0]), MAX_PAGE_SIZE)
+        self.assertEqual(len(self.paginate(limit=MAX_PAGE_SIZE + 50)[0]), MAX_PAGE_SIZE)
+        self.assertEqual(len(self.paginate()[0]), LoginHistoryPagination.page_size)
+
+
+class LeaveSearchTests(TestCase):
+    """Search matches names, usernames, codes and leave types, best matches first."""
+
+    @classmethod
+    def setUpTestData(cls):
+        dept = Department.objects.create(name='Accounts', type='NON-CLINICAL')
+        unit = Unit.objects.create(name='Payroll', dept=dept)
+        annual = LeaveType.objects.create(name='Annual Leave')
+        maternity = LeaveType.objects.create(name='Maternity Leave')
+        people = [('okafor', 'Okafor', 'Ada'), ('okaforo', 'Okaforo', 'Bola'), ('nokafor', 'Nokafor', 'Chidi')]
+        cls.leaves = {}
+        for i, (username, sur_name, first_name) in enumerate(people):
+            employee = UserAccounts.objects.create_user(username, 'password', first_name=first_name, sur_name=sur_name)
+            cls.leaves[username] = LeaveRequest.objects.create(
+                employee=employee, leave_type=maternity if i == 2 else annual, dept=dept, unit=unit,
+                start_date=timezone.now(), reason='Rest', leave_last_taken=FRIDAY, number_of_days=1,
+                leave_code=f'AC-2027-0000{i + 1}', home_address='Home', place_to_spend_leave='Home',
+            )
+
+    def usernames(self, queryset):
+        return [leave.employee.username for leave in queryset]
+
+    def test_icontains_ranks_exact_then_prefix_then_substring(self):
+        results = _icontains_search(LeaveRequest.objects.all(), 'OKAFOR')
+        self.assertEqual(self.usernames(results), ['okafor', 'okaforo', 'nokafor'])
+
+    def test_icontains_fields(self):
+        queryset = LeaveRequest.objects.all()
+        self.assertEqual(self.usernames(_icontains_search(queryset, 'chidi')), ['nokafor'])
+        self.assertEqual(self.usernames(_icontains_search(queryset, 'maternity')), ['nokafor'])
+        self.assertEqual(self.usernames(_icontains_search(queryset, 'ac-2027-00002')), ['okaforo'])
+        self.assertEqual(list(_icontains_search(queryset, 'zzz')), [])
+
+    def test_blank_term_lists_newest_first(self):
+        self.assertEqual(self.usernames(search_leave_requests(LeaveRequest.objects.all(), '  ')), ['nokafor', 'okaforo', 'okafor'])
+
+    def test_search_respects_the_queryset(self):
+        queryset = LeaveRequest.objects.exclude(pk=self.leaves['okafor'].pk)
+        self.assertEqual(self.usernames(search_leave_requests(queryset, 'okafor'))[0], 'okaforo')
+
+    def test_trigram_search(self):
+        if not trigram_search_available():
+            self.skipTest("needs PostgreSQL with pg_trgm")
+        results = self.usernames(search_leave_requests(LeaveRequest.objects.all(), 'okafor'))
+        self.assertEqual(results[0], 'okafor')
+        self.assertEqual(self.usernames(search_leave_requests(LeaveRequest.objects.all(), 'maternty')), ['nokafor'])
+
+
+class LeaveRequestValuesSerializerTests(TestCase):
+    """The values() serializer of the list endpoints gives the ModelSerializer's output."""
+
+    @classmethod
+    def setUpTestData(cls):
+        dept = Department.objects.create(name='Accounts', type='NON-CLINICAL')
+        unit = Unit.objects.create(name='Payroll', dept=dept)
+        leave_type = LeaveType.objects.create(name='Annual Leave')
+        employee = UserAccounts.objects.create_user('employee', 'password', first_name='Em', sur_name='Ployee', dept=dept)
+        hod = UserAccounts.objects.create_user('hod', 'password', first_name='Head', sur_name='Ofdept', dept=dept)
+        Holiday.objects.create(name='Audit', date=MONDAY, dept=dept)
+        start = timezone.make_aware(datetime(2027, 1, 8, 9, 30))
+        for i, extra in enumerate([
+            {'end_date': start + timedelta(days=4), 'approved_by': hod, 'recommended_by': hod, 'status': 'approved'},
+            {'end_date': None, 'alt_phone': '0800'},
+            {'end_date': start + timedelta(days=1, hours=3)},
+        ]):
+            LeaveRequest.objects.create(
+                employee=employee, leave_type=leave_type, dept=dept, unit=unit, start_date=start,
+                reason='Rest', leave_last_taken=FRIDAY, number_of_days=2, leave_code=f'AC-{i}',
+                home_address='Home', place_to_spend_leave='Lagos', **extra,
+            )
+
+    def queryset(self):
+        return LeaveRequest.objects.with_working_days().order_by('-created_on', '-id')
+
+    def outputs(self, **params):
+        request = Request(APIRequestFactory().get('/', params))
+        context = {'request': request}
+        fields = LeaveRequestValuesSerializer.FIELDS
+        if params:
+            fields = requested_fields(request, fields)
+        rows = LeaveRequestValuesSerializer.values(self.queryset(), fields)
+        values = LeaveRequestValuesSerializer(rows, many=True, context=context).data
+        model = LeaveRequestListSerializer(self.queryset(), many=True, context=context).data
+        return values, model
+
+    def test_same_output(self):
+        values, model = self.outputs()
+        self.assertEqual(json.loads(json.dumps(values)), json.loads(json.dumps(model)))
+        self.assertEqual([row['dept_name'] for row in values], ['Accounts'] * 3)
+        self.assertEqual(values[0]['leave_type_name'], 'Annual Leave')
+        self.assertEqual(values[0]['unit_name'], 'Payroll')
+
+    def test_same_output_with_sparse_fields(self):
+        for params in ({'fields': 'id,employee,unit_name,working_days'}, {'omit': 'reason,dept_name,end_date'}):
+            values, model = self.outputs(**params)
+            self.assertEqual(json.loads(json.dumps(values)), json.loads(json.dumps(model)), params)
+
+    def test_detail_shape_is_unchanged(self):
+        # the names and working days are for lists; a single leave request
+        # is shown as before, with no lookups beyond the employee
+        leave = LeaveRequest.objects.first()
+        with self.assertNumQueries(1):
+            data = LeaveRequestSerializers(leave).data
+        self.assertFalse({'working_days', 'leave_type_name', 'dept_name', 'unit_name'} & data.keys())
+        self.assertEqual(data['dept'], leave.dept_id)
+
+    def test_one_query_with_the_names(self):
+        with self.assertNumQueries(1):
+            data = LeaveRequestValuesSerializer(LeaveRequestValuesSerializer.values(self.queryset()), many=True).data
+        self.assertEqual(len(data), 3)
+
+
+class ConditionalLeaveListTests(TestCase):
+    """Leave lists answer 304 until something the response shows changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dept = Department.objects.create(name='Accounts', type='NON-CLINICAL')
+        cls.unit = Unit.objects.create(name='Payroll', dept=cls.dept)
+        cls.leave_type = LeaveType.objects.create(name='Annual Leave')
+        cls.employee = UserAccounts.objects.create_user('employee', 'password', first_name='Em', sur_name='Ployee', dept=cls.dept)
+        cls.leave = LeaveRequest.objects.create(
+            employee=cls.employee, leave_type=cls.leave_type, dept=cls.dept, unit=cls.unit,
+            start_date=timezone.make_aware(datetime(2027, 1, 8, 9)), end_date=timezone.make_aware(datetime(2027, 1, 12, 9)),
+            reason='Rest', leave_last_taken=FRIDAY, number_of_days=2, leave_code='AC-1',
+            home_address='Home', place_to_spend_leave='Home',
+        )
+
+    def get(self, view=ListLeaveRequest, **headers):
+        request = APIRequestFactory().get('/', **headers)
+        force_authenticate(request, user=self.employee)
+        return view.as_view()(request)
+
+    def assert_change_is_seen(self, change, view=ListLeaveRequest):
+        first = self.get(view)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.get(view, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        change()
+        changed = self.get(view, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+        self.assertEqual(self.get(view, HTTP_IF_NONE_MATCH=changed['ETag']).status_code, 304)
+        return changed
+
+    def test_leave_change(self):
+        def change():
+            self.leave.status = 'approved'
+            self.leave.save()
+        self.assertEqual(self.assert_change_is_seen(change).data['results'][0]['status'], 'approved')
+
+    def test_employee_rename(self):
+        def change():
+            self.employee.sur_name = 'Renamed'
+            self.employee.save(update_fields=['sur_name'])
+        self.assertEqual(self.assert_change_is_seen(change).data['results'][0]['employee'], 'Renamed')
+
+    def test_related_names(self):
+        for obj in (self.leave_type, self.dept, self.unit):
+            def change(obj=obj):
+                obj.name = f'{obj.name} (renamed)'
+                obj.save()
+            self.assert_change_is_seen(change)
+
+    def test_holidays(self):
+        # the working days of the listed leave change with the holidays
+        holiday = {}
+        response = self.assert_change_is_seen(lambda: holiday.setdefault(
+            'audit', Holiday.objects.create(name='Audit', date=MONDAY, dept=self.dept)
+        ))
+        self.assertEqual(response.data['results'][0]['working_days'], 2)
+        response = self.assert_change_is_seen(lambda: holiday['audit'].delete())
+        self.assertEqual(response.data['results'][0]['working_days'], 3)
+
+    def test_deletion(self):
+        response = self.assert_change_is_seen(lambda: LeaveRequest.objects.all().delete())
+        self.assertEqual(response.data['results'], [])
+
+    def test_changes_made_without_signals_are_seen(self):
+        # queryset updates skip auto_now, so bump the timestamp the way another process would
+        self.assert_change_is_seen(lambda: Holiday.objects.bulk_create([Holiday(name='Closure', date=MONDAY)]))
+        later = timezone.now() + timedelta(seconds=5)
+        self.assert_change_is_seen(lambda: UserAccounts.objects.update(sur_name='Other', updated=later))
+
+    def test_last_modified(self):
+        later = timezone.now() + timedelta(hours=1)
+        Holiday.objects.create(name='Closure', date=MONDAY)
+        Holiday.objects.update(updated=later)
+        response = self.get()
+        self.assertEqual(response['Last-Modified'], http_date(int(later.timestamp())))
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_plain_list(self):
+        self.assert_change_is_seen(lambda: Holiday.objects.create(name='Closure', date=MONDAY), view=HolidayCreateList)
+
+
+class LeaveExportTests(TestCase):
+    """The export streams every matching leave request as CSV or NDJSON."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dept = Department.objects.create(name='Accounts', type='NON-CLINICAL')
+        cls.other = Department.objects.create(name='Surgery', type='CLINICAL')
+        leave_type = LeaveType.objects.create(name='Annual Leave')
+        cls.hr = UserAccounts.objects.create_user('hr', 'password', first_name='H', sur_name='R', is_hr=True)
+        employee = UserAccounts.objects.create_user('employee', 'password', first_name='Em', sur_name='=HYPERLINK("x")')
+        for i, (dept, status, day) in enumerate([
+            (cls.dept, 'pending', 8), (cls.dept, 'approved', 18), (cls.other, 'pending', 8),
+        ]):
+            start = timezone.make_aware(datetime(2027, 1, day, 9))
+            LeaveRequest.objects.create(
+                employee=employee, leave_type=leave_type, dept=dept,
+                unit=Unit.objects.get_or_create(name=dept.name, dept=dept)[0],
+                start_date=start, end_date=start + timedelta(days=4), status=status,
+                reason='+1 day off' if i == 0 else 'Rest', leave_last_taken=FRIDAY, number_of_days=2,
+                leave_code=f'AC-{i}', home_address='@home', place_to_spend_leave='-', alt_phone='0800',
+            )
+
+    def export(self, **params):
+        request = APIRequestFactory().get('/', params)
+        force_authenticate(request, user=self.hr)
+        response = LeaveRequestExport.as_view()(request)
+        if response.status_code != 200:
+            return response, None
+        return response, b''.join(response.streaming_content).decode()
+
+    def csv_rows(self, **params):
+        response, content = self.export(**params)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        return list(csv.DictReader(io.StringIO(content)))
+
+    def test_csv(self):
+        rows = self.csv_rows()
+        self.assertEqual([row['leave_code'] for row in rows], ['AC-0', 'AC-1', 'AC-2'])
+        self.assertEqual(rows[0]['dept'], 'Accounts')
+        self.assertEqual(rows[0]['working_days'], '3')
+        self.assertEqual(rows[0]['approved_by'], '')
+
+    def test_csv_formulas_are_escaped(self):
+        row = self.csv_rows()[0]
+        self.assertEqual(row['sur_name'], '\'=HYPERLINK("x")')
+        self.assertEqual(row['reason'], "'+1 day off")
+        self.assertEqual(row['home_address'], "'@home")
+        self.assertEqual(row['place_to_spend_leave'], "'-")
+        self.assertEqual((row['alt_phone'], row['number_of_days']), ('0800', '2'))
+
+    def test_ndjson(self):
+        response, content = self.export(export_format='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('.ndjson"', response['Content-Disposition'])
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 3)
+        # NDJSON is data, not a spreadsheet, so text is kept as it is
+        self.assertEqual(rows[0]['sur_name'], '=HYPERLINK("x")')
+        self.assertEqual(rows[0]['number_of_days'], 2)
+
+    def test_filters(self):
+        self.assertEqual([row['leave_code'] for row in self.csv_rows(dept=self.dept.pk)], ['AC-0', 'AC-1'])
+        self.assertEqual([row['leave_code'] for row in self.csv_rows(status='approved')], ['AC-1'])
+        # leave overlapping the range
+        self.assertEqual([row['leave_code'] for row in self.csv_rows(start_date='2027-01-12', end_date='2027-01-17')], ['AC-0', 'AC-2'])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.export(export_format='xlsx')[0].status_code, 400)
+        self.assertEqual(self.export(start_date='2027-02-01', end_date='2027-01-01')[0].status_code, 400)
+
+
+class FastJSONTests(SimpleTestCase):
+    """The orjson renderer and parser answer exactly as DRF's stdlib ones."""
+
+    def test_renderer_output_is_identical(self):
+        for value in (
+            datetime(2027, 1, 8, 9, 30, tzinfo=dt_timezone.utc),
+            datetime(2027, 1, 8, 9, 30, 0, 123456, tzinfo=dt_timezone.utc),
+            datetime(2027, 1, 8, 9, 30),
+            date(2027, 1, 8),
+            time(9, 30, 0, 5),
+            timedelta(days=1, hours=2),
+            Decimal('6.524'),
+            uuid.UUID(int=1),
+            'Ọlá \u2028\u2029 </script>',
+            gettext_lazy('Annual Leave'),
+            np.int64(3),
+            np.arange(3),
+            {1: 'a', 2: 'b'},
+            [1, 2.5, None, True, {'a': []}],
+            # past orjson's 64-bit integers
+            2 ** 70,
+        ):
+            with self.subTest(value=value):
+                self.assertEqual(FastJSONRenderer().render({'value': value}), JSONRenderer().render({'value': value}))
+
+    def test_parser_result_is_identical(self):
+        for body in (
+            '{"a": 1.5, "b": "é", "c": [null, true]}'.encode(),
+            b'{"a": 18446744073709551616, "b": -9223372036854775809, "c": "12345678901234567890"}',
+        ):
+            with self.subTest(body=body):
+                parsed = FastJSONParser().parse(io.BytesIO(body))
+                self.assertEqual(parsed, JSONParser().parse(io.BytesIO(body)))
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(b'[18446744073709551616]')), [2 ** 64])
+
+    def test_parser_errors(self):
+        for body in (b'{"a": NaN}', b'[1,', b'"\xff"', b'{"a": 1}{"b": 2}', b''):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(body))
+
+
+# logins are written in the request, not by a writer thread outside the test transaction
+@override_settings(GZIP_MIN_LENGTH=0, LOGIN_HISTORY_ASYNC=False)
+class ThresholdGZipMiddlewareTests(TestCase):
+    """Responses are compressed, except the ones that carry tokens."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccounts.objects.create_user('employee', 'password', first_name='Em', sur_name='Ployee')
+
+    def test_token_responses_are_not_compressed(self):
+        response = self.client.post(
+            '/accounts/jwt/token/', {'username': 'employee', 'password': 'password'}, HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+        response = self.client.post(
+            '/accounts/jwt/token/refresh/', {'refresh': response.json()['refresh']}, HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+
+    def get_holidays(self):
+        Holiday.objects.bulk_create(Holiday(name='Holiday', date=FRIDAY + timedelta(days=i)) for i in range(5))
+        access = self.client.post('/accounts/jwt/token/', {'username': 'employee', 'password': 'password'}).json()['access']
+        return self.client.get('/api/holidays/', HTTP_ACCEPT_ENCODING='gzip', HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_other_responses_are_compressed(self):
+        response = self.get_holidays()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    @override_settings(GZIP_MIN_LENGTH=100000)
+    def test_small_responses_are_not_compressed(self):
+        response = self.get_holidays()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
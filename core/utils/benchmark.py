@@ -0,0 +1,164 @@
+"""
+Helpers for the benchmark management commands: a throwaway database,
+synthetic leave and login data and timing/EXPLAIN of querysets.
+"""
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.models import Department, LeaveRequest, LeaveType, Unit
+from UserAccounts.models import LoginHistory
+
+User = get_user_model()
+
+STATUS_WEIGHTS = {'pending': 10, 'approved': 60, 'rejected': 15, 'cancelled': 10, 'exhausted': 5}
+
+
+@contextmanager
+def benchmark_database(keepdb=False):
+    """
+    Run the body against a freshly migrated test database (test_<NAME>) so
+    the synthetic rows never touch real data.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def seed_leave_data(rows, users=1000, depts=10, units_per_dept=5, leave_types=5, seed=0):
+    """
+    Bulk insert departments, units, leave types, users and `rows` leave
+    requests spread over the last three years. Returns the number of leave
+    requests created.
+    """
+    rng = random.Random(seed)
+    dept_objs = Department.objects.bulk_create(
+        Department(name=f"Bench Dept {i}", type=rng.choice(['CLINICAL', 'NON-CLINICAL']))
+        for i in range(depts)
+    )
+    unit_objs = Unit.objects.bulk_create(
+        Unit(name=f"Bench Unit {d.pk}-{i}", dept=d) for d in dept_objs for i in range(units_per_dept)
+    )
+    type_objs = LeaveType.objects.bulk_create(
+        LeaveType(name=f"Bench Leave {i}", number_of_days=30) for i in range(leave_types)
+    )
+    user_objs = []
+    for i in range(users):
+        unit = rng.choice(unit_objs)
+        user_objs.append(User(
+            username=f"bench{i}", sur_name=f"Surname{i}", first_name=f"First{i}",
+            password='!', dept_id=unit.dept_id, unit=unit,
+        ))
+    user_objs = User.objects.bulk_create(user_objs, batch_size=1000)
+
+    statuses, weights = zip(*STATUS_WEIGHTS.items())
+    now = timezone.now()
+    batch = []
+    for i in range(rows):
+        employee = rng.choice(user_objs)
+        start = now - timedelta(days=rng.randint(-60, 3 * 365))
+        days = rng.randint(1, 20)
+        batch.append(LeaveRequest(
+            employee=employee, leave_type=rng.choice(type_objs),
+            dept_id=employee.dept_id, unit_id=employee.unit_id,
+            start_date=start, end_date=start + timedelta(days=days + days // 5 * 2),
+            reason="benchmark", leave_last_taken=(start - timedelta(days=365)).date(),
+            number_of_days=days, leave_code=f"BENCH-{i}", home_address="-",
+            place_to_spend_leave="-", status=rng.choices(statuses, weights)[0],
+        ))
+        if len(batch) == 5000:
+            LeaveRequest.objects.bulk_create(batch)
+            batch = []
+    LeaveRequest.objects.bulk_create(batch)
+
+    # spread created_on like real submissions instead of one bulk instant
+    if connection.vendor == 'postgresql':
+        spread_sql = "UPDATE core_leaverequest SET created_on = start_date - random() * interval '30 days'"
+    else:
+        spread_sql = "UPDATE core_leaverequest SET created_on = datetime(start_date, '-' || (abs(random()) % 30) || ' days')"
+    with connection.cursor() as cursor:
+        cursor.execute(spread_sql)
+        cursor.execute("ANALYZE")
+    return rows
+
+
+def seed_login_history(rows, seed=0):
+    """
+    Bulk insert `rows` login history entries for the existing users, with
+    login times over the last year. Returns the number of rows created.
+    """
+    rng = random.Random(seed)
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    devices = ['desktop', 'mobile', 'tablet', 'other']
+    browsers = ['Chrome', 'Firefox', 'Safari', 'Edge']
+    systems = ['Windows', 'Android', 'iOS', 'Mac OS X', 'Linux']
+    batch = []
+    for _ in range(rows):
+        batch.append(LoginHistory(
+            user_id=rng.choice(user_ids), device_type=rng.choice(devices),
+            browser=rng.choice(browsers), browser_version=f"{rng.randint(90, 130)}.0",
+            os_type=rng.choice(systems), user_ip=f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            latitude=Decimal(rng.uniform(-90, 90)).quantize(Decimal('0.000001')),
+            longitude=Decimal(rng.uniform(-180, 180)).quantize(Decimal('0.000001')),
+            login_status=rng.choices(['success', 'failed', 'blocked'], [90, 9, 1])[0],
+            user_agent="benchmark", is_secure=rng.random() < 0.9,
+        ))
+        if len(batch) == 5000:
+            LoginHistory.objects.bulk_create(batch)
+            batch = []
+    LoginHistory.objects.bulk_create(batch)
+
+    # login_time is auto_now_add; spread it like real logins
+    table = connection.ops.quote_name(LoginHistory._meta.db_table)
+    if connection.vendor == 'postgresql':
+        spread_sql = f"UPDATE {table} SET login_time = now() - random() * interval '365 days'"
+    else:
+        spread_sql = f"UPDATE {table} SET login_time = datetime('now', '-' || (abs(random()) % 365) || ' days')"
+    with connection.cursor() as cursor:
+        cursor.execute(spread_sql)
+        cursor.execute(f"UPDATE {table} SET login_date = DATE(login_time)")
+        cursor.execute("ANALYZE")
+    return rows
+
+
+def view_queryset(view_class, user, query_params=None, **kwargs):
+    """Return the (filtered) queryset a DRF generic view would list for `user`."""
+    request = APIRequestFactory().get('/', query_params or {})
+    force_authenticate(request, user=user)
+    view = view_class()
+    view.setup(request, **kwargs)
+    view.request = view.initialize_request(request, **kwargs)
+    view.format_kwarg = None
+    return view.filter_queryset(view.get_queryset())
+
+
+def explain(queryset):
+    """EXPLAIN output of a queryset; on Postgres with actual run times."""
+    if connection.vendor == 'postgresql':
+        return queryset.explain(analyze=True, buffers=True)
+    return queryset.explain()
+
+
+def time_queryset(queryset, repeat=5):
+    """Evaluate a fresh copy of the queryset `repeat` times; returns timings in ms."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset.all())
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'max_ms': round(max(timings), 3),
+    }
@@ -0,0 +1,35 @@
+import uuid
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def cache_is_shared():
+    """Whether the default cache is seen by every process (not local memory or dummy)."""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def get_version(key):
+    """
+    Current value of a shared version stamp. A stamp that is missing (never
+    set, or evicted) starts afresh, so it never matches an older value.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    """Move a version stamp shared by every process using the cache."""
+    cache.set(key, uuid.uuid4().hex, None)
+
+
+def employee_version_key(user_id):
+    """
+    Stamp bumped whenever the user account changes, for the users cached by
+    CachedJWTAuthentication.
+    """
+    return f'core:employee:{user_id}:version'
@@ -0,0 +1,278 @@
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from core.models import Department, Holiday
+
+# Span of the precomputed working-day ordinals, in years around the current
+# one. Dates outside the window fall back to walking the calendar.
+WORKING_DAY_YEARS_BEHIND = 1
+WORKING_DAY_YEARS_AHEAD = 5
+
+
+def _as_date(value):
+    """Return the calendar date of a date or datetime value."""
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def working_day_window(today=None):
+    """First and last date covered by the working-day ordinals."""
+    year = (today or timezone.localdate()).year
+    return (
+        date(year - WORKING_DAY_YEARS_BEHIND, 1, 1),
+        date(year + WORKING_DAY_YEARS_AHEAD, 12, 31),
+    )
+
+
+def count_weekdays(start, end):
+    """Count Monday-Friday dates between start and end (both inclusive)."""
+    if end < start:
+        return 0
+    total_days = (end - start).days + 1
+    full_weeks, remainder = divmod(total_days, 7)
+    weekdays = full_weeks * 5
+    first_weekday = start.weekday()
+    for i in range(remainder):
+        if (first_weekday + i) % 7 < 5:
+            weekdays += 1
+    return weekdays
+
+
+class HolidayCalendar:
+    """
+    Immutable, in-memory calendar of the holidays that apply to one scope.
+
+    Holidays are kept as sorted date ordinals so that membership and range
+    counts are answered with a binary search instead of a query per day.
+    Within the working-day window end dates and durations are plain array
+    lookups.
+    """
+
+    def __init__(self, dates, window=None):
+        self.ordinals = sorted({_as_date(d).toordinal() for d in dates})
+        # Holidays that fall on a weekend never reduce the number of working
+        # days, so range counts only need the weekday ones.
+        self.weekday_ordinals = [
+            o for o in self.ordinals if date.fromordinal(o).weekday() < 5
+        ]
+        self._build_ordinals(*(window or working_day_window()))
+
+    def _build_ordinals(self, first, last):
+        """
+        Precompute, for every date in the window, the cumulative number of
+        working days since the window start (`cumulative`), and the list of
+        working dates in order (`working_ordinals`). End dates and durations
+        inside the window then become an index lookup and a subtraction.
+        """
+        holidays = set(self.weekday_ordinals)
+        self.window_start = first.toordinal()
+        self.window_end = last.toordinal()
+        self.cumulative = []
+        self.working_ordinals = []
+        for ordinal in range(self.window_start, self.window_end + 1):
+            if date.fromordinal(ordinal).weekday() < 5 and ordinal not in holidays:
+                self.working_ordinals.append(ordinal)
+            self.cumulative.append(len(self.working_ordinals))
+
+    def working_day_ordinal(self, day):
+        """
+        Number of working days from the window start up to and including
+        `day`, or None when `day` is outside the window.
+        """
+        ordinal = _as_date(day).toordinal()
+        if self.window_start <= ordinal <= self.window_end:
+            return self.cumulative[ordinal - self.window_start]
+        return None
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def is_holiday(self, day):
+        ordinal = _as_date(day).toordinal()
+        i = bisect_left(self.ordinals, ordinal)
+        return i < len(self.ordinals) and self.ordinals[i] == ordinal
+
+    def is_working_day(self, day):
+        return _as_date(day).weekday() < 5 and not self.is_holiday(day)
+
+    def holidays_between(self, start, end):
+        """Number of weekday holidays between start and end (inclusive)."""
+        return (
+            bisect_right(self.weekday_ordinals, _as_date(end).toordinal())
+            - bisect_left(self.weekday_ordinals, _as_date(start).toordinal())
+        )
+
+    def count_working_days(self, start, end):
+        """Working days between start and end, both dates included."""
+        start, end = _as_date(start), _as_date(end)
+        if end < start:
+            return 0
+        start_ordinal = self.working_day_ordinal(start)
+        end_ordinal = self.working_day_ordinal(end)
+        if start_ordinal is not None and end_ordinal is not None:
+            return end_ordinal - start_ordinal + int(self.is_working_day(start))
+        return count_weekdays(start, end) - self.holidays_between(start, end)
+
+    def add_working_days(self, start, leave_days):
+        """
+        Return the date `leave_days` working days after `start`.
+
+        The start date itself is not counted. A datetime keeps its time of day.
+        """
+        if leave_days <= 0:
+            return start
+
+        start_ordinal = self.working_day_ordinal(start)
+        if start_ordinal is not None:
+            # working_ordinals is 0-indexed, so the n-th working day after
+            # start sits at index ordinal(start) + n - 1
+            index = start_ordinal + leave_days - 1
+            if index < len(self.working_ordinals):
+                return start + timedelta(days=self.working_ordinals[index] - _as_date(start).toordinal())
+
+        end = start
+        days_added = 0
+        while days_added < leave_days:
+            end += timedelta(days=1)
+            if self.is_working_day(end):
+                days_added += 1
+        return end
+
+
+class HolidayCalendarSet:
+    """
+    Snapshot of every Holiday row grouped by scope: all staff, a department
+    type, or a single department. The effective calendar of a department
+    (global + its type + its own holidays) is compiled on first use and
+    memoised, and departments that share the same effective holidays share
+    one compiled calendar.
+    """
+
+    def __init__(self, holidays, dept_types):
+        self.dept_types = dict(dept_types)
+        self.global_dates = []
+        self.type_dates = {}
+        self.dept_dates = {}
+        for day, dept_type, dept_id in holidays:
+            if dept_id is not None:
+                self.dept_dates.setdefault(dept_id, []).append(day)
+            elif dept_type:
+                self.type_dates.setdefault(dept_type, []).append(day)
+            else:
+                self.global_dates.append(day)
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def scope_key(self, dept_id=None):
+        dept_type = self.dept_types.get(dept_id)
+        return (
+            dept_type if dept_type in self.type_dates else None,
+            dept_id if dept_id in self.dept_dates else None,
+        )
+
+    def for_dept(self, dept_id=None):
+        """Return the compiled HolidayCalendar that applies to a department."""
+        key = self.scope_key(dept_id)
+        calendar = self._compiled.get(key)
+        if calendar is None:
+            with self._lock:
+                calendar = self._compiled.get(key)
+                if calendar is None:
+                    dept_type, own_dept = key
+                    calendar = HolidayCalendar(
+                        self.global_dates
+                        + self.type_dates.get(dept_type, [])
+                        + self.dept_dates.get(own_dept, [])
+                    )
+                    self._compiled[key] = calendar
+        return calendar
+
+
+_calendar_set = None
+_calendar_state = None
+_calendar_lock = threading.Lock()
+# whether the calendars were checked against the database in this request
+_request = threading.local()
+
+
+def holiday_calendar_state():
+    """
+    Count and latest change of the Holiday and Department rows, read in one
+    query. It moves whenever a row the calendars are built from is created,
+    changed or deleted, in whichever process that happened.
+    """
+    holiday = connection.ops.quote_name(Holiday._meta.db_table)
+    department = connection.ops.quote_name(Department._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT (SELECT COUNT(*) FROM {holiday}), (SELECT MAX(updated) FROM {holiday}), "
+            f"(SELECT COUNT(*) FROM {department}), (SELECT MAX(updated) FROM {department})"
+        )
+        return tuple(cursor.fetchone())
+
+
+def begin_request(**kwargs):
+    """request_started receiver: check the calendars once in this request."""
+    _request.active = True
+    _request.checked = False
+
+
+def end_request(**kwargs):
+    """request_finished receiver."""
+    _request.active = False
+    _request.checked = False
+
+
+def get_holiday_calendar_set():
+    """
+    Return the process-wide HolidayCalendarSet, loading it on first use.
+
+    Holidays and department types are loaded with one query each, and again
+    only when holiday_calendar_state() or the working-day window has moved. The state is read once per
+    request, and on every call outside requests (commands, shells).
+    """
+    global _calendar_set, _calendar_state
+
+    calendar_set = _calendar_set
+    if calendar_set is not None and getattr(_request, 'checked', False):
+        return calendar_set
+
+    # read before the rows, so a change in between is caught by the next
+    # check; the window moves on at the turn of the year
+    state = (holiday_calendar_state(), working_day_window())
+    if getattr(_request, 'active', False):
+        _request.checked = True
+
+    with _calendar_lock:
+        if _calendar_set is None or _calendar_state != state:
+            _calendar_set = HolidayCalendarSet(
+                Holiday.objects.values_list('date', 'dept_type', 'dept_id'),
+                Department.objects.values_list('id', 'type'),
+            )
+            _calendar_state = state
+        return _calendar_set
+
+
+def get_holiday_calendar(dept=None):
+    """
+    Return the HolidayCalendar for a department (instance or id). Without a
+    department only the holidays that apply to all staff are used.
+    """
+    dept_id = getattr(dept, 'pk', dept)
+    return get_holiday_calendar_set().for_dept(dept_id)
+
+
+def invalidate_holiday_calendar():
+    """
+    Drop this process's calendars after a Holiday or Department change.
+    Other processes notice the change through holiday_calendar_state().
+    """
+    global _calendar_set
+
+    with _calendar_lock:
+        _calendar_set = None
@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, F, OuterRef, Subquery
+from rest_framework.exceptions import PermissionDenied
+
+from core.models import LeaveBalance, LeaveRequest
+
+User = get_user_model()
+
+# Yearly allowance given to a balance the first time it is used
+DEFAULT_LEAVE_DAYS = 30
+
+
+def ensure_leave_balance(employee, leave_type, year):
+    """
+    Create the employee's balance for the year if it does not exist yet.
+
+    Uses INSERT ... ON CONFLICT DO NOTHING, so concurrent first submissions
+    cannot fail with an IntegrityError the way get_or_create can.
+    """
+    LeaveBalance.objects.bulk_create(
+        [
+            LeaveBalance(
+                employee=employee,
+                leave_type=leave_type,
+                year=year,
+                total_days=DEFAULT_LEAVE_DAYS,
+                days_used=0,
+                days_remaining=DEFAULT_LEAVE_DAYS,
+            )
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def reserve_leave_days(employee, leave_type, year, days):
+    """
+    Atomically take `days` from the employee's balance for the year.
+
+    The UPDATE only matches while days_remaining >= days, so two concurrent
+    reservations can never overdraw the balance. Raises PermissionDenied
+    when there are not enough days left.
+    """
+    ensure_leave_balance(employee, leave_type, year)
+    balances = LeaveBalance.objects.filter(employee=employee, leave_type=leave_type, year=year)
+
+    reserved = balances.filter(days_remaining__gte=days).update(
+        days_used=F('days_used') + days,
+        days_remaining=F('days_remaining') - days,
+    )
+    if not reserved:
+        days_remaining = balances.values_list('days_remaining', flat=True).first()
+        raise PermissionDenied(
+            detail=f"Insufficient leave balance. You have {days_remaining} days remaining."
+        )
+
+
+def eligibility_queryset(employee, leave_type, year):
+    """The single query behind check_leave_eligibility, as a values() queryset."""
+    leave_type_id = getattr(leave_type, 'pk', leave_type)
+    employee_requests = LeaveRequest.objects.filter(employee=OuterRef('pk'))
+    return User.objects.filter(pk=employee.pk).annotate(
+        has_open_request=Exists(employee_requests.filter(status__in=['pending', 'approved'])),
+        has_same_type_request=Exists(
+            employee_requests.filter(leave_type=leave_type_id, start_date__year=year)
+        ),
+        balance_remaining=Subquery(
+            LeaveBalance.objects.filter(
+                employee=OuterRef('pk'), leave_type=leave_type_id, year=year
+            ).values('days_remaining')[:1]
+        ),
+    ).values('has_open_request', 'has_same_type_request', 'balance_remaining')
+
+
+def check_leave_eligibility(employee, leave_type, year, days, lock=False):
+    """
+    Run every pre-submission check in a single query: an open (pending or
+    approved) leave, a request for the same leave type this year, and the
+    remaining balance. With lock=True the employee row is first locked FOR
+    UPDATE, which serialises concurrent submissions by the same employee.
+
+    Returns a dict with `eligible`, the rejection `reasons` (in the order
+    they are enforced) and `days_remaining`.
+    """
+    if lock:
+        # Taken in its own statement: under READ COMMITTED the checks below
+        # need a snapshot started after the lock was granted, or they would
+        # miss a request committed by the transaction we waited for.
+        User.objects.select_for_update().filter(pk=employee.pk).exists()
+
+    row = eligibility_queryset(employee, leave_type, year).get()
+
+    # a balance that does not exist yet starts with the full allowance
+    days_remaining = row['balance_remaining']
+    if days_remaining is None:
+        days_remaining = DEFAULT_LEAVE_DAYS
+
+    reasons = []
+    if row['has_open_request']:
+        reasons.append("You already have a pending or approved leave request.")
+    if row['has_same_type_request']:
+        reasons.append("You have already applied for this type of leave this year.")
+    if days > days_remaining:
+        reasons.append(f"Insufficient leave balance. You have {days_remaining} days remaining.")
+
+    return {
+        'eligible': not reasons,
+        'reasons': reasons,
+        'days_remaining': days_remaining,
+    }
@@ -0,0 +1,93 @@
+import re
+
+from django.db import transaction
+from django.db.models import F
+
+from core.models import LeaveCodeSequence
+
+LEAVE_CODE_PREFIX_LENGTH = 10
+LEAVE_CODE_DIGITS = 5
+
+
+def leave_code_prefix(dept):
+    """
+    Short upper-case prefix for a department: the initials of a multi-word
+    name ("Accident & Emergency" -> "AE"), otherwise its first three letters.
+    """
+    words = re.findall(r'[A-Za-z0-9]+', getattr(dept, 'name', '') or '')
+    if len(words) > 1:
+        prefix = ''.join(word[0] for word in words)
+    elif words:
+        prefix = words[0][:3]
+    else:
+        prefix = 'LV'
+    return prefix.upper()[:LEAVE_CODE_PREFIX_LENGTH]
+
+
+LEAVE_CODE_RE = re.compile(rf'^([A-Z0-9]{{1,{LEAVE_CODE_PREFIX_LENGTH}}})-(\d{{4}})-(\d{{{LEAVE_CODE_DIGITS},}})$')
+
+
+def format_leave_code(prefix, year, value):
+    return f"{prefix}-{year}-{value:0{LEAVE_CODE_DIGITS}d}"
+
+
+def parse_leave_code(code):
+    """(prefix, year, value) of a code in the allocator's format, else None."""
+    match = LEAVE_CODE_RE.match(code or '')
+    if match is None:
+        return None
+    prefix, year, value = match.groups()
+    return prefix, int(year), int(value)
+
+
+def allocate_leave_codes(dept, year, count=1):
+    """
+    Reserve `count` consecutive leave codes such as "AE-2026-00042" for a
+    department and year.
+
+    The counter row is bumped with a single UPDATE, which locks it until
+    the surrounding transaction ends, so parallel callers queue for the row
+    and always get disjoint blocks; nobody has to retry on the unique index.
+    Numbers of rolled back transactions are reused.
+    """
+    if count <= 0:
+        return []
+
+    prefix = leave_code_prefix(dept)
+    with transaction.atomic():
+        LeaveCodeSequence.objects.bulk_create(
+            [LeaveCodeSequence(prefix=prefix, year=year)], ignore_conflicts=True
+        )
+        sequence = LeaveCodeSequence.objects.filter(prefix=prefix, year=year)
+        sequence.update(last_value=F('last_value') + count)
+        last_value = sequence.values_list('last_value', flat=True).get()
+    return [format_leave_code(prefix, year, value) for value in range(last_value - count + 1, last_value + 1)]
+
+
+def claim_leave_codes(codes):
+    """
+    Move the counters past leave codes that were given explicitly (e.g. by
+    an import) in the allocator's format, so that a later allocation cannot
+    hand out the same code. Call it in the transaction that saves them.
+    """
+    highest = {}
+    for code in codes:
+        parsed = parse_leave_code(code)
+        if parsed is not None:
+            prefix, year, value = parsed
+            highest[prefix, year] = max(highest.get((prefix, year), 0), value)
+    if not highest:
+        return
+
+    with transaction.atomic():
+        LeaveCodeSequence.objects.bulk_create(
+            [LeaveCodeSequence(prefix=prefix, year=year) for prefix, year in highest],
+            ignore_conflicts=True,
+        )
+        for (prefix, year), value in highest.items():
+            LeaveCodeSequence.objects.filter(prefix=prefix, year=year, last_value__lt=value).update(last_value=value)
+
+
+def allocate_leave_code(dept, year):
+    """Reserve a single leave code."""
+    return allocate_leave_codes(dept, year)[0]
@@ -0,0 +1,356 @@
+"""
+Bulk import of leave applications (e.g. paper forms backfilled after an
+outage). Rows are streamed from CSV or JSON, validated in chunks against
+reference data loaded once, and inserted with bulk_create. Invalid rows
+are reported back instead of failing the whole file.
+"""
+import csv
+import io
+import json
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from core.api.serializers import LeaveImportRowSerializer
+from core.models import Department, LeaveBalance, LeaveRequest, LeaveType, Unit
+from core.utils.busdays import batch_end_dates
+from core.utils.leave_balances import DEFAULT_LEAVE_DAYS
+from core.utils.leave_codes import allocate_leave_codes, claim_leave_codes
+
+User = get_user_model()
+
+IMPORT_CHUNK_SIZE = 500
+
+# statuses that take days from the employee's balance
+BALANCE_STATUSES = ('pending', 'approved')
+
+
+class InvalidRow:
+    """Placeholder for a line that could not be parsed, reported as a row error."""
+
+    def __init__(self, message):
+        self.message = message
+
+
+def iter_import_rows(stream, file_format):
+    """
+    Yield one dict per row from a text stream.
+
+    `file_format` is 'csv', 'ndjson' (one JSON object per line, streamed) or
+    'json' (a JSON array, which has to be read whole).
+    """
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+    elif file_format == 'ndjson':
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as exc:
+                    yield InvalidRow(f"Invalid JSON: {exc}")
+    elif file_format == 'json':
+        yield from json.load(stream)
+    else:
+        raise ValueError(f"Unsupported import format: {file_format}")
+
+
+def open_text(file_obj):
+    """Wrap a binary upload or file in a UTF-8 text stream (BOM tolerant)."""
+    return io.TextIOWrapper(file_obj, encoding='utf-8-sig', newline='')
+
+
+class ReferenceData:
+    """Leave types, departments and units looked up by id or by name."""
+
+    def __init__(self):
+        self.leave_types = self._index(LeaveType.objects.only('id', 'name'))
+        self.depts = self._index(Department.objects.only('id', 'name'))
+        self.units = self._index(Unit.objects.only('id', 'name', 'dept_id'))
+
+    @staticmethod
+    def _index(queryset):
+        index = {}
+        for obj in queryset:
+            index.setdefault(obj.name.strip().lower(), obj)
+            index[str(obj.pk)] = obj
+        return index
+
+    @staticmethod
+    def lookup(index, value):
+        if value in (None, ''):
+            return None
+        return index.get(str(value).strip().lower())
+
+
+class LeaveImporter:
+    """
+    Import rows chunk by chunk. Each chunk is validated, its end dates are
+    computed in one vectorised call, balances are updated with one
+    bulk_update and the leave requests are inserted with one bulk_create,
+    all inside a transaction per chunk. A chunk whose insert conflicts is
+    retried row by row, so only the conflicting rows are rejected.
+    """
+
+    def __init__(self, chunk_size=IMPORT_CHUNK_SIZE, dry_run=False):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.reference = ReferenceData()
+        self.seen_codes = set()
+        # days taken in earlier chunks of a dry run, whose writes were rolled back
+        self.dry_run_used = {}
+        self.created = 0
+        self.errors = []
+
+    def run(self, rows):
+        rows = iter(rows)
+        row_number = 1
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(list(enumerate(chunk, start=row_number)))
+            row_number += len(chunk)
+        return self.report(row_number - 1)
+
+    def report(self, total):
+        return {
+            'total_rows': total,
+            'created': self.created,
+            'failed': len(self.errors),
+            'dry_run': self.dry_run,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+        }
+
+    def add_error(self, row_number, errors):
+        self.errors.append({'row': row_number, 'errors': errors})
+
+    def import_chunk(self, numbered_rows):
+        valid = self.validate_chunk(numbered_rows)
+        if not valid:
+            return
+
+        # compute every end date of the chunk in one call
+        end_dates = batch_end_dates(
+            [data['start_date'] for _, data in valid],
+            [data['number_of_days'] for _, data in valid],
+            depts=[data['dept'].pk for _, data in valid],
+        ).astype(object)
+        for (_, data), end_date in zip(valid, end_dates):
+            start = data['start_date']
+            data['end_date'] = start + timedelta(days=(end_date - start.date()).days)
+
+        try:
+            with transaction.atomic():
+                valid = self.reserve_balances(valid)
+                self.allocate_codes(valid)
+                if self.dry_run:
+                    # balances were checked against locked rows; undo the reservation
+                    transaction.set_rollback(True)
+                else:
+                    valid = self.save_requests(valid)
+                self.created += len(valid)
+        except IntegrityError as exc:
+            for row_number, _ in valid:
+                self.add_error(row_number, {'non_field_errors': [f"Could not be saved: {exc}"]})
+
+    def validate_chunk(self, numbered_rows):
+        """Validate field formats and references; returns [(row_number, data)]."""
+        parsed = []
+        for row_number, row in numbered_rows:
+            if isinstance(row, InvalidRow):
+                self.add_error(row_number, {'non_field_errors': [row.message]})
+                continue
+            if not isinstance(row, dict):
+                self.add_error(row_number, {'non_field_errors': ["Expected an object."]})
+                continue
+            # empty CSV cells count as missing so that defaults apply
+            row = {key: value for key, value in row.items() if key and value not in ('', None)}
+            serializer = LeaveImportRowSerializer(data=row)
+            if serializer.is_valid():
+                parsed.append((row_number, serializer.validated_data))
+            else:
+                self.add_error(row_number, serializer.errors)
+
+        # one query for the employees and one for clashing codes per chunk
+        usernames = {data['employee'] for _, data in parsed}
+        employees = {
+            user.username: user
+            for user in User.objects.filter(username__in=usernames).only('id', 'username', 'dept_id', 'unit_id')
+        }
+        codes = {data['leave_code'] for _, data in parsed if 'leave_code' in data}
+        existing_codes = set(LeaveRequest.objects.filter(leave_code__in=codes).values_list('leave_code', flat=True))
+
+        valid = []
+        for row_number, data in parsed:
+            errors = {}
+            employee = employees.get(data['employee'])
+            if employee is None:
+                errors['employee'] = ["No user with this username."]
+
+            leave_type = self.reference.lookup(self.reference.leave_types, data['leave_type'])
+            if leave_type is None:
+                errors['leave_type'] = ["Unknown leave type."]
+
+            dept = self.reference.lookup(self.reference.depts, data.get('dept'))
+            unit = self.reference.lookup(self.reference.units, data.get('unit'))
+            if employee is not None:
+                # default to the employee's own department and unit
+                dept = dept or self.reference.lookup(self.reference.depts, employee.dept_id)
+                unit = unit or self.reference.lookup(self.reference.units, employee.unit_id)
+            # without an employee the missing defaults are not worth reporting
+            if dept is None and (employee is not None or data.get('dept')):
+                errors['dept'] = ["Unknown department."]
+            if unit is None and (employee is not None or data.get('unit')):
+                errors['unit'] = ["Unknown unit."]
+            elif unit is not None and dept is not None and unit.dept_id != dept.pk:
+                errors['unit'] = ["Unit does not belong to the department."]
+
+            code = data.get('leave_code')
+            if code is not None and (code in existing_codes or code in self.seen_codes):
+                errors['leave_code'] = ["Leave code already used."]
+
+            if errors:
+                self.add_error(row_number, errors)
+                continue
+
+            if code is not None:
+                self.seen_codes.add(code)
+            data.update(employee=employee, leave_type=leave_type, dept=dept, unit=unit)
+            valid.append((row_number, data))
+        return valid
+
+    def reserve_balances(self, valid):
+        """
+        Take each row's days from the balance of its start year, in row order.
+        Balances are created in bulk, locked, checked in memory and written
+        back with one bulk_update. Rows that would overdraw are reported.
+        """
+        keys = {
+            (data['employee'].pk, data['leave_type'].pk, data['start_date'].year)
+            for _, data in valid if data['status'] in BALANCE_STATUSES
+        }
+        if not keys:
+            return valid
+
+        LeaveBalance.objects.bulk_create(
+            [
+                LeaveBalance(
+                    employee_id=employee_id, leave_type_id=leave_type_id, year=year,
+                    total_days=DEFAULT_LEAVE_DAYS, days_used=0, days_remaining=DEFAULT_LEAVE_DAYS,
+                )
+                for employee_id, leave_type_id, year in keys
+            ],
+            ignore_conflicts=True,
+        )
+        key_filter = Q()
+        for employee_id, leave_type_id, year in keys:
+            key_filter |= Q(employee_id=employee_id, leave_type_id=leave_type_id, year=year)
+        balances = {
+            (b.employee_id, b.leave_type_id, b.year): b
+            for b in LeaveBalance.objects.select_for_update().filter(key_filter)
+        }
+
+        for key, days in self.dry_run_used.items():
+            if key in balances:
+                balances[key].days_used += days
+                balances[key].days_remaining -= days
+
+        accepted = []
+        for row_number, data in valid:
+            if data['status'] in BALANCE_STATUSES:
+                key = (data['employee'].pk, data['leave_type'].pk, data['start_date'].year)
+                balance = balances[key]
+                days = data['number_of_days']
+                if days > balance.days_remaining:
+                    self.add_error(row_number, {
+                        'number_of_days': [f"Insufficient leave balance. {balance.days_remaining} days remaining."]
+                    })
+                    self.seen_codes.discard(data.get('leave_code'))
+                    continue
+                balance.days_used += days
+                balance.days_remaining -= days
+                if self.dry_run:
+                    self.dry_run_used[key] = self.dry_run_used.get(key, 0) + days
+            accepted.append((row_number, data))
+
+        LeaveBalance.objects.bulk_update(balances.values(), ['days_used', 'days_remaining'])
+        return accepted
+
+    def save_requests(self, valid):
+        """
+        Insert the chunk with one bulk_create. If that hits a conflict, e.g. a
+        leave code taken by a concurrent import since validation, insert the
+        rows one by one under a savepoint each instead: the rows that fail are
+        reported and their days given back. Returns the rows saved.
+        """
+        try:
+            with transaction.atomic():
+                LeaveRequest.objects.bulk_create(
+                    [self.build_request(data) for _, data in valid], batch_size=self.chunk_size
+                )
+            return valid
+        except IntegrityError:
+            pass
+
+        saved = []
+        for row_number, data in valid:
+            try:
+                with transaction.atomic():
+                    self.build_request(data).save(force_insert=True)
+            except IntegrityError as exc:
+                self.add_error(row_number, {'non_field_errors': [f"Could not be saved: {exc}"]})
+                self.release_days(data)
+                continue
+            saved.append((row_number, data))
+        return saved
+
+    @staticmethod
+    def release_days(data):
+        """Give back the days reserve_balances() took for a row that was not saved."""
+        if data['status'] in BALANCE_STATUSES:
+            days = data['number_of_days']
+            LeaveBalance.objects.filter(
+                employee=data['employee'], leave_type=data['leave_type'], year=data['start_date'].year
+            ).update(days_used=F('days_used') - days, days_remaining=F('days_remaining') + days)
+
+    @staticmethod
+    def allocate_codes(valid):
+        """
+        Give rows without a leave code one from a block per department and
+        year, after moving the counters past the codes given in the file.
+        """
+        claim_leave_codes(data['leave_code'] for _, data in valid if 'leave_code' in data)
+        missing = {}
+        for _, data in valid:
+            if 'leave_code' not in data:
+                missing.setdefault((data['dept'], data['start_date'].year), []).append(data)
+        for (dept, year), rows in missing.items():
+            for data, code in zip(rows, allocate_leave_codes(dept, year, len(rows))):
+                data['leave_code'] = code
+
+    @staticmethod
+    def build_request(data):
+        return LeaveRequest(
+            employee=data['employee'],
+            leave_type=data['leave_type'],
+            dept=data['dept'],
+            unit=data['unit'],
+            start_date=data['start_date'],
+            end_date=data['end_date'],
+            reason=data['reason'],
+            leave_last_taken=data['leave_last_taken'],
+            number_of_days=data['number_of_days'],
+            leave_code=data['leave_code'],
+            home_address=data['home_address'],
+            place_to_spend_leave=data['place_to_spend_leave'],
+            alt_phone=data.get('alt_phone'),
+            status=data['status'],
+        )
+
+
+def import_leave_requests(rows, chunk_size=IMPORT_CHUNK_SIZE, dry_run=False):
+    """Import an iterable of row dicts and return the per-row report."""
+    return LeaveImporter(chunk_size=chunk_size, dry_run=dry_run).run(rows)
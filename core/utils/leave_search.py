@@ -0,0 +1,93 @@
+"""
+Leave request search over the employee's surname, first name and username,
+the leave code and the leave type name.
+
+On PostgreSQL with pg_trgm the match uses the word-similarity operator,
+which the trigram GIN indexes created in migration 0009 can serve, and
+results are ranked by similarity. Elsewhere it falls back to icontains,
+ranked exact > prefix > substring.
+
+The trigram lookup and function are imported from django.contrib.postgres
+and used as expressions, which needs no entry in INSTALLED_APPS; installing
+the app would make psycopg a requirement of SQLite setups as well.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+from core.models import LeaveType
+
+User = get_user_model()
+
+USER_SEARCH_FIELDS = ('sur_name', 'first_name', 'username')
+
+_trigram_available = {}
+
+
+def trigram_search_available(using='default'):
+    """Whether the database is PostgreSQL with the pg_trgm extension installed."""
+    if using not in _trigram_available:
+        connection = connections[using]
+        available = False
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                available = cursor.fetchone() is not None
+        _trigram_available[using] = available
+    return _trigram_available[using]
+
+
+def search_leave_requests(queryset, term):
+    """Filter and rank a LeaveRequest queryset by a free-text search term."""
+    term = (term or '').strip()
+    if not term:
+        return queryset.order_by('-created_on', '-id')
+    if trigram_search_available(queryset.db):
+        return _trigram_search(queryset, term)
+    return _icontains_search(queryset, term)
+
+
+def _trigram_search(queryset, term):
+    from django.contrib.postgres.lookups import TrigramWordSimilar
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    # Match the small user and leave type tables first so that each
+    # condition is an index scan, then the leave requests by id
+    users = User.objects.filter(
+        _any(TrigramWordSimilar(F(field), term) for field in USER_SEARCH_FIELDS)
+    ).values('pk')
+    leave_types = LeaveType.objects.filter(TrigramWordSimilar(F('name'), term)).values('pk')
+
+    return queryset.filter(
+        Q(employee__in=users)
+        | Q(leave_type__in=leave_types)
+        | Q(TrigramWordSimilar(F('leave_code'), term))
+    ).annotate(
+        rank=Greatest(
+            *(TrigramWordSimilarity(term, f'employee__{field}') for field in USER_SEARCH_FIELDS),
+            TrigramWordSimilarity(term, 'leave_code'),
+            TrigramWordSimilarity(term, 'leave_type__name'),
+        )
+    ).order_by('-rank', '-created_on', '-id')
+
+
+def _icontains_search(queryset, term):
+    fields = [f'employee__{field}' for field in USER_SEARCH_FIELDS] + ['leave_code', 'leave_type__name']
+    return queryset.filter(
+        _any(Q(**{f'{field}__icontains': term}) for field in fields)
+    ).annotate(
+        rank=Case(
+            When(_any(Q(**{f'{field}__iexact': term}) for field in fields), then=Value(3)),
+            When(_any(Q(**{f'{field}__istartswith': term}) for field in fields), then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    ).order_by('-rank', '-created_on', '-id')
+
+
+def _any(conditions):
+    combined = Q()
+    for condition in conditions:
+        combined |= condition if isinstance(condition, Q) else Q(condition)
+    return combined
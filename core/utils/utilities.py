@@ -1,28 +1,12 @@
 from core.models import *
 from datetime import timedelta
 from django.utils import timezone
+from core.utils.holidays import get_holiday_calendar
 
-def compute_leave_days(start_date, end_date):
+def compute_leave_days(start_date, end_date, dept=None):
         
         """Compute actual leave days excluding weekends and public holidays."""
-        current_date = start_date
-        leave_days = 0
-
-        while current_date <= end_date:
-            # Skip weekends (Saturday & Sunday)
-            if current_date.weekday() in [5, 6]:  
-                current_date += timedelta(days=1)
-                continue
-
-            # Skip public holidays
-            if Holiday.objects.filter(date=current_date).exists():
-                current_date += timedelta(days=1)
-                continue
-
-            leave_days += 1
-            current_date += timedelta(days=1)
-
-        return leave_days
+        return get_holiday_calendar(dept).count_working_days(start_date, end_date)
     
     
 def calculate_end_date(start_date, leave_days):
@@ -49,25 +33,13 @@ def calculate_end_date(start_date, leave_days):
     return day
 
 # use
-def calc_end_date(start_date, leave_days):
-    end_date = start_date
-    days_added = 0
-
-    while days_added < leave_days:
-        end_date += timedelta(days=1)
-        
-        # Skip weekends (Saturday = 5, Sunday = 6)
-        if end_date.weekday() >= 5:
-            continue
-        
-        # Skip public holidays
-        if Holiday.objects.filter(date=end_date).exists():
-                # current_date += timedelta(days=1)
-                continue
-
-        days_added += 1
-
-    return end_date
+def calc_end_date(start_date, leave_days, dept=None):
+    """
+    Return the date leave_days working days after start_date, skipping
+    weekends and the public holidays observed by dept (looked up in the
+    cached holiday calendar).
+    """
+    return get_holiday_calendar(dept).add_working_days(start_date, leave_days)
 
 # 
 
@@ -86,6 +86,7 @@ AUTH_USER_MODEL='UserAccounts.UserAccounts'
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ThresholdGZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -97,10 +98,26 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication with the user served from cache
+        'UserAccounts.authentication.CachedJWTAuthentication',
+    ],
+    # orjson-backed when installed, stdlib json otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 
+# responses smaller than this many bytes are sent uncompressed
+GZIP_MIN_LENGTH = env.int('GZIP_MIN_LENGTH', default=1024)
+# views whose responses carry JWTs are never compressed (BREACH)
+GZIP_EXCLUDE_URL_NAMES = ('token_obtain_pair', 'token_refresh', 'register')
+
 # simple jwt settings
 #  "ROTATE_REFRESH_TOKENS": True, /*initial false
 # "BLACKLIST_AFTER_ROTATION": True, //initial false
@@ -194,6 +211,14 @@ else:
 #         'default': env.db('DATABASE_PUBLIC_URL')
 #     }
 
+# Cache
+# With several worker processes, set CACHE_URL to Redis or Memcached (e.g.
+# redis://host:6379/1). The default local-memory cache is private to each
+# process, so CachedJWTAuthentication stays off and loads the user per request.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://')
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -235,6 +260,12 @@ STATIC_ROOT = env('STATIC_ROOT', default=str(BASE_DIR / 'staticfiles'))
 MEDIA_URL = env('MEDIA_URL', default='/media/')
 MEDIA_ROOT = env('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
 
+# LoginHistory rows are written in batches by a background thread (see
+# UserAccounts.login_history); False writes them inside the login request
+LOGIN_HISTORY_ASYNC = env.bool('LOGIN_HISTORY_ASYNC', default=True)
+# batches that could not be written wait here to be retried
+LOGIN_HISTORY_SPOOL_DIR = env('LOGIN_HISTORY_SPOOL_DIR', default=str(BASE_DIR / 'var' / 'login_history'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 